@@ -0,0 +1,187 @@
+"""
+Ajuste de la atenuación a partir de reflexiones sucesivas.
+
+Cada ida y vuelta por la línea deja un escalón en la traza: el frente
+incidente en t0, la reflexión de la carga en t0 + Δt y, si la fuente no está
+adaptada, los rebotes siguientes en t0 + kΔt. El salto de tensión en una
+ventana corta (una fracción de Δt, más larga que el tiempo de subida) forma un
+pico por escalón cuya altura es la del escalón y cuyo ruido se reduce frente
+a la derivada muestra a muestra. Los picos se buscan con find_peaks y se
+asocian a cada múltiplo de Δt; la amplitud decae
+como |Γ|^k·e^(-α·vp·t), de modo que log(A_k) es lineal en t. La pendiente se
+obtiene por mínimos cuadrados ponderados en forma cerrada, con pesos (A_k/σ)²
+porque la varianza de log(A_k) es (σ/A_k)², y de su error estándar sale el
+intervalo de confianza. Todo el proceso es O(N) en el número de muestras.
+"""
+from typing import Dict, Optional
+
+import numpy as np
+
+STEP_WINDOW = 0.1  # Ventana del salto de tensión, en fracciones de Δt
+NOISE_SIGMAS = 5.0  # Altura mínima de un pico, en desviaciones del ruido del salto
+MATCH_TOLERANCE = 0.25  # Desvío admitido respecto de t0 + kΔt, en fracciones de Δt
+MIN_REFLECTION = 0.05  # |Γ| por debajo del cual no se corrige la pérdida por desadaptación
+CONFIDENCE_Z = 1.96  # Intervalo de confianza del 95%
+
+
+def robust_noise(values: np.ndarray) -> float:
+    """
+    Desviación estándar robusta (MAD); los escalones ocupan pocas muestras y no
+    la afectan.
+    """
+    deviation = np.abs(values - np.median(values))
+    return 1.4826 * float(np.median(deviation))
+
+
+def voltage_step(voltage: np.ndarray, window: int) -> np.ndarray:
+    """
+    V[i + w/2] - V[i - w/2]: salto de tensión centrado en cada muestra.
+    """
+    step = np.zeros(len(voltage))
+    if len(voltage) > window:
+        half = window // 2
+        step[half:half + len(voltage) - window] = voltage[window:] - voltage[:-window]
+    return step
+
+
+def find_reflection_peaks(time: np.ndarray, voltage: np.ndarray, t0: float, dt: float) -> Dict[str, np.ndarray]:
+    """
+    Escalones en t0 + kΔt (k = 0, 1, 2, ...), desde el frente incidente hasta
+    el primer rebote que falta. Retorna los instantes, las alturas y el ruido
+    de cada altura. Supone muestreo uniforme.
+    """
+    from scipy.signal import find_peaks
+
+    n = len(time)
+    empty = {'time': np.empty(0), 'amplitude': np.empty(0), 'order': np.empty(0, dtype=int), 'noise': 0.0}
+    if n < 4 or not dt > 0:
+        return empty
+
+    sample_interval = (time[-1] - time[0]) / (n - 1)
+    window = max(int(round(STEP_WINDOW * dt / sample_interval)), 1)
+    step = voltage_step(voltage, window)
+    # El ruido se mide con signo: el valor absoluto lo subestimaría
+    noise = robust_noise(step)
+    edge = np.abs(step)
+    distance = max(int(0.5 * dt / sample_interval), 1)
+    height = max(NOISE_SIGMAS * noise, np.finfo(float).tiny)
+    peaks, _ = find_peaks(edge, height=height, distance=distance)
+    if not peaks.size:
+        return dict(empty, noise=noise)
+
+    # Frente incidente: el pico más alto a menos de MATCH_TOLERANCE·Δt de t0
+    near = np.abs(time[peaks] - t0) <= MATCH_TOLERANCE * dt
+    if not near.any():
+        return dict(empty, noise=noise)
+    incident = peaks[near][np.argmax(edge[peaks[near]])]
+
+    # Orden de cada pico como múltiplo de Δt; se conserva el más alto de cada orden
+    position = (time[peaks] - time[incident]) / dt
+    order = np.rint(position).astype(int)
+    keep = (order >= 0) & (np.abs(position - order) <= MATCH_TOLERANCE)
+    peaks, order = peaks[keep], order[keep]
+    ranking = np.lexsort((-edge[peaks], order))
+    peaks, order = peaks[ranking], order[ranking]
+    first = np.r_[True, order[1:] != order[:-1]]
+    peaks, order = peaks[first], order[first]
+
+    # Solo la secuencia contigua desde el incidente: un hueco corta la serie
+    gap = order != np.arange(len(order))
+    contiguous = int(np.argmax(gap)) if gap.any() else len(order)
+    peaks, order = peaks[:contiguous], order[:contiguous]
+
+    # El máximo del salto sobre la meseta del pico está sesgado por el ruido:
+    # la altura se mide como diferencia de los niveles medios de una ventana
+    # antes y otra después del escalón (sumas acumuladas, O(1) por pico). El
+    # pico puede caer en cualquier punto de la meseta, a hasta w/2 del frente,
+    # por eso los niveles empiezan a una ventana completa del pico.
+    cumulative = np.concatenate(([0.0], np.cumsum(voltage)))
+
+    def level(start, stop):
+        start, stop = np.clip(start, 0, n), np.clip(stop, 0, n)
+        return (cumulative[stop] - cumulative[start]) / np.maximum(stop - start, 1)
+
+    amplitude = np.abs(level(peaks + window, peaks + 2 * window) - level(peaks - 2 * window, peaks - window))
+    # Cada nivel promedia window muestras con ruido noise/√2
+    amplitude_noise = noise * np.sqrt(1.0 / window)
+    return {'time': time[peaks], 'amplitude': amplitude, 'order': order, 'noise': amplitude_noise}
+
+
+def fit_peak_decay(peak_time: np.ndarray, amplitude: np.ndarray, noise: float,
+                   order: Optional[np.ndarray] = None,
+                   reflection_coefficient: Optional[float] = None) -> Optional[Dict[str, float]]:
+    """
+    Ajusta log(A_k) = c + m·t_k por mínimos cuadrados ponderados.
+    Con reflection_coefficient se descuenta |Γ|^k antes del ajuste, de modo
+    que la pendiente refleja solo las pérdidas de la línea.
+    Retorna la pendiente (1/s), su error estándar y el χ² reducido, o None con
+    menos de dos picos.
+    """
+    peak_time = np.asarray(peak_time, dtype=float)
+    amplitude = np.asarray(amplitude, dtype=float)
+    count = len(peak_time)
+    if count < 2 or not np.all(amplitude > 0):
+        return None
+
+    y = np.log(amplitude)
+    if reflection_coefficient is not None and abs(reflection_coefficient) >= MIN_REFLECTION:
+        k = np.arange(count) if order is None else np.asarray(order)
+        y = y - k * np.log(min(abs(reflection_coefficient), 1.0))
+    weight = (amplitude / noise) ** 2 if noise > 0 else np.ones(count)
+
+    total = weight.sum()
+    x_mean = np.dot(weight, peak_time) / total
+    y_mean = np.dot(weight, y) / total
+    dx = peak_time - x_mean
+    sxx = np.dot(weight, dx * dx)
+    if not sxx > 0:
+        return None
+    slope = np.dot(weight, dx * (y - y_mean)) / sxx
+    intercept = y_mean - slope * x_mean
+
+    # Con más de dos puntos, el residuo escala el error si el ruido lo subestima
+    residual = y - (intercept + slope * peak_time)
+    chi2 = float(np.dot(weight, residual ** 2) / (count - 2)) if count > 2 else 1.0
+    std_error = np.sqrt(max(chi2, 1.0) / sxx) if noise > 0 else np.sqrt(chi2 / sxx)
+    return {'slope': float(slope), 'intercept': float(intercept), 'std_error': float(std_error),
+            'reduced_chi2': chi2, 'points': count}
+
+
+def fit_attenuation(time: np.ndarray, voltage: np.ndarray, t0: float, dt: float, vp: float,
+                    reflection_coefficient: Optional[float] = None) -> Dict:
+    """
+    Atenuación α (Np/m) por el decaimiento de los picos de reflexión, con su
+    error estándar e intervalo de confianza del 95%. Sin vp o con menos de dos
+    picos el ajuste está indeterminado: α, el error y el intervalo son None y
+    'reason' dice por qué. α se reporta tal como sale del ajuste, aunque sea
+    negativo (decaimiento no distinguible del ruido), para que el intervalo
+    siempre lo contenga.
+    """
+    peaks = find_reflection_peaks(time, voltage, t0, dt)
+    result = {'alpha': None, 'std_error': None, 'ci': None, 'reflections': len(peaks['time']),
+              'reason': None, 'peak_times': peaks['time'].tolist(),
+              'peak_amplitudes': peaks['amplitude'].tolist()}
+    if not vp > 0:
+        result['reason'] = 'no_velocity'
+        return result
+    if result['reflections'] < 2:
+        result['reason'] = 'too_few_reflections'
+        return result
+    # Abscisa nominal kΔt: la posición del pico sobre la meseta del salto varía
+    # con el ruido y, en dos puntos, dominaría el error de la pendiente
+    fit = fit_peak_decay(peaks['order'] * dt, peaks['amplitude'], peaks['noise'], peaks['order'],
+                         reflection_coefficient)
+    if fit is None:
+        result['reason'] = 'degenerate_fit'
+        return result
+
+    # La onda recorre vp·t metros: la pendiente temporal pasa a Np/m dividiendo por vp
+    alpha = -fit['slope'] / vp
+    std_error = fit['std_error'] / vp
+    result.update({
+        'alpha': alpha,
+        'std_error': std_error,
+        'ci': [alpha - CONFIDENCE_Z * std_error, alpha + CONFIDENCE_Z * std_error],
+        'reduced_chi2': fit['reduced_chi2'],
+    })
+    return result
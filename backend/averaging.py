@@ -0,0 +1,161 @@
+"""
+Promediado de adquisiciones repetidas de una misma línea.
+
+Cada adquisición se alinea con la primera (por el cruce del disparo o por
+correlación cruzada de las derivadas, con resolución menor que una muestra) y
+se acumula en una media y varianza por muestra con el algoritmo de Welford, sin
+mantener todas las trazas en memoria. Los acumuladores parciales de varios
+procesos se combinan con la fórmula de Chan.
+
+El ruido por muestra del promedio da una incertidumbre temporal medida para
+el análisis de errores, en lugar de un porcentaje fijo.
+"""
+from typing import Iterable, Optional
+
+import numpy as np
+
+ALIGN_METHODS = ('xcorr', 'trigger', 'none')
+TRIGGER_LEVEL = 0.1  # Fracción del máximo, como el t0 de la detección de eventos
+EDGE_SEARCH_SAMPLES = 5  # Muestras alrededor de un evento donde buscar la pendiente máxima
+
+
+class RunningStats:
+    """
+    Media y varianza por muestra acumuladas traza a traza (Welford).
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean: Optional[np.ndarray] = None
+        self.m2: Optional[np.ndarray] = None
+
+    def add(self, values: np.ndarray):
+        values = np.asarray(values, dtype=float)
+        if self.mean is None:
+            self.mean = np.zeros_like(values)
+            self.m2 = np.zeros_like(values)
+        elif values.shape != self.mean.shape:
+            raise ValueError(f"All acquisitions must have {len(self.mean)} samples, got {len(values)}")
+
+        self.count += 1
+        delta = values - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (values - self.mean)
+
+    def merge(self, other: 'RunningStats') -> 'RunningStats':
+        """
+        Combina otro acumulador en este (Chan et al.) y retorna self.
+        """
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean.copy(), other.m2.copy()
+            return self
+        if other.mean.shape != self.mean.shape:
+            raise ValueError("All acquisitions must have the same number of samples")
+
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * (other.count / count)
+        self.m2 = self.m2 + other.m2 + delta ** 2 * (self.count * other.count / count)
+        self.count = count
+        return self
+
+    def variance(self) -> np.ndarray:
+        if self.count < 2:
+            return np.zeros_like(self.mean)
+        return self.m2 / (self.count - 1)
+
+    def std_error(self) -> np.ndarray:
+        """
+        Desviación estándar de la media por muestra.
+        """
+        return np.sqrt(self.variance() / max(self.count, 1))
+
+
+def trigger_time(time: np.ndarray, voltage: np.ndarray) -> float:
+    """
+    Instante del primer cruce del nivel de disparo, interpolado linealmente.
+    """
+    level = TRIGGER_LEVEL * np.max(voltage)
+    idx = int(np.argmax(voltage >= level))
+    if idx == 0:
+        return float(time[0])
+    fraction = (level - voltage[idx - 1]) / (voltage[idx] - voltage[idx - 1])
+    return float(time[idx - 1] + fraction * (time[idx] - time[idx - 1]))
+
+
+def xcorr_shift(reference_edge: np.ndarray, edge: np.ndarray, sample_interval: float) -> float:
+    """
+    Retardo de edge respecto de reference_edge por correlación cruzada (FFT)
+    con interpolación parabólica del pico.
+    """
+    from scipy.signal import correlate
+
+    corr = correlate(edge, reference_edge, mode='full', method='fft')
+    peak = int(np.argmax(corr))
+    offset = 0.0
+    if 0 < peak < len(corr) - 1:
+        y0, y1, y2 = corr[peak - 1:peak + 2]
+        denominator = y0 - 2 * y1 + y2
+        if denominator != 0:
+            offset = 0.5 * (y0 - y2) / denominator
+    return (peak + offset - (len(reference_edge) - 1)) * sample_interval
+
+
+class Aligner:
+    """
+    Alinea adquisiciones con una traza de referencia sobre la misma rejilla temporal.
+    """
+
+    def __init__(self, time: np.ndarray, reference: np.ndarray, method: str = 'xcorr'):
+        if method not in ALIGN_METHODS:
+            raise ValueError(f"align must be one of {', '.join(ALIGN_METHODS)}")
+        self.time = time
+        self.method = method
+        self.sample_interval = (time[-1] - time[0]) / (len(time) - 1)
+        if method == 'xcorr':
+            self.reference_edge = np.gradient(reference, time)
+        elif method == 'trigger':
+            self.reference_trigger = trigger_time(time, reference)
+
+    def shift(self, voltage: np.ndarray) -> float:
+        """
+        Retardo de la adquisición respecto de la referencia, en segundos.
+        """
+        if self.method == 'xcorr':
+            return xcorr_shift(self.reference_edge, np.gradient(voltage, self.time), self.sample_interval)
+        if self.method == 'trigger':
+            return trigger_time(self.time, voltage) - self.reference_trigger
+        return 0.0
+
+    def align(self, voltage: np.ndarray) -> np.ndarray:
+        shift = self.shift(voltage)
+        if shift == 0.0:
+            return voltage
+        # La traza retrasada se lee adelantada; los extremos mantienen el último valor
+        return np.interp(self.time + shift, self.time, voltage)
+
+
+def timing_uncertainty(time: np.ndarray, voltage: np.ndarray, std_error: np.ndarray,
+                       edge_times: Iterable[Optional[float]]) -> float:
+    """
+    Incertidumbre de un intervalo entre flancos: en cada flanco el ruido de la
+    media se convierte en tiempo dividiendo por la pendiente (σ_t = σ_v / |dV/dt|)
+    y los flancos se suman en cuadratura.
+    """
+    slope = np.abs(np.gradient(voltage, time))
+    n = len(time)
+    total = 0.0
+    for edge_time in edge_times:
+        if edge_time is None:
+            continue
+        center = int(np.searchsorted(time, edge_time))
+        start = max(center - EDGE_SEARCH_SAMPLES, 0)
+        stop = min(center + EDGE_SEARCH_SAMPLES + 1, n)
+        if start >= stop:
+            continue
+        idx = start + int(np.argmax(slope[start:stop]))
+        if slope[idx] > 0:
+            total += (std_error[idx] / slope[idx]) ** 2
+    return float(np.sqrt(total))
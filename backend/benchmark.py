@@ -0,0 +1,390 @@
+"""
+Benchmark reproducible del pipeline TDR.
+
+Genera respuestas a un escalón sintéticas (carga abierta, en corto y
+adaptada) con ruido controlado, las escribe como CSV del Siglent y mide cada
+etapa del pipeline y el endpoint /analyze-tdr completo a través de un cliente
+ASGI en el mismo proceso. El arranque en frío (importar main y atender la
+primera petición) se mide en procesos nuevos. Los resultados (tiempos, pico
+de memoria y entorno) se guardan en JSON para comparar entre commits:
+
+    python benchmark.py --output bench-new.json
+    python benchmark.py --sizes 700,14000 --compare bench-old.json
+
+Todas las trazas cubren la misma ventana temporal, de modo que la forma de la
+señal (y el camino que sigue la detección) no cambia con el número de puntos.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # No disponible en Windows
+    resource = None
+
+DEFAULT_SIZES = (700, 14_000, 140_000, 1_400_000, 14_000_000)
+LOADS = {'open': 1.0, 'short': -1.0, 'matched': 0.0}  # Coeficiente de reflexión de la carga
+WINDOW = 700e-9  # Ventana temporal de todas las trazas (s)
+ROUND_TRIP = 300e-9  # Tiempo de ida y vuelta hasta la carga (s)
+STEP_VOLTAGE = 4.5
+VERTICAL_SCALE = 1.0  # V/div; el ruido se cuantiza a 25 códigos por división como en el osciloscopio
+CABLE_LENGTH = 30.0
+Z0 = 50.0
+SWEEP_LENGTHS = np.linspace(10.0, 50.0, 100)
+SWEEP_Z0 = np.linspace(25.0, 100.0, 100)
+
+REGRESSION_THRESHOLD = 1.2  # Razón de medianas a partir de la cual se reporta una regresión
+REGRESSION_FLOOR = 0.5e-3  # Diferencias menores (s) son ruido de medición en etapas muy cortas
+
+
+def synthetic_step(points: int, load: str, noise: float = 0.01,
+                   seed: int = 0) -> Tuple[np.ndarray, np.ndarray, float]:
+    """
+    Respuesta TDR a un escalón: frente incidente al 10% de la ventana y la
+    reflexión de la carga ROUND_TRIP después, con ruido gaussiano de
+    desviación noise (V) y cuantización del ADC. Retorna tiempo, voltaje e
+    intervalo de muestreo.
+    """
+    from stream import SimulatedScope
+    from uncertainty import quantization_step
+
+    sample_interval = WINDOW / points
+    scope = SimulatedScope(points=points, sample_interval=sample_interval, delay=ROUND_TRIP,
+                           reflection=LOADS[load], noise=noise / STEP_VOLTAGE, seed=seed)
+    time_data, voltage = scope.waveform()
+    code = quantization_step({'vertical_scale': VERTICAL_SCALE})
+    voltage = np.round(STEP_VOLTAGE * voltage / code) * code
+    return time_data, voltage, sample_interval
+
+
+def write_siglent_csv(path: str, time_data: np.ndarray, voltage: np.ndarray, sample_interval: float):
+    """
+    Escribe la traza con la cabecera de 11 líneas que exporta el Siglent.
+    """
+    header = (
+        f"Record Length,Analog:{len(time_data)}\n"
+        f"Sample Interval,CH1:{sample_interval:.6e}\n"
+        "Vertical Units,CH1:V,,,\n"
+        f"Vertical Scale,CH1:{VERTICAL_SCALE:.2f},,,\n"
+        "Vertical Offset,CH1:0.00000,,,\n"
+        "Horizontal Units,us,,,\n"
+        f"Horizontal Scale,{WINDOW / 14 * 1e6:.10f},,,\n"
+        "Model Number,SYNTHETIC,,,\n"
+        "Serial Number,BENCHMARK,,,\n"
+        "Software Version,0,,,\n"
+        "Source,CH1\n"
+        "Second,Volt\n"
+    )
+    with open(path, 'w') as f:
+        f.write(header)
+        np.savetxt(f, np.column_stack((time_data, voltage)), fmt='%.6e', delimiter=',')
+
+
+def measure(func: Callable, repeat: int, memory: bool) -> Dict:
+    """
+    Tiempos de repeat ejecuciones de func y, con memory, el pico de memoria
+    asignada por Python/NumPy en una ejecución adicional con tracemalloc
+    (separada para no inflar los tiempos). Una etapa que no aplica a la traza
+    (p. ej. Δt por correlación sin reflexión) se registra con su error.
+    """
+    try:
+        func()  # Calentamiento; también valida que la etapa aplique a esta traza
+    except ValueError as e:
+        return {'seconds': [], 'median': None, 'min': None, 'peak_memory_bytes': None, 'error': str(e)}
+
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        seconds.append(time.perf_counter() - start)
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return {'seconds': seconds, 'median': statistics.median(seconds), 'min': min(seconds),
+            'peak_memory_bytes': peak}
+
+
+def bench_stages(path: str, repeat: int, memory: bool) -> Dict[str, Dict]:
+    """
+    Mide por separado cada etapa del pipeline sobre el CSV en path.
+    """
+    import main
+    from decimation import decimate
+    from plots import generate_tdr_plot_base64
+
+    def parse():
+        upload = main.LocalUpload(path, os.path.basename(path))
+        try:
+            return main.process_csv_file(upload)
+        finally:
+            upload.close()
+
+    time_data, voltage, config = parse()
+    events = main.detect_pulse_events(time_data, voltage, config)
+    temporal = main.calculate_temporal_parameters(events, CABLE_LENGTH)
+
+    stages = {
+        'parse': parse,
+        'detect': lambda: main.detect_pulse_events(time_data, voltage, config),
+        'temporal': lambda: main.calculate_temporal_parameters(events, CABLE_LENGTH),
+        'temporal_xcorr': lambda: main.calculate_temporal_parameters(events, CABLE_LENGTH, method='xcorr',
+                                                                     time=time_data, voltage=voltage),
+        'impedance': lambda: main.analyze_impedance_reflection(voltage, time_data, events, temporal, Z0),
+        'attenuation': lambda: main.calculate_attenuation(voltage, time_data, events, temporal),
+        'error': lambda: main.calculate_error_analysis(temporal, CABLE_LENGTH, config),
+        # Rejilla de 100 × 100 longitudes e impedancias sobre la misma detección
+        'sweep': lambda: main.sweep_parametric_stages(time_data, voltage, config, events, SWEEP_LENGTHS, SWEEP_Z0),
+        'plot': lambda: generate_tdr_plot_base64(time_data, voltage),
+        'decimate': lambda: decimate(time_data, voltage, 2000, 'lttb'),
+    }
+    results = {name: measure(func, repeat, memory) for name, func in stages.items()}
+    results['detect']['events_found'] = {k: events[k] is not None
+                                         for k in ('plateau_start', 'plateau_end', 'reflection_start')}
+    return results
+
+
+def bench_endpoint(path: str, repeat: int) -> Dict:
+    """
+    POST /analyze-tdr de extremo a extremo con un cliente ASGI en el mismo
+    proceso. La caché de resultados se vacía antes de cada petición para medir
+    el análisis y no el acierto de caché.
+    """
+    import httpx
+    import main
+
+    with open(path, 'rb') as f:
+        content = f.read()
+
+    async def run() -> List[float]:
+        seconds = []
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://benchmark') as client:
+            for _ in range(repeat):
+                main.result_cache.clear()
+                start = time.perf_counter()
+                response = await client.post(
+                    '/analyze-tdr', files={'file': (os.path.basename(path), content, 'text/csv')},
+                    data={'cable_length': str(CABLE_LENGTH), 'z0_expected': str(Z0), 'max_points': '2000'})
+                seconds.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    raise RuntimeError(f"/analyze-tdr returned {response.status_code}: {response.text[:200]}")
+        return seconds
+
+    try:
+        seconds = asyncio.run(run())
+    finally:
+        main.shutdown_analysis_executor()
+    return {'seconds': seconds, 'median': statistics.median(seconds), 'min': min(seconds),
+            'request_bytes': len(content)}
+
+
+# Se ejecuta en un proceso nuevo: importa main y atiende una primera petición
+# de análisis, que es la que paga las importaciones diferidas
+_STARTUP_SCRIPT = '''
+import asyncio, json, os, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+import httpx
+
+async def first_request():
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://benchmark') as client:
+        with open(sys.argv[1], 'rb') as f:
+            response = await client.post('/analyze-tdr', files={'file': ('trace.csv', f.read(), 'text/csv')},
+                                         data={'cable_length': sys.argv[2], 'max_points': '2000'})
+    if response.status_code != 200:
+        raise SystemExit(f"/analyze-tdr returned {response.status_code}")
+
+asyncio.run(first_request())
+done = time.perf_counter()
+main.shutdown_analysis_executor()
+print(json.dumps({'import': imported - start, 'first_request': done - imported}))
+'''
+
+
+def bench_startup(path: str, repeat: int) -> Dict[str, Dict]:
+    """
+    Arranque en frío: tiempo de importar main y de la primera petición a
+    /analyze-tdr sobre el CSV en path, cada repetición en un intérprete nuevo
+    y sin precarga (TDR_PRELOAD=off) para que cuente cada importación diferida.
+    """
+    env = dict(os.environ, TDR_PRELOAD='off')
+    backend = os.path.dirname(os.path.abspath(__file__))
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', _STARTUP_SCRIPT, path, str(CABLE_LENGTH)], cwd=backend,
+                                env=env, capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    results = {}
+    for phase in ('import', 'first_request'):
+        seconds = [run[phase] for run in runs]
+        results[f"startup_{phase}"] = {'seconds': seconds, 'median': statistics.median(seconds),
+                                       'min': min(seconds)}
+    return results
+
+
+def _max_rss(who) -> Optional[int]:
+    if resource is None:
+        return None
+    # ru_maxrss está en KiB en Linux y en bytes en macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(who).ru_maxrss * scale
+
+
+def environment() -> Dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    import scipy
+    import pandas
+    return {
+        'commit': commit or None,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'scipy': scipy.__version__,
+        'pandas': pandas.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def run_benchmark(sizes: List[int], loads: List[str], noise: float, repeat: int,
+                  endpoint: bool = True, memory: bool = True, seed: int = 0,
+                  progress=None, startup: bool = True) -> Dict:
+    """
+    Ejecuta el benchmark completo y retorna el documento de resultados.
+    El arranque en frío se registra con points=0 sobre una traza de 700 puntos.
+    """
+    results = []
+    with tempfile.TemporaryDirectory(prefix='tdr-bench-') as tmp:
+        if startup:
+            path = os.path.join(tmp, 'startup.csv')
+            write_siglent_csv(path, *synthetic_step(700, 'open', noise, seed))
+            if progress:
+                progress('cold start')
+            for stage, result in bench_startup(path, repeat).items():
+                results.append(dict(result, points=0, load='open', stage=stage))
+            os.unlink(path)
+        for points in sizes:
+            for load in loads:
+                path = os.path.join(tmp, f"{load}_{points}.csv")
+                write_siglent_csv(path, *synthetic_step(points, load, noise, seed))
+                if progress:
+                    progress(f"{points} points, {load} load")
+
+                stages = bench_stages(path, repeat, memory)
+                if endpoint:
+                    stages['endpoint'] = bench_endpoint(path, repeat)
+                for stage, result in stages.items():
+                    results.append(dict(result, points=points, load=load, stage=stage))
+                os.unlink(path)
+
+    return {
+        'environment': environment(),
+        'parameters': {'sizes': sizes, 'loads': loads, 'noise': noise, 'repeat': repeat, 'seed': seed,
+                       'window': WINDOW, 'round_trip': ROUND_TRIP},
+        'results': results,
+        'max_rss_bytes': _max_rss(resource.RUSAGE_SELF) if resource else None,
+        'max_rss_children_bytes': _max_rss(resource.RUSAGE_CHILDREN) if resource else None,
+    }
+
+
+def compare(current: Dict, baseline: Dict, threshold: float = REGRESSION_THRESHOLD) -> List[Dict]:
+    """
+    Razón de medianas actual/base por (puntos, carga, etapa) presentes en ambos.
+    Es regresión si supera threshold y la diferencia absoluta supera REGRESSION_FLOOR.
+    """
+    base = {(r['points'], r['load'], r['stage']): r for r in baseline['results']}
+    rows = []
+    for result in current['results']:
+        key = (result['points'], result['load'], result['stage'])
+        if key not in base or not base[key]['median'] or result['median'] is None:
+            continue
+        ratio = result['median'] / base[key]['median']
+        rows.append({'points': key[0], 'load': key[1], 'stage': key[2], 'baseline': base[key]['median'],
+                     'current': result['median'], 'ratio': ratio,
+                     'regression': ratio > threshold and result['median'] - base[key]['median'] > REGRESSION_FLOOR})
+    return rows
+
+
+def _print_table(document: Dict, rows: Optional[List[Dict]] = None):
+    if rows is None:
+        print(f"{'points':>10} {'load':>8} {'stage':>21} {'median ms':>11} {'peak MiB':>9}")
+        for r in document['results']:
+            peak = r.get('peak_memory_bytes')
+            peak = f"{peak / 2 ** 20:9.1f}" if peak is not None else f"{'-':>9}"
+            median = f"{1e3 * r['median']:>11.3f}" if r['median'] is not None else f"{'n/a':>11}"
+            print(f"{r['points']:>10} {r['load']:>8} {r['stage']:>21} {median} {peak}")
+        return
+    print(f"{'points':>10} {'load':>8} {'stage':>21} {'base ms':>10} {'now ms':>10} {'ratio':>7}")
+    for r in rows:
+        flag = '  REGRESSION' if r['regression'] else ''
+        print(f"{r['points']:>10} {r['load']:>8} {r['stage']:>21} {1e3 * r['baseline']:>10.3f}"
+              f" {1e3 * r['current']:>10.3f} {r['ratio']:>7.2f}{flag}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help='comma-separated record lengths (default: %(default)s)')
+    parser.add_argument('--loads', default=','.join(LOADS), help='comma-separated loads (default: %(default)s)')
+    parser.add_argument('--noise', type=float, default=0.01, help='noise standard deviation in volts')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per stage')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-endpoint', action='store_true', help='skip the end-to-end /analyze-tdr timing')
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc peak-memory runs')
+    parser.add_argument('--no-startup', action='store_true', help='skip the cold-start timing in fresh processes')
+    parser.add_argument('--output', help='write the JSON results to this file')
+    parser.add_argument('--compare', help='baseline JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='median ratio reported as a regression (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(',') if s]
+    loads = [s for s in args.loads.split(',') if s]
+    unknown = set(loads) - set(LOADS)
+    if unknown:
+        parser.error(f"unknown loads: {', '.join(sorted(unknown))}")
+
+    document = run_benchmark(sizes, loads, args.noise, args.repeat, endpoint=not args.no_endpoint,
+                             memory=not args.no_memory, seed=args.seed, startup=not args.no_startup,
+                             progress=lambda message: print(message, file=sys.stderr))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(document, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            rows = compare(document, json.load(f), args.threshold)
+        _print_table(document, rows)
+        return 1 if any(r['regression'] for r in rows) else 0
+    _print_table(document)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    sys.exit(main())
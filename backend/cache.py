@@ -0,0 +1,173 @@
+"""
+Caché de resultados direccionada por contenido para /analyze-tdr.
+
+La clave combina el hash SHA-256 del archivo subido con los parámetros del
+análisis. Hay un nivel en memoria (LRU con límite de entradas, bytes y TTL)
+y un nivel opcional en disco que sobrevive a reinicios.
+
+Los resultados pueden contener arreglos NumPy, por lo que se serializan con
+pickle; el directorio en disco debe ser privado del servicio.
+"""
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+# Incrementar cuando cambie el pipeline para invalidar resultados en disco
+ANALYSIS_VERSION = 11
+
+
+def make_cache_key(file_digest: str, **params) -> str:
+    """
+    Construye la clave a partir del hash del archivo y los parámetros del análisis.
+    """
+    canonical = json.dumps(params, sort_keys=True, default=repr)
+    payload = f"{ANALYSIS_VERSION}:{file_digest}:{canonical}".encode('utf-8')
+    return hashlib.sha256(payload).hexdigest()
+
+
+class ResultCache:
+    """
+    Caché LRU en memoria con expulsión por tamaño y TTL, más un nivel en disco opcional.
+    """
+
+    def __init__(self, max_entries: int = 128, max_bytes: int = 256 * 1024 * 1024,
+                 ttl: float = 3600.0, disk_dir: Optional[str] = None,
+                 disk_max_bytes: int = 1024 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0, 'stores': 0}
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, size, stored_at = entry
+                if time.time() - stored_at <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                    return value
+                self._remove(key)
+
+        value = self._read_disk(key)
+        with self._lock:
+            if value is None:
+                self.stats['misses'] += 1
+                return None
+            self.stats['disk_hits'] += 1
+        self._store_memory(key, value, len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)))
+        return value
+
+    def put(self, key: str, value: Dict):
+        serialized = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        self._store_memory(key, value, len(serialized))
+        self._write_disk(key, serialized)
+        with self._lock:
+            self.stats['stores'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['disk_hits'] + self.stats['misses']
+            return dict(self.stats,
+                        entries=len(self._entries),
+                        bytes=self._bytes,
+                        hit_ratio=(self.stats['hits'] + self.stats['disk_hits']) / lookups if lookups else 0.0,
+                        disk_enabled=bool(self.disk_dir))
+
+    def _store_memory(self, key: str, value: Dict, size: int):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, time.time())
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.stats['evictions'] += 1
+
+    def _remove(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def _disk_path(self, key: str) -> str:
+        # La versión en el nombre permite purgar los resultados de versiones anteriores
+        return os.path.join(self.disk_dir, f"v{ANALYSIS_VERSION}-{key}.pkl")
+
+    def _read_disk(self, key: str) -> Optional[Dict]:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                os.unlink(path)
+                return None
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except (OSError, ValueError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def _write_disk(self, key: str, serialized: bytes):
+        if not self.disk_dir:
+            return
+        # Escritura atómica para no dejar archivos a medias si el proceso muere
+        tmp_path = f"{self._disk_path(key)}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(serialized)
+            os.replace(tmp_path, self._disk_path(key))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+        self.cleanup_disk()
+
+    def cleanup_disk(self):
+        """
+        Elimina del nivel en disco los archivos expirados, los de otra versión
+        del análisis y los más antiguos si se supera disk_max_bytes.
+        """
+        if not self.disk_dir:
+            return
+        current = f"v{ANALYSIS_VERSION}-"
+        entries = []
+        now = time.time()
+        for name in os.listdir(self.disk_dir):
+            path = os.path.join(self.disk_dir, name)
+            try:
+                info = os.stat(path)
+                if now - info.st_mtime > self.ttl or (name.endswith('.pkl') and not name.startswith(current)):
+                    os.unlink(path)
+                elif name.endswith('.pkl'):
+                    entries.append((info.st_mtime, info.st_size, path))
+            except OSError:
+                continue
+
+        total = sum(size for _, size, _ in entries)
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
@@ -0,0 +1,133 @@
+"""
+Decimación de formas de onda que preserva la forma de la señal para limitar
+el tamaño de la respuesta.
+
+- LTTB (Largest-Triangle-Three-Buckets): un punto por bucket, el que forma el
+  triángulo de mayor área con el punto anterior y el promedio del siguiente bucket.
+- Min/Max: el mínimo y el máximo de cada bucket, en orden temporal.
+
+En ambos casos se pueden forzar índices adicionales (p. ej. los eventos
+detectados) para que los flancos y los límites de meseta no se pierdan; esos
+índices cuentan dentro de max_points.
+"""
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+
+DECIMATION_METHODS = ('lttb', 'minmax')
+MIN_SHAPE_POINTS = 3  # Primer, último y al menos un punto interior
+
+
+def _buckets(n: int, n_buckets: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Divide n muestras en n_buckets buckets contiguos con límites en múltiplos
+    reales de n / n_buckets, como el LTTB original: los tamaños difieren a lo
+    sumo en uno y hay exactamente n_buckets buckets (requiere n_buckets <= n).
+    Retorna una matriz de índices (n_buckets, tamaño máximo), en la que las
+    posiciones sobrantes repiten el último índice del bucket, y los tamaños.
+    """
+    edges = np.arange(n_buckets + 1) * n // n_buckets
+    counts = np.diff(edges)
+    offsets = np.minimum(np.arange(counts.max()), counts[:, None] - 1)
+    return edges[:-1, None] + offsets, counts
+
+
+def minmax_indices(values: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Índices del mínimo y máximo de cada bucket, totalmente vectorizado.
+    """
+    n = len(values)
+    if n <= max_points:
+        return np.arange(n)
+
+    index, _ = _buckets(n, max(max_points // 2, 1))
+    blocks = np.asarray(values)[index]
+    rows = np.arange(len(index))
+    lo = index[rows, np.argmin(blocks, axis=1)]
+    hi = index[rows, np.argmax(blocks, axis=1)]
+    return np.unique(np.concatenate((lo, hi)))
+
+
+def lttb_indices(time: np.ndarray, values: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Índices seleccionados por Largest-Triangle-Three-Buckets: exactamente
+    max_points. El primer y el último punto siempre se conservan.
+    """
+    n = len(values)
+    if n <= max_points or max_points < 3:
+        return np.arange(n)
+
+    time = np.asarray(time, dtype=float)
+    values = np.asarray(values, dtype=float)
+
+    # Buckets interiores (sin el primer ni el último punto)
+    index, counts = _buckets(n - 2, max_points - 2)
+    index += 1
+    t_blocks = time[index]
+    v_blocks = values[index]
+
+    # Promedio del bucket siguiente; el del último bucket es el punto final
+    valid = np.arange(index.shape[1]) < counts[:, None]
+    t_avg = np.where(valid, t_blocks, 0).sum(axis=1) / counts
+    v_avg = np.where(valid, v_blocks, 0).sum(axis=1) / counts
+    t_next = np.append(t_avg[1:], time[-1])
+    v_next = np.append(v_avg[1:], values[-1])
+
+    selected = np.empty(len(index), dtype=np.intp)
+    t_prev, v_prev = time[0], values[0]
+    for b in range(len(index)):
+        # Doble del área del triángulo (prev, candidato, promedio siguiente); las
+        # posiciones sobrantes repiten el último punto y argmax toma la primera
+        area = np.abs((t_prev - t_next[b]) * (v_blocks[b] - v_prev)
+                      - (t_prev - t_blocks[b]) * (v_next[b] - v_prev))
+        best = int(np.argmax(area))
+        selected[b] = index[b, best]
+        t_prev, v_prev = t_blocks[b, best], v_blocks[b, best]
+
+    return np.concatenate(([0], selected, [n - 1]))
+
+
+def decimate_indices(time: np.ndarray, values: np.ndarray, max_points: Optional[int],
+                     method: str = 'lttb', keep_times: Iterable[Optional[float]] = ()) -> np.ndarray:
+    """
+    Índices de las muestras que conserva decimate, para aplicar la misma
+    selección a columnas adicionales (p. ej. la desviación estándar).
+    """
+    if method not in DECIMATION_METHODS:
+        raise ValueError(f"decimation must be one of {', '.join(DECIMATION_METHODS)}")
+    n = len(values)
+    if not max_points or n <= max_points:
+        return np.arange(n)
+
+    # Las muestras alrededor de los eventos se descuentan del presupuesto, de
+    # modo que la respuesta nunca supera max_points; si no caben todas (se
+    # reservan al menos MIN_SHAPE_POINTS para la forma) quedan solo los centros
+    anchors = np.array([t for t in keep_times if t is not None], dtype=float)
+    centers = np.clip(np.searchsorted(time, anchors), 0, n - 1)
+    around = np.unique(np.clip((centers[:, None] + np.arange(-1, 2)).ravel(), 0, n - 1))
+    room = max(max_points - MIN_SHAPE_POINTS, 0)
+    if len(around) > room:
+        around = np.unique(centers)[:room]
+    budget = max_points - len(around)
+
+    if method == 'minmax':
+        indices = minmax_indices(values, budget)
+    else:
+        indices = lttb_indices(time, values, budget)
+    return np.union1d(indices, around)
+
+
+def decimate(time: np.ndarray, values: np.ndarray, max_points: Optional[int],
+             method: str = 'lttb', keep_times: Iterable[Optional[float]] = ()) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Reduce la forma de onda a lo sumo a max_points puntos con el método
+    indicado. Las muestras alrededor de keep_times se conservan dentro de ese
+    presupuesto.
+    """
+    if method not in DECIMATION_METHODS:
+        raise ValueError(f"decimation must be one of {', '.join(DECIMATION_METHODS)}")
+    if not max_points or len(values) <= max_points:
+        return time, values
+
+    indices = decimate_indices(time, values, max_points, method, keep_times)
+    return time[indices], values[indices]
@@ -0,0 +1,124 @@
+"""
+Localización de todas las discontinuidades de la línea.
+
+Cada cambio de impedancia (conectores, empalmes, la carga) deja un frente en
+la traza. El ancho de los frentes se mide en el frente incidente: desde el
+pico local de la derivada tras t0 hasta su caída al 10% (como la plantilla de
+la correlación cruzada; el rise_time 10-90% del detector puede incluir una
+reflexión positiva). Los frentes se buscan de una sola pasada como picos del
+salto de tensión en una ventana de ese ancho (la derivada muestra a muestra
+queda dominada por el ruido en trazas sobremuestreadas), con prominencia sobre
+el ruido (find_peaks). Los picos a menos de un ancho y medio se funden en uno:
+el sobreimpulso del filtro de suavizado deja máximos secundarios a un ancho de
+cada frente, y dos frentes más próximos no se resuelven con esa ventana. Cada
+frente se convierte
+en distancia con la vp medida: x = vp (t - t_incidente) / 2.
+
+Entre frentes consecutivos la traza es un tramo de impedancia constante. Su
+nivel medio, obtenido con sumas acumuladas, se refiere a la línea base previa
+al frente incidente y al escalón incidente: ρ = (v - v_base) / v_i - 1 y
+Z = Z0 (1 + ρ) / (1 - ρ), de modo que el primer tramo es Z0. Una línea pasiva
+excitada por un escalón mantiene |ρ| <= 1: un nivel fuera de ese rango indica
+que cambió la fuente (p. ej. el fin del pulso de un generador de onda cuadrada)
+y la tabla termina ahí. Todo el proceso es lineal en la longitud del registro.
+"""
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from attenuation import robust_noise, voltage_step
+from frequency import RHO_LIMIT
+
+NOISE_SIGMAS = 6.0  # Prominencia mínima, en desviaciones robustas del ruido del salto
+MIN_RELATIVE_EDGE = 0.02  # Prominencia mínima relativa al frente incidente
+MIN_EDGE_SAMPLES = 3  # Ancho mínimo de un frente
+PASSIVE_TOLERANCE = 0.1  # Margen sobre |ρ| <= 1 antes de atribuir un nivel a la fuente
+
+
+def incident_edge(edge: np.ndarray, t0_idx: int) -> Tuple[int, int]:
+    """
+    Índice del pico local de la derivada edge tras t0_idx (el frente
+    incidente) y su semiancho: muestras hasta que la derivada cae al 10% del
+    pico.
+    """
+    after = edge[t0_idx:]
+    falling = np.diff(after) < 0
+    peak = int(np.argmax(falling)) if falling.any() else len(after) - 1
+    below = after[peak:] < 0.1 * after[peak]
+    half_width = int(np.argmax(below)) if below.any() else len(after) - peak
+    return t0_idx + peak, half_width
+
+
+def _impedance(rho: np.ndarray, z0: float) -> np.ndarray:
+    rho = np.clip(rho, -RHO_LIMIT, RHO_LIMIT)
+    return z0 * (1 + rho) / (1 - rho)
+
+
+def find_discontinuities(time: np.ndarray, voltage: np.ndarray, t0: float, vp: float,
+                         z0: float) -> Dict[str, List[Dict]]:
+    """
+    Retorna los frentes reflejados ('events', en orden de llegada), la tabla
+    de tramos entre ellos ('segments', el primero desde el frente incidente)
+    y el ancho de frente usado ('edge_width', s). Supone muestreo uniforme.
+    """
+    from scipy.signal import find_peaks
+
+    n = len(time)
+    result = {'events': [], 'segments': [], 'edge_width': None}
+    if n < 8 or not vp > 0:
+        return result
+
+    sample_interval = (time[-1] - time[0]) / (n - 1)
+    t0_idx = min(int(np.searchsorted(time, t0)), n - 2)
+    incident, half_width = incident_edge(np.gradient(voltage, time), t0_idx)
+    width = max(2 * half_width + 1, MIN_EDGE_SAMPLES)
+    result['edge_width'] = float(width * sample_interval)
+    if incident + width >= n - 1:
+        return result
+
+    step = voltage_step(voltage, width)
+    edge = np.abs(step)
+    # find_peaks conserva el pico más alto entre los separados por menos de distance
+    prominence = max(NOISE_SIGMAS * robust_noise(step), MIN_RELATIVE_EDGE * edge[incident],
+                     np.finfo(float).tiny)
+    merge = 3 * width // 2 + 1
+    peaks, _ = find_peaks(edge, prominence=prominence, distance=merge)
+    peaks = peaks[peaks > incident + merge]
+
+    # Tramos entre frentes: el nivel se promedia a medio ancho de frente de los bordes
+    guard = width // 2 + 1
+    bounds = np.concatenate(([incident], peaks, [n - 1]))
+    cumulative = np.concatenate(([0.0], np.cumsum(voltage)))
+    start = np.minimum(bounds[:-1] + guard, bounds[1:])
+    stop = np.minimum(np.maximum(bounds[1:] - guard, start + 1), n)
+    level = (cumulative[stop] - cumulative[start]) / (stop - start)
+    baseline_stop = max(incident - guard, 1)
+    baseline = cumulative[baseline_stop] / baseline_stop
+
+    incident_step = level[0] - baseline
+    if incident_step == 0:
+        return result
+    rho = (level - baseline) / incident_step - 1
+    passive = np.abs(rho) <= 1 + PASSIVE_TOLERANCE
+    if not passive.all():
+        last = int(np.argmin(passive))
+        bounds, level, rho, peaks = bounds[:last + 1], level[:last], rho[:last], peaks[:last - 1]
+    impedance = _impedance(rho, z0)
+    edge_time = time[bounds]
+    position = vp * (edge_time - edge_time[0]) / 2
+
+    result['segments'] = [
+        {'start': float(position[i]), 'end': float(position[i + 1]), 'level': float(level[i]),
+         'rho': float(rho[i]), 'impedance': float(impedance[i])}
+        for i in range(len(level))
+    ]
+    # Coeficiente de reflexión local de cada frente: del tramo anterior al siguiente
+    before, after = impedance[:-1], impedance[1:]
+    local = (after - before) / (after + before)
+    result['events'] = [
+        {'time': float(edge_time[k + 1]), 'distance': float(position[k + 1]),
+         'step': float(level[k + 1] - level[k]), 'reflection_coefficient': float(local[k]),
+         'impedance_before': float(before[k]), 'impedance_after': float(after[k])}
+        for k in range(len(peaks))
+    ]
+    return result
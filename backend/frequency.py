@@ -0,0 +1,102 @@
+"""
+Análisis TDR en el dominio de la frecuencia.
+
+A partir de la derivada del escalón se separan el frente incidente y el
+reflejado, y con sus espectros (rfft sobre longitudes rápidas) se obtienen:
+
+- S11(f) = D_reflejado(f) / D_incidente(f)
+- α(f) [Np/m] y β(f) [rad/m] de la línea, suponiendo |Γ_carga| constante:
+  S11(f) = Γ_carga · exp(-2 (α + jβ) L)
+- El perfil de impedancia Z(x) = Z0 (1 + ρ) / (1 - ρ), con ρ(t) = v(t)/vi - 1
+  y x = vp (t - t0) / 2.
+"""
+from typing import Dict, Tuple
+
+import numpy as np
+
+FREQ_MAX_POINTS = 512
+PROFILE_MAX_POINTS = 1024
+SPECTRUM_FLOOR = 1e-2  # Fracción del pico del espectro incidente considerada válida (-40 dB)
+RHO_LIMIT = 0.999  # Evita impedancias infinitas en abierto/cortocircuito
+
+
+def _subsample(n: int, max_points: int) -> np.ndarray:
+    if n <= max_points:
+        return np.arange(n)
+    return np.unique(np.linspace(0, n - 1, max_points).astype(np.intp))
+
+
+def edge_spectra(time: np.ndarray, voltage: np.ndarray, t0: float,
+                 delta_t: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Espectros de la derivada del frente incidente y del reflejado, calculados
+    en una sola rfft por lotes (2, M) con M de longitud rápida.
+    Cada frente ocupa una ventana de ancho Δt centrada en él: el incidente
+    [t0 - Δt/2, t0 + Δt/2) y el reflejado [t0 + Δt/2, t0 + 3Δt/2), de modo que
+    los cortes caen sobre tramos planos y los rebotes múltiples quedan fuera.
+    """
+    n = len(time)
+    sample_interval = (time[-1] - time[0]) / (n - 1)
+    edge = np.gradient(voltage, time)
+
+    start, split, end = np.searchsorted(time, t0 + np.array([-0.5, 0.5, 1.5]) * delta_t)
+    if split - start < 2 or end - split < 2:
+        raise ValueError("Registro demasiado corto para separar el frente reflejado")
+
+    import scipy.fft
+
+    # Ambos segmentos comparten el origen temporal para conservar la fase de ida y vuelta
+    length = scipy.fft.next_fast_len(2 * (end - start), real=True)
+    segments = np.zeros((2, length))
+    segments[0, :split - start] = edge[start:split]
+    segments[1, split - start:end - start] = edge[split:end]
+
+    spectra = scipy.fft.rfft(segments, axis=1) * sample_interval
+    freq = scipy.fft.rfftfreq(length, sample_interval)
+    return freq, spectra
+
+
+def frequency_domain_analysis(time: np.ndarray, voltage: np.ndarray, t0: float, vi: float,
+                              delta_t: float, cable_length: float, z0: float) -> Dict[str, list]:
+    """
+    S11(f), α(f), β(f) y perfil de impedancia vs distancia de una forma de onda.
+    Las frecuencias se limitan a la banda donde el frente incidente tiene energía.
+    """
+    if len(time) < 4 or delta_t <= 0 or vi == 0:
+        raise ValueError("Datos insuficientes para el análisis en frecuencia")
+
+    freq, spectra = edge_spectra(time, voltage, t0, delta_t)
+    incident, reflected = spectra
+    magnitude = np.abs(incident)
+    band = magnitude >= SPECTRUM_FLOOR * magnitude.max()
+    # Banda contigua desde DC hasta la primera caída bajo el umbral
+    n_band = int(np.argmin(band)) if not band.all() else len(band)
+    n_band = max(n_band, 2)
+
+    s11 = reflected[:n_band] / incident[:n_band]
+    s11_abs = np.abs(s11)
+    phase = np.unwrap(np.angle(s11))
+
+    # Γ de la carga a DC (sin pérdidas); α y β por unidad de longitud de ida y vuelta
+    with np.errstate(divide='ignore', invalid='ignore'):
+        alpha = -np.log(s11_abs / s11_abs[0]) / (2 * cable_length)
+    beta = -(phase - phase[0]) / (2 * cable_length)
+
+    # Perfil de impedancia desde el frente incidente hasta 1.5 veces el largo del cable
+    vp = 2 * cable_length / delta_t
+    profile = (time >= t0) & (time <= t0 + 1.5 * delta_t)
+    rho = np.clip(voltage[profile] / vi - 1, -RHO_LIMIT, RHO_LIMIT)
+    distance = vp * (time[profile] - t0) / 2
+    impedance = z0 * (1 + rho) / (1 - rho)
+
+    f_idx = _subsample(n_band, FREQ_MAX_POINTS)
+    p_idx = _subsample(len(distance), PROFILE_MAX_POINTS)
+    return {
+        "frequency": freq[:n_band][f_idx].tolist(),
+        "s11_magnitude_db": (20 * np.log10(np.maximum(s11_abs[f_idx], 1e-12))).tolist(),
+        "s11_phase": phase[f_idx].tolist(),
+        "alpha": np.nan_to_num(alpha[f_idx], nan=0.0, posinf=1e10, neginf=-1e10).tolist(),
+        "beta": beta[f_idx].tolist(),
+        "distance": distance[p_idx].tolist(),
+        "impedance": impedance[p_idx].tolist(),
+    }
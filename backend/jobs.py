@@ -0,0 +1,310 @@
+"""
+Cola persistente de trabajos de análisis asíncronos.
+
+Cada trabajo tiene un directorio con el archivo subido y, al terminar, el
+resultado serializado con pickle (puede contener arreglos NumPy; el directorio
+debe ser privado del servicio). El estado, los parámetros y el progreso por
+etapa se indexan en SQLite, de modo que la cola sobrevive a reinicios y
+cualquier proceso (el despachador o los workers del pool) puede leerla y
+actualizarla sin un broker externo.
+
+Estados: queued → running → done | failed | cancelled. Un trabajo en cola se
+cancela de inmediato; uno en ejecución se marca y el worker se detiene al
+terminar la etapa en curso. Los trabajos terminados se borran pasado el TTL.
+
+Varios procesos del servicio pueden compartir la cola. Cada despachador toma
+los trabajos con su propio identificador (owner) y renueva un arriendo
+(heartbeat) mientras los ejecuta; solo vuelven a la cola los trabajos cuyo
+arriendo venció, es decir, los de un proceso que se detuvo o colgó. Un worker
+que perdió su trabajo deja de escribir en él.
+"""
+import json
+import os
+import pickle
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+import weakref
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    stages TEXT NOT NULL,
+    completed TEXT NOT NULL DEFAULT '[]',
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    owner TEXT,
+    heartbeat REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS jobs_finished_at ON jobs (finished_at);
+"""
+
+FINISHED_STATES = ('done', 'failed', 'cancelled')
+RESULT_FILE = 'result.pkl'
+
+
+class JobCancelled(Exception):
+    """
+    Se lanza en el worker cuando se pidió cancelar el trabajo en curso.
+    """
+
+
+def _fork_hook(ref: weakref.ref, method: str):
+    # register_at_fork retiene las funciones: la referencia débil no mantiene vivo el índice
+    def hook():
+        store = ref()
+        if store is not None:
+            getattr(store, method)()
+    return hook
+
+
+class JobStore:
+    """
+    Índice SQLite de trabajos más un directorio por trabajo con su entrada y resultado.
+    """
+
+    def __init__(self, root: str, ttl: float = 86400.0, lease: float = 30.0):
+        self.root = root
+        self.ttl = ttl
+        self.lease = lease
+        self.db_path = os.path.join(root, 'jobs.sqlite3')
+        # Las transacciones de este proceso se serializan y ningún fork (los pools
+        # de procesos) ocurre a mitad de una: el hijo heredaría el bloqueo de
+        # SQLite de una conexión que nunca lo libera y vería la base bloqueada.
+        self._lock = threading.Lock()
+        ref = weakref.ref(self)
+        os.register_at_fork(before=_fork_hook(ref, '_acquire_for_fork'),
+                            after_in_parent=_fork_hook(ref, '_release_after_fork'),
+                            after_in_child=_fork_hook(ref, '_reset_after_fork'))
+        os.makedirs(root, exist_ok=True)
+        # executescript confirma por su cuenta: fuera de la transacción de _connect
+        db = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.executescript(_SCHEMA)
+            # Colas creadas antes del arriendo
+            columns = {row[1] for row in db.execute('PRAGMA table_info(jobs)')}
+            for column, kind in (('owner', 'TEXT'), ('heartbeat', 'REAL')):
+                if column not in columns:
+                    db.execute(f'ALTER TABLE jobs ADD COLUMN {column} {kind}')
+        finally:
+            db.close()
+
+    @contextmanager
+    def _connect(self):
+        # Una conexión por operación: la cola se usa desde varios procesos
+        with self._lock:
+            db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            db.row_factory = sqlite3.Row
+            try:
+                # Transacción inmediata: leer y actualizar el estado es atómico entre procesos
+                db.execute('BEGIN IMMEDIATE')
+                try:
+                    yield db
+                except BaseException:
+                    db.execute('ROLLBACK')
+                    raise
+                db.execute('COMMIT')
+            finally:
+                db.close()
+
+    def _acquire_for_fork(self):
+        self._lock.acquire()
+
+    def _release_after_fork(self):
+        self._lock.release()
+
+    def _reset_after_fork(self):
+        self._lock = threading.Lock()
+
+    def job_dir(self, job_id: str) -> str:
+        if not job_id or not all(c in '0123456789abcdef' for c in job_id):
+            raise KeyError(job_id)
+        return os.path.join(self.root, job_id)
+
+    def input_path(self, job: Dict) -> str:
+        return os.path.join(self.job_dir(job['id']), f"input{os.path.splitext(job['filename'])[1]}")
+
+    def create(self, filename: str, digest: str, source_path: str, params: Dict, stages: List[str]) -> str:
+        """
+        Encola un trabajo y mueve source_path (el archivo subido, con hash
+        digest) a su directorio. stages son las etapas esperadas, en orden.
+        Retorna el id.
+        """
+        job_id = uuid.uuid4().hex
+        os.makedirs(self.job_dir(job_id))
+        job = {'id': job_id, 'filename': filename}
+        shutil.move(source_path, self.input_path(job))
+        with self._connect() as db:
+            db.execute(
+                "INSERT INTO jobs (id, filename, digest, params, status, stages, created_at)"
+                " VALUES (?, ?, ?, ?, 'queued', ?, ?)",
+                (job_id, filename, digest, json.dumps(params), json.dumps(stages), time.time()))
+        return job_id
+
+    def claim(self, owner: str) -> Optional[Dict]:
+        """
+        Pasa el trabajo en cola más antiguo a 'running' a nombre de owner y lo
+        retorna, o None si la cola está vacía. La transacción inmediata evita
+        que dos despachadores tomen el mismo trabajo.
+        """
+        with self._connect() as db:
+            row = db.execute("SELECT * FROM jobs WHERE status = 'queued'"
+                             " ORDER BY created_at, id LIMIT 1").fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            db.execute("UPDATE jobs SET status = 'running', started_at = ?, owner = ?, heartbeat = ?"
+                       " WHERE id = ?", (now, owner, now, row['id']))
+        return self._describe(row, status='running', started_at=now)
+
+    def heartbeat(self, owner: str) -> int:
+        """
+        Renueva el arriendo de los trabajos que owner está ejecutando.
+        """
+        with self._connect() as db:
+            return db.execute("UPDATE jobs SET heartbeat = ? WHERE status = 'running' AND owner = ?",
+                              (time.time(), owner)).rowcount
+
+    def progress(self, job_id: str, stage: str, owner: Optional[str] = None) -> bool:
+        """
+        Registra una etapa terminada y renueva el arriendo. Retorna True si el
+        worker debe detenerse: se pidió cancelar el trabajo o, con owner, el
+        trabajo ya no es suyo (su arriendo venció y volvió a la cola).
+        """
+        with self._connect() as db:
+            row = db.execute("SELECT status, owner, completed, cancel_requested FROM jobs WHERE id = ?",
+                             (job_id,)).fetchone()
+            if row is None or (owner is not None and (row['status'], row['owner']) != ('running', owner)):
+                return True
+            completed = json.loads(row['completed'])
+            if stage not in completed:
+                completed.append(stage)
+            db.execute("UPDATE jobs SET completed = ?, heartbeat = ? WHERE id = ?",
+                       (json.dumps(completed), time.time(), job_id))
+        return bool(row['cancel_requested'])
+
+    def finish(self, job_id: str, result: Dict, owner: Optional[str] = None):
+        # El resultado se publica antes que el estado, para que 'done' implique archivo completo
+        if owner is not None and not self._owns(job_id, owner):
+            return
+        path = os.path.join(self.job_dir(job_id), RESULT_FILE)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self._set_finished(job_id, 'done', owner=owner)
+
+    def fail(self, job_id: str, error: str, owner: Optional[str] = None):
+        self._set_finished(job_id, 'failed', error, owner)
+
+    def mark_cancelled(self, job_id: str, owner: Optional[str] = None):
+        self._set_finished(job_id, 'cancelled', owner=owner)
+
+    def _owns(self, job_id: str, owner: str) -> bool:
+        with self._connect() as db:
+            row = db.execute("SELECT 1 FROM jobs WHERE id = ? AND status = 'running' AND owner = ?",
+                             (job_id, owner)).fetchone()
+        return row is not None
+
+    def _set_finished(self, job_id: str, status: str, error: Optional[str] = None,
+                      owner: Optional[str] = None):
+        # Con owner solo termina el trabajo si sigue siendo suyo
+        with self._connect() as db:
+            if owner is None:
+                db.execute("UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                           (status, error, time.time(), job_id))
+            else:
+                db.execute("UPDATE jobs SET status = ?, error = ?, finished_at = ?"
+                           " WHERE id = ? AND status = 'running' AND owner = ?",
+                           (status, error, time.time(), job_id, owner))
+
+    def cancel(self, job_id: str) -> Dict:
+        """
+        Cancela un trabajo en cola o pide detener uno en ejecución; sobre uno
+        terminado no hace nada. Retorna el estado resultante.
+        """
+        with self._connect() as db:
+            row = db.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                raise KeyError(job_id)
+            if row['status'] == 'queued':
+                db.execute("UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ?",
+                           (time.time(), job_id))
+            elif row['status'] == 'running':
+                db.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Dict:
+        with self._connect() as db:
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            raise KeyError(job_id)
+        return self._describe(row)
+
+    def load_result(self, job_id: str) -> Dict:
+        with open(os.path.join(self.job_dir(job_id), RESULT_FILE), 'rb') as f:
+            return pickle.load(f)
+
+    def count(self, status: str) -> int:
+        with self._connect() as db:
+            return db.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+    def requeue_expired(self, now: Optional[float] = None) -> int:
+        """
+        Devuelve a la cola los trabajos en ejecución cuyo arriendo venció hace
+        más de lease segundos (su proceso se detuvo); los que tenían una
+        cancelación pendiente se cancelan. Los de procesos vivos no se tocan.
+        """
+        now = time.time() if now is None else now
+        expired = "status = 'running' AND (heartbeat IS NULL OR heartbeat < ?)"
+        with self._connect() as db:
+            db.execute(f"UPDATE jobs SET status = 'cancelled', finished_at = ?, owner = NULL"
+                       f" WHERE {expired} AND cancel_requested = 1", (now, now - self.lease))
+            cursor = db.execute(f"UPDATE jobs SET status = 'queued', started_at = NULL, completed = '[]',"
+                                f" owner = NULL, heartbeat = NULL WHERE {expired}", (now - self.lease,))
+            return cursor.rowcount
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        """
+        Borra los trabajos terminados hace más de ttl segundos, con sus archivos.
+        """
+        cutoff = (time.time() if now is None else now) - self.ttl
+        with self._connect() as db:
+            rows = db.execute(f"SELECT id FROM jobs WHERE status IN {FINISHED_STATES} AND finished_at < ?",
+                              (cutoff,)).fetchall()
+            db.executemany("DELETE FROM jobs WHERE id = ?", [(row['id'],) for row in rows])
+        for row in rows:
+            shutil.rmtree(self.job_dir(row['id']), ignore_errors=True)
+        return len(rows)
+
+    @staticmethod
+    def _describe(row: sqlite3.Row, **overrides) -> Dict:
+        job = {k: row[k] for k in row.keys()
+               if k not in ('params', 'stages', 'completed', 'cancel_requested', 'owner', 'heartbeat')}
+        job.update(overrides)
+        job['params'] = json.loads(row['params'])
+        stages, completed = json.loads(row['stages']), json.loads(row['completed'])
+        done = [name for name in stages if name in completed]
+        job['progress'] = {
+            'stages': stages,
+            'completed': done,
+            # Etapa siguiente a la última terminada, solo mientras se ejecuta
+            'current': next((name for name in stages if name not in completed), None)
+            if job['status'] == 'running' else None,
+            'fraction': 1.0 if job['status'] == 'done' else len(done) / len(stages) if stages else 0.0,
+        }
+        job['cancel_requested'] = bool(row['cancel_requested'])
+        return job
@@ -0,0 +1,86 @@
+"""
+Importador de barridos AC exportados por LTspice (File → Export data as text).
+
+El archivo es texto separado por tabulaciones con una cabecera
+"Freq.\tV(a)\tV(b)..." y una fila por frecuencia. Cada traza es un número
+complejo escrito como:
+
+- Polar: "(-2.60e+01dB,-9.63e+00°)" — magnitud en dB y fase en grados.
+- Cartesiano: "-4.9e-02,-8.3e-03" (con o sin paréntesis) — parte real e imaginaria.
+
+El cuerpo se normaliza con operaciones sobre bytes (sin recorrer filas en
+Python) y se convierte con el parser C de pandas, de modo que barridos de
+cientos de miles de puntos se leen en una sola pasada.
+"""
+import io
+import re
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+LTSPICE_EXTENSIONS = ('.txt',)
+LTSPICE_FORMATS = ('polar', 'cartesian')
+
+# Separadores de campo: tabulación, paréntesis y la coma entre las dos componentes
+_SEPARATORS = bytes.maketrans(b'\t(),;', b'     ')
+# Unidades pegadas a los números ("dB" y ° en UTF-8 o Latin-1). Ninguno de estos
+# bytes aparece en un número, así que se eliminan byte a byte en la misma pasada.
+_UNIT_BYTES = b'dB\xc2\xb0'
+_POLAR_VALUE = re.compile(rb'[-+0-9.eE]+\s*dB')
+
+
+def _to_bytes(data: bytes) -> bytes:
+    """
+    LTspice puede exportar en UTF-16 (con BOM); se normaliza a UTF-8.
+    """
+    if data.startswith((b'\xff\xfe', b'\xfe\xff')):
+        return data.decode('utf-16').encode('utf-8')
+    return data
+
+
+def parse_ltspice_ac(data: bytes) -> Tuple[np.ndarray, Dict[str, np.ndarray], str]:
+    """
+    Parsea un barrido AC de LTspice.
+    Retorna las frecuencias, un arreglo complejo por traza y el formato detectado.
+    """
+    data = _to_bytes(data)
+    header, _, body = data.partition(b'\n')
+    names: List[str] = [name.strip() for name in header.decode('latin-1').strip().split('\t')]
+    if len(names) < 2 or not names[0].lower().startswith('freq'):
+        raise ValueError("Not an LTspice AC export: header must start with 'Freq.'")
+    if b'Step Information' in body:
+        raise ValueError("Stepped LTspice sweeps are not supported; export one step per file")
+    traces = names[1:]
+
+    first_row = body[:body.find(b'\n')] if b'\n' in body else body
+    fmt = 'polar' if _POLAR_VALUE.search(first_row) else 'cartesian'
+
+    body = body.translate(_SEPARATORS, _UNIT_BYTES)
+
+    import pandas as pd
+
+    try:
+        values = pd.read_csv(io.BytesIO(body), sep=r'\s+', header=None, dtype=np.float64,
+                             engine='c').to_numpy()
+    except (ValueError, pd.errors.ParserError, pd.errors.EmptyDataError) as e:
+        raise ValueError(f"Failed to parse LTspice data: {str(e)}")
+
+    expected_columns = 1 + 2 * len(traces)
+    if values.ndim != 2 or values.shape[1] != expected_columns or len(values) == 0:
+        raise ValueError(f"Expected {expected_columns} numeric columns for traces {', '.join(traces)}")
+
+    freq = values[:, 0]
+    first, second = values[:, 1::2], values[:, 2::2]
+    if fmt == 'polar':
+        complex_values = 10 ** (first / 20) * np.exp(1j * np.deg2rad(second))
+    else:
+        complex_values = first + 1j * second
+
+    return freq, {name: complex_values[:, i] for i, name in enumerate(traces)}, fmt
+
+
+def process_ltspice_file(file) -> Tuple[np.ndarray, Dict[str, np.ndarray], str]:
+    """
+    Lee un barrido AC de LTspice desde un objeto con la interfaz de UploadFile.
+    """
+    return parse_ltspice_ac(file.file.read())
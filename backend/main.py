@@ -1,20 +1,107 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+import os
+
+# Backend sin pantalla: se fija antes de que cualquier módulo cargue matplotlib
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 
-import uvicorn
-
-import pandas as pd
 import numpy as np
-from scipy.signal import savgol_filter, find_peaks, correlate
-import scipy.fft
-import cmath
-import matplotlib.pyplot as plt
 import io
-import base64
-from typing import Tuple, Dict, List
-
-app = FastAPI()
+import mmap
+import struct
+import hashlib
+import json
+import tempfile
+import zipfile
+import asyncio
+import importlib
+import logging
+import threading
+import uuid
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from functools import partial
+from time import perf_counter
+from starlette.concurrency import run_in_threadpool
+from typing import Tuple, Dict, List, Optional
+
+from cache import ResultCache, make_cache_key
+from waveform_cache import WaveformCache
+from attenuation import fit_attenuation
+from averaging import ALIGN_METHODS, Aligner, RunningStats, timing_uncertainty
+from discontinuities import find_discontinuities, incident_edge
+from uncertainty import CODES_PER_DIV, noise_residual, perturb_batch, quantization_step, summarize
+from decimation import DECIMATION_METHODS, decimate, decimate_indices, lttb_indices
+from frequency import frequency_domain_analysis
+from jobs import JobCancelled, JobStore
+from ltspice import LTSPICE_EXTENSIONS, process_ltspice_file
+from metrics import (METRICS_MEDIA_TYPE, REGISTRY, Gauge, MetricsMiddleware, collect_stages,
+                     configure_logging, log_event, record_stage, report_stages, stage)
+from store import CaptureStore
+from stream import CHANGE_THRESHOLD, STREAM_BUFFER_FRAMES, StreamSession
+from plots import PLOT_MODES, PlotStore, generate_tdr_plot_base64
+from transport import (ARROW_MEDIA_TYPE, JSON_MEDIA_TYPE, METADATA_HEADER, NPY_MEDIA_TYPE,
+                       columnar_response, negotiate_media_type)
+
+
+# Dependencias pesadas que no se importan al cargar el módulo: se precargan
+# una vez en el proceso maestro para que los workers (fork) las hereden.
+# 'background' las importa en un hilo al arrancar, 'eager' al importar main
+# (p. ej. gunicorn --preload) y 'off' las deja para la primera petición.
+PRELOAD_MODE = os.environ.get('TDR_PRELOAD', 'background').lower()
+PRELOAD_MODULES = ('pandas', 'scipy.signal', 'scipy.fft',
+                   'matplotlib.figure', 'matplotlib.backends.backend_agg')
+
+_preload_thread = None
+
+
+def preload_modules():
+    started = perf_counter()
+    for name in PRELOAD_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            log_event(logging.WARNING, 'preload_failed', module=name, error=str(e))
+    log_event(logging.INFO, 'preload_done', seconds=round(perf_counter() - started, 3))
+
+
+def start_preload():
+    global _preload_thread
+    if PRELOAD_MODE == 'eager':
+        preload_modules()
+    elif PRELOAD_MODE == 'background' and _preload_thread is None:
+        _preload_thread = threading.Thread(target=preload_modules, name='tdr-preload', daemon=True)
+        _preload_thread.start()
+
+
+def wait_for_preload():
+    # Un fork con una importación a medias en otro hilo puede dejar el
+    # lock de importación tomado en el hijo
+    if _preload_thread is not None:
+        _preload_thread.join()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    start_preload()
+    dispatcher = asyncio.create_task(dispatch_jobs()) if JOB_WORKERS > 0 else None
+    yield
+    if dispatcher is not None:
+        dispatcher.cancel()
+    shutdown_job_executor()
+    shutdown_analysis_executor()
+
+
+configure_logging()
+if PRELOAD_MODE == 'eager':
+    start_preload()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -22,7 +109,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[METADATA_HEADER, "Server-Timing"],
 )
+app.add_middleware(MetricsMiddleware)
 
 class AnalyzeTDRResponse(BaseModel):
     length_meters: float
@@ -31,199 +120,622 @@ class AnalyzeTDRResponse(BaseModel):
     vswr: float
     reflection_coefficient: float
     beta: float
-    alpha: float
+    alpha: Optional[float]
     Z0: float
     load_type: str
     load_value: float
-    tdr_plot_base64: str
+    delta_t: Optional[float] = None
+    frequency: Optional[dict] = None
+    attenuation: Optional[dict] = None
+    discontinuities: Optional[dict] = None
+    uncertainty: Optional[dict] = None
+    tdr_plot_base64: Optional[str] = None
+    plot_url: Optional[str] = None
     waveform: list
 
-def process_csv_file(file: UploadFile) -> Tuple[np.ndarray, np.ndarray, Dict[str, float]]:
+
+class WaveformHandleResponse(BaseModel):
+    handle: str
+    points: int
+    config: dict
+    events: dict
+    plot_url: str
+
+
+class ReanalyzeTDRResponse(BaseModel):
+    handle: str
+    length_meters: float
+    error_percent: float
+    velocity_factor: float
+    vswr: float
+    reflection_coefficient: float
+    beta: float
+    alpha: Optional[float]
+    Z0: float
+    load_type: str
+    load_value: float
+    delta_t: Optional[float] = None
+    frequency: Optional[dict] = None
+    attenuation: Optional[dict] = None
+    discontinuities: Optional[dict] = None
+
+
+class AnalyzeChannelsResponse(BaseModel):
+    config: dict
+    channels: dict
+    two_port: Optional[dict] = None
+
+
+class LTspiceImportResponse(BaseModel):
+    traces: List[str]
+    trace: str
+    format: str
+    points: int
+    frequency: List[float]
+    magnitude_db: List[float]
+    phase: List[float]
+    comparison: Optional[dict] = None
+
+# Número de líneas de cabecera que exporta el osciloscopio Siglent
+CSV_HEADER_LINES = 11
+# Filas de datos procesadas por bloque al leer el cuerpo del CSV
+CSV_CHUNK_ROWS = 1 << 18
+
+
+def _parse_channel_values(field: str) -> Dict[str, float]:
     """
-    Procesa archivo CSV con cabeceras de configuración del osciloscopio.
-    Retorna tiempo, voltaje y parámetros de configuración.
+    Convierte un campo por canal como "CH1:1.00 CH2:0.50" en {'CH1': 1.0, 'CH2': 0.5}.
+    """
+    values = {}
+    for token in field.split():
+        name, sep, value = token.partition(':')
+        if sep:
+            values[name.strip()] = float(value)
+    return values
+
+
+def _parse_header_lines(lines: List[str]) -> Dict[str, float]:
     """
+    Extrae los parámetros de configuración de las líneas de cabecera.
+
+    Los parámetros por canal (intervalo de muestreo, escala y offset vertical)
+    se guardan en config['channel_config']; las claves de primer nivel
+    conservan los valores del primer canal.
+    """
+    config = {}
+    channel_config = {}
+    for line in lines:
+        key, _, rest = line.strip().partition(',')
+        key = key.strip()
+        field = rest.split(',')[0].strip()
+
+        # Extraer valores numéricos
+        if 'Record Length' in key:
+            config['record_length'] = int(float(field.split(':')[-1]))
+        elif 'Horizontal Scale' in key:
+            config['horizontal_scale'] = float(field)
+        elif key == 'Source':
+            config['channels'] = [name.strip() for name in rest.split(',') if name.strip()]
+        elif key in ('Model Number', 'Serial Number', 'Software Version'):
+            # Identificación del osciloscopio, usada para indexar las capturas
+            config[key.lower().replace(' ', '_')] = field
+        else:
+            for label, name in (('Sample Interval', 'sample_interval'),
+                                ('Vertical Scale', 'vertical_scale'),
+                                ('Vertical Offset', 'vertical_offset')):
+                if label in key:
+                    per_channel = _parse_channel_values(field)
+                    for channel, value in per_channel.items():
+                        channel_config.setdefault(channel, {})[name] = value
+                    if per_channel:
+                        config[name] = next(iter(per_channel.values()))
+
+    if channel_config:
+        config['channel_config'] = channel_config
+        config.setdefault('channels', list(channel_config))
+    return config
+
+
+def _is_numeric_row(line: str) -> bool:
     try:
-        # Leer todas las líneas para extraer cabeceras
-        content = file.file.read().decode('utf-8')
-        lines = content.split('\n')
-
-        # Extraer parámetros de configuración
-        config = {}
-        for line in lines[:11]:  # Primeras 11 líneas son cabeceras
-            if ':' in line:
-                key, value = line.split(':', 1)
-                key = key.strip()
-                value = value.strip()
-
-                # Extraer valores numéricos
-                if 'Sample Interval' in key:
-                    config['sample_interval'] = float(value.split(',')[0])
-                elif 'Vertical Scale' in key:
-                    config['vertical_scale'] = float(value.split(',')[0])
-                elif 'Vertical Offset' in key:
-                    config['vertical_offset'] = float(value.split(',')[0])
-                elif 'Horizontal Scale' in key:
-                    config['horizontal_scale'] = float(value)
-
-        # Leer datos a partir de la línea 12
-        df = pd.read_csv(io.StringIO('\n'.join(lines[11:])), header=None)
-    except Exception as e:
-        raise ValueError(f"Failed to read CSV file: {str(e)}")
+        float(line.split(',', 1)[0])
+        return True
+    except ValueError:
+        return False
 
-    if df.shape[1] < 2:
-        raise ValueError("CSV must have at least two columns")
 
-    # Convertir columnas a numéricas
+def _read_csv_body(stream, expected_rows: int, first_row: str = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Lee el cuerpo numérico del CSV por bloques directamente desde el stream,
+    escribiendo en arreglos preasignados según el "Record Length".
+    Retorna el tiempo (N,) y los voltajes de todos los canales (canales, N).
+    """
+    capacity = max(expected_rows, 1)
+    time = np.empty(capacity)
+    voltages = None
+    count = 0
+
+    def append(columns: np.ndarray):
+        nonlocal time, voltages, capacity, count
+        if columns.shape[1] < 2:
+            raise ValueError("CSV must have at least two columns")
+        if voltages is None:
+            voltages = np.empty((columns.shape[1] - 1, capacity))
+        n = len(columns)
+        if count + n > capacity:
+            # La cabecera subestimó el número de filas: crecer geométricamente
+            capacity = max(count + n, capacity * 2)
+            time = np.resize(time, capacity)
+            grown = np.empty((voltages.shape[0], capacity))
+            grown[:, :count] = voltages[:, :count]
+            voltages = grown
+        time[count:count + n] = columns[:, 0]
+        voltages[:, count:count + n] = columns[:, 1:voltages.shape[0] + 1].T
+        count += n
+
+    import pandas as pd
+
+    def numeric(chunk: pd.DataFrame) -> np.ndarray:
+        return chunk.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+
+    if first_row is not None:
+        append(numeric(pd.DataFrame([first_row.split(',')])))
+
+    reader = pd.read_csv(stream, header=None, chunksize=CSV_CHUNK_ROWS,
+                         skip_blank_lines=True)
+    for chunk in reader:
+        append(numeric(chunk))
+
+    if voltages is None:
+        return time[:0], np.empty((1, 0))
+    return time[:count], voltages[:, :count]
+
+
+def _read_csv(file: UploadFile) -> Tuple[np.ndarray, np.ndarray, Dict[str, float]]:
+    """
+    Lee cabecera y cuerpo de un CSV del osciloscopio sin procesar la señal.
+    """
+    stream = file.file
     try:
-        time = pd.to_numeric(df.iloc[:, 0], errors='coerce').values
-        voltage = pd.to_numeric(df.iloc[:, 1], errors='coerce').values
+        # Leer solo las líneas de cabecera
+        header = [stream.readline().decode('utf-8', errors='replace')
+                  for _ in range(CSV_HEADER_LINES)]
+        config = _parse_header_lines(header)
+
+        # La línea 12 contiene las unidades de columna ("Second,Volt")
+        first_row = stream.readline().decode('utf-8', errors='replace').strip()
+        if not first_row or not _is_numeric_row(first_row):
+            first_row = None
+
+        time, voltages = _read_csv_body(stream, config.get('record_length', 0), first_row)
     except Exception as e:
-        raise ValueError(f"Columns must contain numeric data: {str(e)}")
+        raise ValueError(f"Failed to read CSV file: {str(e)}")
 
+    if len(time) == 0:
+        raise ValueError("CSV file contains no data rows")
+
+    n_channels = voltages.shape[0]
+    if len(config.get('channels', [])) != n_channels:
+        config['channels'] = [f"CH{i + 1}" for i in range(n_channels)]
+    return time, voltages, config
+
+
+def _drop_invalid_rows(time: np.ndarray, voltages: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Elimina las filas con valores no numéricos en el tiempo o en los canales dados.
+    """
     # Debug: verificar valores no numéricos
-    nan_time = np.sum(np.isnan(time))
-    nan_voltage = np.sum(np.isnan(voltage))
-
-    if nan_time > 0 or nan_voltage > 0:
-        print(f"DEBUG: Found {nan_time} NaN values in time, {nan_voltage} NaN values in voltage")
-        # Mostrar algunas líneas problemáticas
-        problematic_rows = []
-        for i in range(min(10, len(df))):
-            try:
-                t_val = float(df.iloc[i, 0])
-                v_val = float(df.iloc[i, 1])
-            except (ValueError, TypeError):
-                problematic_rows.append((i, df.iloc[i, 0], df.iloc[i, 1]))
+    invalid_mask = np.isnan(time) | np.isnan(voltages).any(axis=0)
+    n_invalid = int(np.count_nonzero(invalid_mask))
 
-        if problematic_rows:
-            print("DEBUG: Problematic rows (first 5):")
-            for row_idx, t_str, v_str in problematic_rows[:5]:
-                print(f"  Row {row_idx}: time='{t_str}', voltage='{v_str}'")
+    if n_invalid > 0:
 
         # Intentar limpiar los datos eliminando filas con NaN
-        valid_mask = ~(np.isnan(time) | np.isnan(voltage))
-        if np.sum(valid_mask) < len(time) * 0.8:  # Si perdemos más del 20% de datos
-            raise ValueError(f"Too many invalid values: {np.sum(~valid_mask)}/{len(time)} rows contain NaN")
+        if len(time) - n_invalid < len(time) * 0.8:  # Si perdemos más del 20% de datos
+            raise ValueError(f"Too many invalid values: {n_invalid}/{len(time)} rows contain NaN")
 
+        valid_mask = ~invalid_mask
         time = time[valid_mask]
-        voltage = voltage[valid_mask]
-        print(f"DEBUG: Cleaned data, remaining {len(time)} valid points")
+        voltages = voltages[:, valid_mask]
+        log_event(logging.INFO, "dropped_invalid_rows", invalid=n_invalid, remaining=len(time))
 
-    # Aplicar corrección de offset si existe
-    if 'vertical_offset' in config:
-        voltage = voltage + config['vertical_offset']
+    return time, voltages
 
-    # Suavizar señal usando filtro Savitzky-Golay
-    window_length = min(51, len(voltage) // 2 * 2 + 1)  # Asegurar número impar
-    if window_length > 2:
-        voltage_smooth = savgol_filter(voltage, window_length, 3)
-    else:
-        voltage_smooth = voltage
 
-    return time, voltage_smooth, config
+def process_csv_file(file: UploadFile, smooth: bool = True) -> Tuple[np.ndarray, np.ndarray, Dict[str, float]]:
+    """
+    Procesa archivo CSV con cabeceras de configuración del osciloscopio.
+    Retorna tiempo, voltaje y parámetros de configuración.
+
+    El cuerpo se lee en una sola pasada desde el stream de subida, sin
+    materializar el texto completo en memoria. Solo se procesa el primer canal;
+    ver process_csv_channels para capturas multicanal.
+    """
+    with stage('parse') as parse:
+        time, voltages, config = _read_csv(file)
+        time, voltages = _drop_invalid_rows(time, voltages[:1])
+        parse.samples = len(time)
+    return time, condition_voltage(voltages[0], config, smooth), config
+
 
-def detect_pulse_events(time: np.ndarray, voltage: np.ndarray, config: Dict[str, float]) -> Dict[str, float]:
+def process_csv_channels(file: UploadFile) -> Tuple[np.ndarray, np.ndarray, Dict[str, float]]:
     """
-    Detecta automáticamente eventos en la señal TDR.
-    Retorna parámetros temporales del pulso.
+    Procesa todos los canales de un CSV en un arreglo (canales, N), aplicando
+    a cada uno su propio offset vertical antes del suavizado.
+    """
+    with stage('parse') as parse:
+        time, voltages, config = _read_csv(file)
+        time, voltages = _drop_invalid_rows(time, voltages)
+        parse.samples = voltages.size
+    return time, condition_voltage(voltages, config), config
+
+
+def condition_voltage(voltage: np.ndarray, config: Dict[str, float], smooth: bool = True) -> np.ndarray:
+    """
+    Aplica la corrección de offset y el suavizado comunes a todos los formatos.
+    Acepta un canal (N,) o varios canales (canales, N). Con smooth=False solo
+    se corrige el offset (p. ej. para promediar adquisiciones sin filtrar).
+    """
+    with stage('filter', voltage.size):
+        # Aplicar corrección de offset si existe
+        if voltage.ndim == 2:
+            channel_config = config.get('channel_config', {})
+            offsets = np.array([channel_config.get(ch, {}).get('vertical_offset', 0.0)
+                                for ch in config.get('channels', [])[:voltage.shape[0]]])
+            voltage = voltage + offsets[:, np.newaxis]
+        elif 'vertical_offset' in config:
+            voltage = voltage + config['vertical_offset']
+
+        voltage_smooth = smooth_voltage(voltage) if smooth else voltage
+
+    return voltage_smooth
+
+
+def smooth_voltage(voltage: np.ndarray) -> np.ndarray:
+    """
+    Suavizado Savitzky-Golay a lo largo del último eje, para una traza (N,) o
+    un lote de filas (filas, N).
+    """
+    window_length = min(51, voltage.shape[-1] // 2 * 2 + 1)  # Asegurar número impar
+    if window_length <= 2:
+        return voltage
+    from scipy.signal import savgol_filter
+    return savgol_filter(voltage, window_length, 3, axis=-1)
+
+
+# Disposición de la cabecera del formato binario Siglent (.bin, versión 2)
+BIN_DATA_WITH_UNIT_SIZE = 40  # double valor + long magnitud + 7 long de unidad
+BIN_MAGNITUDE_OFFSET = 8  # Dentro de un valor con unidad: potencia de 1000 (8 = unidad)
+BIN_UNIT_MAGNITUDE = 8
+BIN_MAX_MAGNITUDE = 13  # De 0 (yocto) a 13 (peta)
+BIN_CH_ON_OFFSET = 0x04
+BIN_VDIV_OFFSET = 0x14
+BIN_VOFFSET_OFFSET = 0xb4
+BIN_TDIV_OFFSET = 0x198
+BIN_WAVE_LENGTH_OFFSET = 0x1e8
+BIN_SAMPLE_RATE_OFFSET = 0x1ec
+BIN_DATA_WIDTH_OFFSET = 0x260
+BIN_BYTE_ORDER_OFFSET = 0x261
+BIN_CODE_PER_DIV_OFFSET = 0x26a  # long[4], códigos ADC por división de cada canal
+BIN_DATA_OFFSET = 0x800
+BIN_MAX_CHANNELS = 4
+
+
+def _parse_bin_header(header: bytes) -> Dict[str, float]:
+    """
+    Extrae los parámetros de adquisición de la cabecera binaria.
+    """
+    if len(header) < BIN_DATA_OFFSET:
+        raise ValueError("Binary file is too short to contain a waveform header")
+
+    ch_on = struct.unpack_from(f'<{BIN_MAX_CHANNELS}i', header, BIN_CH_ON_OFFSET)
+    enabled = [ch for ch in range(BIN_MAX_CHANNELS) if ch_on[ch]]
+    if not enabled:
+        raise ValueError("Binary file has no enabled analog channels")
+
+    def value_with_unit(offset: int) -> float:
+        value = struct.unpack_from('<d', header, offset)[0]
+        magnitude = struct.unpack_from('<i', header, offset + BIN_MAGNITUDE_OFFSET)[0]
+        # 0 (yocto) no aparece en capturas reales: un campo vacío se lee en unidades base
+        if 0 < magnitude <= BIN_MAX_MAGNITUDE:
+            value *= 1000.0 ** (magnitude - BIN_UNIT_MAGNITUDE)
+        return value
+
+    # Se analiza el primer canal activo, igual que en el CSV
+    channel = enabled[0]
+    sample_rate = value_with_unit(BIN_SAMPLE_RATE_OFFSET)
+    if sample_rate <= 0:
+        raise ValueError("Binary header has an invalid sample rate")
+    # Cabeceras sin el campo (0): rejilla estándar del Siglent
+    code_per_div = struct.unpack_from('<i', header, BIN_CODE_PER_DIV_OFFSET + 4 * channel)[0]
+
+    return {
+        'record_length': struct.unpack_from('<i', header, BIN_WAVE_LENGTH_OFFSET)[0],
+        'sample_interval': 1.0 / sample_rate,
+        'vertical_scale': value_with_unit(BIN_VDIV_OFFSET + channel * BIN_DATA_WITH_UNIT_SIZE),
+        'vertical_offset': value_with_unit(BIN_VOFFSET_OFFSET + channel * BIN_DATA_WITH_UNIT_SIZE),
+        'horizontal_scale': value_with_unit(BIN_TDIV_OFFSET) * 1e6,  # en us, como el CSV
+        'code_per_div': code_per_div if code_per_div > 0 else CODES_PER_DIV,
+        'channel_index': enabled.index(channel),
+        'data_width': 2 if header[BIN_DATA_WIDTH_OFFSET] else 1,
+        'big_endian': bool(header[BIN_BYTE_ORDER_OFFSET]),
+    }
+
+
+def _read_bin(stream) -> Tuple[np.ndarray, np.ndarray, Dict[str, float]]:
+    """
+    Lee cabecera y muestras del primer canal activo de un .bin sin procesar la señal.
+    """
+    stream.seek(0)
+    try:
+        buffer = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        # Archivos pequeños que aún residen en memoria
+        buffer = stream.read()
+
+    try:
+        header = _parse_bin_header(bytes(buffer[:BIN_DATA_OFFSET]))
+        n = header.pop('record_length')
+        width = header.pop('data_width')
+        big_endian = header.pop('big_endian')
+        channel_index = header.pop('channel_index')
+        if n <= 0:
+            raise ValueError("Binary header reports an empty record")
+
+        dtype = np.dtype(np.int8) if width == 1 else np.dtype('>i2' if big_endian else '<i2')
+        offset = BIN_DATA_OFFSET + channel_index * n * width
+        if len(buffer) < offset + n * width:
+            raise ValueError("Binary file is truncated")
+
+        codes = np.frombuffer(buffer, dtype=dtype, count=n, offset=offset)
+        # Las muestras de 16 bits llevan el código alineado al byte alto
+        code_per_div = header['code_per_div'] * (256 if width == 2 else 1)
+        voltage = codes * (header['vertical_scale'] / code_per_div) - header['vertical_offset']
+        del codes
+    finally:
+        if isinstance(buffer, mmap.mmap):
+            buffer.close()
+
+    config = dict(header, record_length=n)
+    time = np.arange(n) * config['sample_interval']
+    return time, voltage, config
+
+
+def process_bin_file(file: UploadFile, smooth: bool = True) -> Tuple[np.ndarray, np.ndarray, Dict[str, float]]:
+    """
+    Procesa la exportación binaria de forma de onda del osciloscopio Siglent.
+    Retorna tiempo, voltaje y parámetros de configuración, igual que process_csv_file.
+
+    El archivo se mapea en memoria y los códigos ADC se convierten a voltios
+    en una sola operación vectorizada.
+    """
+    with stage('parse') as parse:
+        time, voltage, config = _read_bin(file.file)
+        parse.samples = len(time)
+    return time, condition_voltage(voltage, config, smooth), config
+
+
+SUPPORTED_EXTENSIONS = ('.csv', '.bin')
+
+
+def load_waveform_file(file: UploadFile, smooth: bool = True) -> Tuple[np.ndarray, np.ndarray, Dict[str, float]]:
+    """
+    Selecciona el lector adecuado según la extensión del archivo subido.
+    """
+    if file.filename and file.filename.lower().endswith('.bin'):
+        return process_bin_file(file, smooth)
+    return process_csv_file(file, smooth)
+
+
+def detect_event_arrays(time: np.ndarray, voltages: np.ndarray) -> Dict[str, np.ndarray]:
     """
+    Detecta automáticamente eventos en la señal TDR de varias filas a la vez
+    (canales o ensayos Monte Carlo). voltages tiene forma (filas, N); retorna
+    un arreglo por evento con un elemento por fila. Los eventos ausentes valen
+    0.0, como en los diccionarios de detect_channel_events tras `or 0.0`.
+
+    Las mesetas se segmentan por codificación de longitud de corridas sobre la
+    máscara de derivada baja, y la búsqueda de la reflexión reutiliza la misma
+    derivada mediante aritmética de índices (se asume tiempo creciente).
+    """
+    n_channels, n = voltages.shape
+
     # Encontrar inicio del pulso incidente (10% del máximo)
-    v_max = np.max(voltage)
+    v_max = np.max(voltages, axis=1)
     threshold = 0.1 * v_max
 
     # Encontrar primer cruce del umbral
-    above_threshold = voltage > threshold
-    if not np.any(above_threshold):
-        raise ValueError("No se detectó pulso incidente")
+    above_threshold = voltages > threshold[:, np.newaxis]
+    has_pulse = np.any(above_threshold, axis=1)
 
-    t0_idx = np.where(above_threshold)[0][0]
+    t0_idx = np.argmax(above_threshold, axis=1)
     t0 = time[t0_idx]
 
     # Encontrar tiempo de subida (10% a 90%)
     v_10 = 0.1 * v_max
     v_90 = 0.9 * v_max
 
-    idx_10 = np.where(voltage >= v_10)[0][0]
-    idx_90 = np.where(voltage >= v_90)[0][0]
+    idx_10 = np.argmax(voltages >= v_10[:, np.newaxis], axis=1)
+    idx_90 = np.argmax(voltages >= v_90[:, np.newaxis], axis=1)
 
     t_10 = time[idx_10]
     t_90 = time[idx_90]
     rise_time = t_90 - t_10
 
-    # Frecuencia efectiva del pulso
-    f_eff = 0.35 / rise_time if rise_time > 0 else 0
-
     # Detectar meseta (región donde derivada ≈ 0)
-    dv_dt = np.gradient(voltage, time)
-    plateau_mask = np.abs(dv_dt) < (v_max / len(time)) * 0.01  # Umbral bajo
-
-    # Encontrar segmentos continuos de meseta
-    plateau_segments = []
-    in_plateau = False
-    start_idx = 0
-
-    for i in range(len(plateau_mask)):
-        if plateau_mask[i] and not in_plateau:
-            in_plateau = True
-            start_idx = i
-        elif not plateau_mask[i] and in_plateau:
-            in_plateau = False
-            duration = time[i-1] - time[start_idx]
-            if duration >= 20e-9:  # Mínimo 20 ns
-                plateau_segments.append((start_idx, i-1, duration))
-
-    # Usar la meseta más larga después del frente de subida
-    plateau_start = plateau_end = None
-    if plateau_segments:
-        # Filtrar mesetas que empiecen después del 90% del pulso
-        valid_plateaus = [p for p in plateau_segments if time[p[0]] > t_90]
-        if valid_plateaus:
-            best_plateau = max(valid_plateaus, key=lambda x: x[2])
-            plateau_start = time[best_plateau[0]]
-            plateau_end = time[best_plateau[1]]
-
-    # Detectar reflexión
-    reflection_start = None
-    if plateau_end:
-        # Buscar cambio brusco después de la meseta
-        post_plateau = voltage[time > plateau_end]
-        time_post = time[time > plateau_end]
-
-        if len(post_plateau) > 10:
-            dv_dt_post = np.abs(np.gradient(post_plateau, time_post))
-            threshold_reflection = np.max(dv_dt_post) * 0.5
-
-            reflection_idx = np.where(dv_dt_post > threshold_reflection)[0]
-            if len(reflection_idx) > 0:
-                reflection_start = time_post[reflection_idx[0]]
-
+    dv_dt = np.gradient(voltages, time, axis=1)
+    plateau_mask = np.abs(dv_dt) < ((v_max / n) * 0.01)[:, np.newaxis]  # Umbral bajo
+
+    # Segmentos continuos de meseta: bordes de las corridas de la máscara.
+    # Una meseta que llega al final del registro no tiene cierre y se descarta.
+    edges = np.diff(plateau_mask.astype(np.int8), axis=1, prepend=0, append=0)
+    seg_channel, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)
+    closed = ends < n
+    seg_channel, starts, ends = seg_channel[closed], starts[closed], ends[closed] - 1
+    durations = time[ends] - time[starts]
+
+    # Usar la meseta más larga después del frente de subida (mínimo 20 ns)
+    valid = (durations >= 20e-9) & (time[starts] > t_90[seg_channel])
+    seg_channel, starts, ends, durations = seg_channel[valid], starts[valid], ends[valid], durations[valid]
+    order = np.lexsort((starts, -durations, seg_channel))
+    best_channel, first = np.unique(seg_channel[order], return_index=True)
+    best = order[first]
+
+    plateau_start_idx = np.full(n_channels, -1)
+    plateau_end_idx = np.full(n_channels, -1)
+    plateau_start_idx[best_channel] = starts[best]
+    plateau_end_idx[best_channel] = ends[best]
+    has_plateau = plateau_end_idx >= 0
+
+    # Detectar reflexión: cambio brusco después de la meseta
+    reflection_idx = np.full(n_channels, -1)
+    post_idx = np.searchsorted(time, time[plateau_end_idx], side='right')
+    search = np.flatnonzero(has_plateau & (time[plateau_end_idx] != 0) & (n - post_idx > 10))
+    if search.size:
+        post = post_idx[search]
+        dv_dt_post = np.abs(dv_dt[search])
+        # El primer punto del tramo usa diferencia hacia adelante, como np.gradient del tramo
+        dv_dt_post[np.arange(search.size), post] = np.abs(
+            (voltages[search, post + 1] - voltages[search, post]) / (time[post + 1] - time[post]))
+        dv_dt_post[np.arange(n) < post[:, np.newaxis]] = -np.inf
+        threshold_reflection = np.max(dv_dt_post, axis=1) * 0.5
+
+        above_reflection = dv_dt_post > threshold_reflection[:, np.newaxis]
+        found = np.any(above_reflection, axis=1)
+        reflection_idx[search[found]] = np.argmax(above_reflection[found], axis=1)
+
+    has_reflection = reflection_idx >= 0
     return {
+        'has_pulse': has_pulse,
         't0': t0,
         'rise_time': rise_time,
-        'f_eff': f_eff,
-        'plateau_start': plateau_start,
-        'plateau_end': plateau_end,
-        'reflection_start': reflection_start,
-        'v_max': v_max
+        'plateau_start': np.where(has_plateau, time[plateau_start_idx], 0.0),
+        'plateau_end': np.where(has_plateau, time[plateau_end_idx], 0.0),
+        'reflection_start': np.where(has_reflection, time[reflection_idx], 0.0),
+        'has_plateau': has_plateau,
+        'has_reflection': has_reflection,
+        'v_max': v_max,
     }
 
-def calculate_temporal_parameters(events: Dict[str, float], cable_length: float, c: float = 299792458) -> Dict[str, float]:
+
+def detect_channel_events(time: np.ndarray, voltages: np.ndarray) -> List[Optional[Dict[str, float]]]:
+    """
+    Detecta automáticamente eventos en la señal TDR de varios canales a la vez.
+    voltages tiene forma (canales, N); retorna un diccionario de eventos por
+    canal, o None para los canales sin pulso incidente.
+    """
+    arrays = detect_event_arrays(time, voltages)
+    events = []
+    for ch in range(voltages.shape[0]):
+        if not arrays['has_pulse'][ch]:
+            events.append(None)
+            continue
+        rise_time = arrays['rise_time'][ch]
+        events.append({
+            't0': arrays['t0'][ch],
+            'rise_time': rise_time,
+            # Frecuencia efectiva del pulso
+            'f_eff': 0.35 / rise_time if rise_time > 0 else 0,
+            'plateau_start': arrays['plateau_start'][ch] if arrays['has_plateau'][ch] else None,
+            'plateau_end': arrays['plateau_end'][ch] if arrays['has_plateau'][ch] else None,
+            'reflection_start': arrays['reflection_start'][ch] if arrays['has_reflection'][ch] else None,
+            'v_max': arrays['v_max'][ch]
+        })
+    return events
+
+
+def detect_pulse_events(time: np.ndarray, voltage: np.ndarray, config: Dict[str, float]) -> Dict[str, float]:
+    """
+    Detecta automáticamente eventos en la señal TDR.
+    Retorna parámetros temporales del pulso.
+    """
+    with stage('detect', len(voltage)):
+        events = detect_channel_events(time, voltage[np.newaxis, :])[0]
+    if events is None:
+        raise ValueError("No se detectó pulso incidente")
+    return events
+
+
+# Métodos para estimar Δt; 'auto' prueba meseta → reflexión → 90% en ese orden
+DT_METHODS = ('auto', 'plateau', 'reflection', 'rise', 'xcorr')
+XCORR_MIN_EDGE_SAMPLES = 8  # Margen mínimo alrededor del frente incidente
+XCORR_MIN_REFLECTION = 0.05  # |Γ| mínimo para aceptar el pico de correlación
+
+
+def estimate_delay_xcorr(time: np.ndarray, voltage: np.ndarray, events: Dict[str, float]) -> Optional[float]:
+    """
+    Estima el retardo entre el frente incidente y el reflejado por correlación
+    cruzada de sus derivadas (FFT, O(N log N)), con interpolación parabólica
+    del pico para resolución menor que el intervalo de muestreo.
+    Retorna None si no hay un frente reflejado significativo. Supone muestreo uniforme.
+    """
+    n = len(time)
+    if n < 4:
+        return None
+    sample_interval = (time[-1] - time[0]) / (n - 1)
+
+    # Plantilla: derivada alrededor del frente incidente. El frente se delimita
+    # por el pico local de la derivada tras t0 y su caída al 10% del pico; no se
+    # usa rise_time porque una reflexión positiva puede incluirse en el 10-90%.
+    edge = np.gradient(voltage, time)
+    t0_idx = min(int(np.searchsorted(time, events['t0'])), n - 2)
+    peak_idx, half_width = incident_edge(edge, t0_idx)
+    margin = max(half_width, XCORR_MIN_EDGE_SAMPLES)
+    start = max(peak_idx - margin, 0)
+    stop = min(peak_idx + margin + 1, n)
+    template = edge[start:stop]
+
+    # Señal de búsqueda: derivada después del frente incidente
+    reflected = edge.copy()
+    reflected[:stop] = 0.0
+
+    from scipy.signal import correlate
+
+    corr = correlate(reflected, template, mode='full', method='fft')
+    # corr[j] compara la plantilla desplazada lag = j - (len(template) - 1) - start muestras
+    first = stop + len(template) - 1  # La plantilla completa más allá de su propia ventana
+    if first >= len(corr) - 1:
+        return None
+    peak = first + int(np.argmax(np.abs(corr[first:-1])))
+    # El pico normalizado por la energía de la plantilla aproxima |Γ|
+    energy = np.dot(template, template)
+    if peak == first or energy == 0 or abs(corr[peak]) < XCORR_MIN_REFLECTION * energy:
+        return None
+
+    # Interpolación parabólica (en cortocircuito el pico es negativo)
+    y0, y1, y2 = np.sign(corr[peak]) * corr[peak - 1:peak + 2]
+    denominator = y0 - 2 * y1 + y2
+    offset = 0.5 * (y0 - y2) / denominator if denominator != 0 else 0.0
+
+    lag = peak + offset - (len(template) - 1) - start
+    return lag * sample_interval
+
+
+def calculate_temporal_parameters(events: Dict[str, float], cable_length: float, c: float = 299792458,
+                                  method: str = 'auto', time: Optional[np.ndarray] = None,
+                                  voltage: Optional[np.ndarray] = None) -> Dict[str, float]:
     """
     Calcula parámetros temporales y de línea según especificaciones TDR.
+    method elige el estimador de Δt (ver DT_METHODS); 'xcorr' requiere la
+    forma de onda (time, voltage).
     """
+    if method not in DT_METHODS:
+        raise ValueError(f"dt_method must be one of {', '.join(DT_METHODS)}")
+    if method == 'xcorr' and (time is None or voltage is None):
+        raise ValueError("dt_method 'xcorr' requires the waveform (time and voltage)")
     dt = None
 
     # Método 1: Si hay meseta → Δt = fin_meseta - inicio_pulso
-    if events['plateau_end'] and events['t0']:
+    if method in ('auto', 'plateau') and events['plateau_end'] and events['t0']:
         dt = events['plateau_end'] - events['t0']
 
     # Método 2: Si hay reflexión detectada
-    elif events['reflection_start'] and events['t0']:
+    elif method in ('auto', 'reflection') and events['reflection_start'] and events['t0']:
         dt = events['reflection_start'] - events['t0']
 
     # Método 3: Usar tiempo donde señal alcanza 90% del máximo
-    else:
+    elif method in ('auto', 'rise'):
         # Buscar tiempo donde señal alcanza 90% del máximo después del pulso
         t_90_max = None
         for t, v in zip(np.linspace(events['t0'], events['t0'] + 1e-6, 1000), np.linspace(0, events['v_max'], 1000)):
@@ -233,6 +745,10 @@ def calculate_temporal_parameters(events: Dict[str, float], cable_length: float,
         if t_90_max:
             dt = t_90_max - events['t0']
 
+    # Método 4: Correlación cruzada entre frente incidente y reflejado
+    elif method == 'xcorr':
+        dt = estimate_delay_xcorr(time, voltage, events)
+
     if dt is None or dt <= 0:
         raise ValueError("No se pudo calcular Δt")
 
@@ -247,59 +763,189 @@ def calculate_temporal_parameters(events: Dict[str, float], cable_length: float,
 
     return {
         'dt': dt,
+        'method': method,
         'vp': vp,
         'velocity_factor': velocity_factor,
         'epsilon_eff': epsilon_eff
     }
 
 
-def analyze_impedance_reflection(voltage: np.ndarray, time: np.ndarray, events: Dict[str, float],
-                               temporal_params: Dict[str, float], z0_expected: float) -> Dict[str, float]:
+def delay_source_arrays(events: Dict[str, np.ndarray], method: str = 'auto') -> np.ndarray:
     """
-    Analiza impedancia y coeficiente de reflexión.
+    Método que aporta el Δt de cada fila en delay_arrays: 'plateau',
+    'reflection', 'rise' o '' donde no hay pulso. 'rise' no mide la traza:
+    es un valor fijo de 900 ns que solo depende de la ventana de 1 µs.
     """
-    # Voltaje incidente (promedio en meseta o valor estable)
-    if events['plateau_start'] and events['plateau_end']:
-        # Usar promedio en la meseta
-        plateau_mask = (time >= events['plateau_start']) & (time <= events['plateau_end'])
-        vi = np.mean(voltage[plateau_mask])
-    else:
-        # Usar valor estable después del tiempo de propagación
-        stable_time = events['t0'] + temporal_params['dt']
-        stable_mask = time >= stable_time
-        if np.any(stable_mask):
-            vi = np.mean(voltage[stable_mask][:10])  # Promedio primeros 10 puntos estables
-        else:
-            vi = events['v_max'] * 0.8  # Valor aproximado
+    t0 = events['t0']
+    remaining = events['has_pulse'] & (t0 != 0)
+    source = np.full(len(t0), '', dtype='<U10')
+    for name, key in (('plateau', 'plateau_end'), ('reflection', 'reflection_start')):
+        if method in ('auto', name):
+            use = remaining & (events[key] != 0)
+            source[use] = name
+            remaining &= ~use
+    if method in ('auto', 'rise'):
+        source[remaining] = 'rise'
+    return source
+
+
+def delay_arrays(events: Dict[str, np.ndarray], method: str = 'auto') -> np.ndarray:
+    """
+    Δt por fila a partir de detect_event_arrays, con la misma cadena de
+    métodos que calculate_temporal_parameters ('xcorr' necesita la forma de
+    onda: ver delay_xcorr_arrays). NaN donde no se puede calcular.
+    """
+    if method not in DT_METHODS or method == 'xcorr':
+        raise ValueError(f"dt_method must be one of {', '.join(m for m in DT_METHODS if m != 'xcorr')}")
+    t0 = events['t0']
+    source = delay_source_arrays(events, method)
+    dt = np.full(len(t0), np.nan)
+
+    use_plateau = source == 'plateau'
+    dt[use_plateau] = events['plateau_end'][use_plateau] - t0[use_plateau]
+
+    use_reflection = source == 'reflection'
+    dt[use_reflection] = events['reflection_start'][use_reflection] - t0[use_reflection]
+
+    # Mismo resultado que el barrido de 1000 puntos sobre 1 µs: el 90% de
+    # v_max se alcanza en el índice 900 si v_max > 0 (si no, Δt = 0)
+    use_rise = source == 'rise'
+    step = ((t0 + 1e-6) - t0) / 999
+    rise = np.where(events['v_max'] > 0, (900 * step + t0) - t0, 0.0)
+    dt[use_rise] = rise[use_rise]
+
+    dt[~(dt > 0)] = np.nan
+    return dt
 
-    # Voltaje reflejado
-    if events['reflection_start']:
-        reflection_mask = time >= events['reflection_start']
-        if np.any(reflection_mask):
-            vr = voltage[reflection_mask][0] - vi
-        else:
-            vr = 0
-    else:
-        # Si no hay reflexión clara, asumir adaptación
-        vr = 0
+
+def delay_xcorr_arrays(time: np.ndarray, voltages: np.ndarray, events: Dict[str, np.ndarray]) -> np.ndarray:
+    """
+    estimate_delay_xcorr sobre cada fila de voltages (forma (filas, N)) con
+    una sola FFT por lote. La plantilla de cada fila se deja en su posición
+    dentro de un vector de N ceros, de modo que el desplazamiento de la
+    correlación es directamente el retardo en muestras. NaN donde no hay
+    frente reflejado significativo.
+    """
+    from scipy import fft
+
+    rows, n = voltages.shape
+    dt = np.full(rows, np.nan)
+    if n < 4:
+        return dt
+    sample_interval = (time[-1] - time[0]) / (n - 1)
+    index = np.arange(n)
+    row = np.arange(rows)
+
+    # incident_edge por filas: pico local de la derivada tras t0 y caída al 10%
+    edge = np.gradient(voltages, time, axis=1)
+    t0_idx = np.minimum(np.searchsorted(time, events['t0']), n - 2)
+    falling = (np.diff(edge, axis=1) < 0) & (index[:-1] >= t0_idx[:, np.newaxis])
+    peak_idx = np.where(falling.any(axis=1), np.argmax(falling, axis=1), n - 1)
+    below = (edge < 0.1 * edge[row, peak_idx][:, np.newaxis]) & (index >= peak_idx[:, np.newaxis])
+    half_width = np.where(below.any(axis=1), np.argmax(below, axis=1) - peak_idx, n - peak_idx)
+    margin = np.maximum(half_width, XCORR_MIN_EDGE_SAMPLES)
+    start = np.maximum(peak_idx - margin, 0)
+    stop = np.minimum(peak_idx + margin + 1, n)
+
+    in_template = (index >= start[:, np.newaxis]) & (index < stop[:, np.newaxis])
+    template = np.where(in_template, edge, 0.0)
+    reflected = np.where(index >= stop[:, np.newaxis], edge, 0.0)
+    del edge, in_template
+
+    # Correlación lineal (sin solapamiento circular) para desplazamientos 0..N-1
+    size = fft.next_fast_len(2 * n, real=True)
+    corr = fft.irfft(fft.rfft(reflected, size, axis=1) * np.conj(fft.rfft(template, size, axis=1)),
+                     size, axis=1)[:, :n]
+    energy = np.einsum('ij,ij->i', template, template)
+    del template, reflected
+
+    # Misma ventana de búsqueda que estimate_delay_xcorr: de stop - start a N - 2 - start
+    first = stop - start
+    last = n - 2 - start
+    searched = (index >= first[:, np.newaxis]) & (index <= last[:, np.newaxis])
+    magnitude = np.where(searched, np.abs(corr), -1.0)
+    lag = np.argmax(magnitude, axis=1)
+    value = corr[row, lag]
+    ok = (events['has_pulse'] & (first < last) & (lag > first) & (energy > 0)
+          & (np.abs(value) >= XCORR_MIN_REFLECTION * energy))
+
+    # Interpolación parabólica (en cortocircuito el pico es negativo)
+    lag_ok, sign = lag[ok], np.sign(value[ok])
+    y0 = sign * corr[row[ok], lag_ok - 1]
+    y1 = sign * corr[row[ok], lag_ok]
+    y2 = sign * corr[row[ok], lag_ok + 1]
+    denominator = y0 - 2 * y1 + y2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        offset = np.where(denominator != 0, 0.5 * (y0 - y2) / denominator, 0.0)
+    dt[ok] = (lag_ok + offset) * sample_interval
+    dt[~(dt > 0)] = np.nan
+    return dt
+
+
+def analyze_impedance_channels(voltages: np.ndarray, time: np.ndarray, events_list: List[Dict[str, float]],
+                               dts: np.ndarray, z0_expected: float) -> Dict[str, np.ndarray]:
+    """
+    Analiza impedancia y coeficiente de reflexión de varios canales a la vez.
+    voltages tiene forma (canales, N); dts es el Δt de cada canal.
+    Retorna un arreglo por parámetro, con un elemento por canal.
+    """
+    def event_times(key: str) -> np.ndarray:
+        return np.array([e[key] or 0.0 for e in events_list], dtype=float)
+
+    events = {key: event_times(key) for key in ('t0', 'plateau_start', 'plateau_end', 'reflection_start', 'v_max')}
+    return analyze_impedance_arrays(voltages, time, events, dts, z0_expected)
+
+
+def analyze_impedance_arrays(voltages: np.ndarray, time: np.ndarray, events: Dict[str, np.ndarray],
+                             dts: np.ndarray, z0_expected: float) -> Dict[str, np.ndarray]:
+    """
+    Igual que analyze_impedance_channels, con los eventos como arreglos por
+    fila (ver detect_event_arrays).
+    """
+    n_channels, n = voltages.shape
+    rows = np.arange(n_channels)
+
+    plateau_start = events['plateau_start']
+    plateau_end = events['plateau_end']
+    reflection_start = events['reflection_start']
+    t0 = events['t0']
+    v_max = events['v_max']
+
+    # Voltaje incidente (promedio en meseta o valor estable)
+    has_plateau = (plateau_start != 0) & (plateau_end != 0)
+    plateau_mask = (time >= plateau_start[:, np.newaxis]) & (time <= plateau_end[:, np.newaxis])
+    plateau_count = np.count_nonzero(plateau_mask, axis=1)
+    vi_plateau = np.where(plateau_mask, voltages, 0).sum(axis=1) / np.maximum(plateau_count, 1)
+
+    # Usar valor estable después del tiempo de propagación (primeros 10 puntos estables)
+    stable_idx = np.searchsorted(time, t0 + np.asarray(dts, dtype=float), side='left')
+    stable_window = stable_idx[:, np.newaxis] + np.arange(10)
+    stable_valid = stable_window < n
+    stable_values = voltages[rows[:, np.newaxis], np.minimum(stable_window, n - 1)]
+    stable_count = np.count_nonzero(stable_valid, axis=1)
+    vi_stable = np.where(stable_valid, stable_values, 0).sum(axis=1) / np.maximum(stable_count, 1)
+
+    vi = np.where(has_plateau, vi_plateau,
+                  np.where(stable_count > 0, vi_stable, v_max * 0.8))  # Valor aproximado sin puntos estables
+
+    # Voltaje reflejado; si no hay reflexión clara, asumir adaptación
+    reflection_idx = np.searchsorted(time, reflection_start, side='left')
+    has_reflection = (reflection_start != 0) & (reflection_idx < n)
+    vr = np.where(has_reflection, voltages[rows, np.minimum(reflection_idx, n - 1)] - vi, 0.0)
 
     # Coeficiente de reflexión
-    reflection_coeff = vr / vi if vi != 0 else 0
+    reflection_coeff = np.divide(vr, vi, out=np.zeros(n_channels), where=vi != 0)
 
     # VSWR
-    gamma_abs = abs(reflection_coeff)
-    vswr = (1 + gamma_abs) / (1 - gamma_abs) if gamma_abs < 1 else 1e10
+    gamma_abs = np.abs(reflection_coeff)
+    with np.errstate(divide='ignore'):
+        vswr = np.where(gamma_abs < 1, (1 + gamma_abs) / (1 - gamma_abs), 1e10)
+        load_value = z0_expected * (1 + reflection_coeff) / (1 - reflection_coeff)
 
     # Tipo de carga
-    if abs(reflection_coeff) < 0.1:
-        load_type = "matched"
-        load_value = z0_expected
-    elif reflection_coeff > 0:
-        load_type = "open"
-        load_value = z0_expected * (1 + reflection_coeff) / (1 - reflection_coeff)
-    else:
-        load_type = "short"
-        load_value = z0_expected * (1 + reflection_coeff) / (1 - reflection_coeff)
+    matched = gamma_abs < 0.1
+    load_type = np.where(matched, "matched", np.where(reflection_coeff > 0, "open", "short"))
+    load_value = np.where(matched, z0_expected, load_value)
 
     return {
         'vi': vi,
@@ -308,46 +954,34 @@ def analyze_impedance_reflection(voltage: np.ndarray, time: np.ndarray, events:
         'vswr': vswr,
         'load_type': load_type,
         'load_value': load_value,
-        'z0': z0_expected
+        'z0': np.full(n_channels, z0_expected)
     }
 
 
+def analyze_impedance_reflection(voltage: np.ndarray, time: np.ndarray, events: Dict[str, float],
+                               temporal_params: Dict[str, float], z0_expected: float) -> Dict[str, float]:
+    """
+    Analiza impedancia y coeficiente de reflexión.
+    """
+    params = analyze_impedance_channels(voltage[np.newaxis, :], time, [events],
+                                        np.array([temporal_params['dt']]), z0_expected)
+    return {k: v[0].item() for k, v in params.items()}
+
+
 def calculate_attenuation(voltage: np.ndarray, time: np.ndarray, events: Dict[str, float],
-                         temporal_params: Dict[str, float]) -> Dict[str, float]:
+                         temporal_params: Dict[str, float],
+                         reflection_coefficient: Optional[float] = None) -> Dict[str, float]:
     """
     Calcula parámetros de atenuación y pérdidas.
+    alpha se ajusta con el decaimiento de las reflexiones sucesivas (ver
+    attenuation.py) y es None si el ajuste está indeterminado; 'attenuation'
+    lleva su intervalo de confianza y el motivo.
     """
-    # Para TDR, alpha y beta son más difíciles de calcular directamente
-    # Usaremos aproximaciones basadas en la teoría de líneas de transmisión
-
-    # Alpha (atenuación): Para señales TDR cortas, es pequeño
-    # Usar una estimación más realista basada en el decaimiento de la señal
-    if len(voltage) > 50:
-        # Calcular atenuación usando regresión lineal en escala logarítmica
-        # para el decaimiento de reflexiones múltiples (si existen)
-        v_abs = np.abs(voltage)
-        v_max = events.get('v_max', 1)
-
-        # Encontrar puntos donde la señal está decayendo (después del pulso principal)
-        t0 = events.get('t0', 0)
-        decay_mask = time > (t0 + temporal_params.get('dt', 0))
-
-        if np.sum(decay_mask) > 10:
-            decay_voltage = v_abs[decay_mask]
-            decay_time = time[decay_mask]
-
-            # Calcular alpha usando el método de mínimos cuadrados en escala log
-            if len(decay_voltage) > 5 and np.all(decay_voltage > 0):
-                log_v = np.log(decay_voltage / v_max)
-                # Regresión lineal: log(V) = -alpha * t + c
-                coeffs = np.polyfit(decay_time, log_v, 1)
-                alpha = -coeffs[0]  # alpha = -slope
-            else:
-                alpha = 1e-3  # Valor típico pequeño para cables de buena calidad
-        else:
-            alpha = 1e-3  # Valor típico
-    else:
-        alpha = 1e-3
+    # Alpha (atenuación): decaimiento de los picos de reflexión en t0 + kΔt,
+    # descontando la pérdida por desadaptación |Γ| de cada rebote
+    fit = fit_attenuation(time, voltage, events.get('t0', 0), temporal_params.get('dt', 0),
+                          temporal_params.get('vp', 0), reflection_coefficient)
+    alpha = fit['alpha']
 
     # Beta (constante de fase): 2π/λ = β, donde λ = vp/f
     # Para TDR, podemos estimar beta usando la frecuencia del pulso
@@ -360,13 +994,13 @@ def calculate_attenuation(voltage: np.ndarray, time: np.ndarray, events: Dict[st
     else:
         beta = 1e-3  # Valor típico pequeño
 
-    # Asegurar que los valores sean positivos y razonables
-    alpha = max(alpha, 1e-6)  # Mínimo 1e-6 Np/m
+    # Asegurar que beta sea positiva y razonable
     beta = max(beta, 1e-6)    # Mínimo 1e-6 rad/m
 
     return {
         'alpha': alpha,
-        'beta': beta
+        'beta': beta,
+        'attenuation': {k: fit[k] for k in ('alpha', 'std_error', 'ci', 'reflections', 'reason')},
     }
 
 
@@ -393,16 +1027,21 @@ def analyze_load_type(reflection_coeff: complex) -> str:
 
 
 def calculate_error_analysis(temporal_params: Dict[str, float], cable_length: float,
-                           config: Dict[str, float]) -> Dict[str, float]:
+                           config: Dict[str, float], timing_noise: Optional[float] = None) -> Dict[str, float]:
     """
     Calcula análisis de errores e incertidumbre.
+    timing_noise es la incertidumbre de Δt medida por el ruido (promediado);
+    sin ella se estima como el 5% de Δt.
     """
     dt = temporal_params['dt']
     vp = temporal_params['vp']
 
     # Error en medición de tiempo
     sample_interval = config.get('sample_interval', 1e-9)
-    dt_error = sample_interval + 0.05 * dt  # 5% estimado
+    if timing_noise is None:
+        dt_error = sample_interval + 0.05 * dt  # 5% estimado
+    else:
+        dt_error = sample_interval + timing_noise
 
     # Error en longitud del cable (asumir 1% de precisión)
     length_error = 0.01 * cable_length
@@ -421,124 +1060,1842 @@ def calculate_error_analysis(temporal_params: Dict[str, float], cable_length: fl
     }
 
 
-def generate_tdr_plot_base64(time_data, magnitude_data):
-    plt.figure()
-    plt.plot(time_data, magnitude_data)
-    plt.xlabel('Time')
-    plt.ylabel('Magnitude')
-    plt.title('TDR Waveform')
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png')
-    buf.seek(0)
-    img_base64 = base64.b64encode(buf.read()).decode('utf-8')
-    plt.close()
-    return img_base64
+class LocalUpload:
+    """
+    Archivo en disco con la misma interfaz (filename, file) que UploadFile,
+    usado dentro de los procesos de análisis.
+    """
+    def __init__(self, path: str, filename: str):
+        self.filename = filename
+        self.file = open(path, 'rb')
 
+    def close(self):
+        self.file.close()
 
-@app.post("/analyze-tdr", response_model=AnalyzeTDRResponse)
-async def analyze_tdr(
-    file: UploadFile = File(...),
-    cable_length: float = Form(...),
-    z0_expected: float = Form(50.0)
-):
-    print(f"DEBUG: Received analyze-tdr request for file: {file.filename}, cable_length: {cable_length}")
 
-    # Validar entradas
-    if not file.filename.lower().endswith('.csv'):
-        raise HTTPException(status_code=400, detail="Uploaded file must be a CSV file")
-    if cable_length <= 0:
-        raise HTTPException(status_code=400, detail="cable_length must be greater than 0")
-    if z0_expected <= 0:
-        raise HTTPException(status_code=400, detail="z0_expected must be greater than 0")
+def run_parametric_stages(time: np.ndarray, voltage: np.ndarray, config: Dict[str, float],
+                          events: Dict[str, float], cable_length: float, z0_expected: float,
+                          dt_method: str = 'auto', frequency: bool = False,
+                          timing_noise: Optional[float] = None) -> Dict:
+    """
+    Ejecuta las etapas que dependen de cable_length y z0_expected
+    (temporal → impedancia → atenuación → discontinuidades → error) sobre
+    eventos ya detectados.
+    Con frequency=True se agrega la sección de análisis en frecuencia.
+    """
+    n = len(voltage)
+    # Calcular parámetros temporales y de línea
+    with stage('temporal', n if dt_method == 'xcorr' else None):
+        temporal_params = calculate_temporal_parameters(events, cable_length, method=dt_method,
+                                                        time=time, voltage=voltage)
+
+    # Analizar impedancia y reflexión
+    with stage('impedance', n):
+        impedance_params = analyze_impedance_reflection(voltage, time, events, temporal_params, z0_expected)
 
-    try:
-        print("DEBUG: Processing CSV file...")
-        # Procesar CSV con configuración
-        time, voltage, config = process_csv_file(file)
-        print(f"DEBUG: CSV processed successfully. Time points: {len(time)}, Config: {config}")
+    # Calcular atenuación
+    with stage('attenuation', n):
+        attenuation_params = calculate_attenuation(voltage, time, events, temporal_params,
+                                                   impedance_params['reflection_coefficient'])
+
+    # Localizar todas las discontinuidades con la vp medida
+    with stage('discontinuities', n):
+        discontinuity_params = find_discontinuities(time, voltage, events['t0'], temporal_params['vp'],
+                                                    z0_expected)
+
+    # Análisis de errores
+    with stage('error'):
+        error_params = calculate_error_analysis(temporal_params, cable_length, config, timing_noise)
+    log_event(logging.DEBUG, "parametric_stages", points=n, dt_method=temporal_params.get('method'),
+              dt=temporal_params['dt'], velocity_factor=temporal_params['velocity_factor'],
+              load_type=impedance_params['load_type'])
+
+    data = {
+        "length_meters": cable_length,  # Usar longitud física proporcionada
+        "error_percent": error_params['error_percent'],
+        "velocity_factor": temporal_params['velocity_factor'],
+        "vswr": impedance_params['vswr'],
+        "reflection_coefficient": impedance_params['reflection_coefficient'],
+        "beta": attenuation_params['beta'],
+        "alpha": attenuation_params['alpha'],
+        "attenuation": attenuation_params['attenuation'],
+        "discontinuities": discontinuity_params,
+        "Z0": impedance_params['z0'],
+        "load_type": impedance_params['load_type'],
+        "load_value": impedance_params['load_value'],
+        "delta_t": temporal_params['dt'],
+    }
 
-        print("DEBUG: Detecting pulse events...")
-        # Detectar eventos del pulso
-        events = detect_pulse_events(time, voltage, config)
-        print(f"DEBUG: Events detected: {events}")
+    if frequency:
+        with stage('frequency', n):
+            data["frequency"] = frequency_domain_analysis(time, voltage, events['t0'], impedance_params['vi'],
+                                                          temporal_params['dt'], cable_length, z0_expected)
 
-        print("DEBUG: Calculating temporal parameters...")
-        # Calcular parámetros temporales y de línea
-        temporal_params = calculate_temporal_parameters(events, cable_length)
-        print(f"DEBUG: Temporal parameters: {temporal_params}")
+    # Reemplazar valores infinitos por valores grandes para compatibilidad JSON
+    for k, v in data.items():
+        if isinstance(v, float) and not np.isfinite(v):
+            data[k] = 1e10 if v == float('inf') else -1e10 if v == float('-inf') else 0.0
 
-        print("DEBUG: Analyzing impedance and reflection...")
-        # Analizar impedancia y reflexión
-        impedance_params = analyze_impedance_reflection(voltage, time, events, temporal_params, z0_expected)
-        print(f"DEBUG: Impedance parameters: {impedance_params}")
-
-        print("DEBUG: Calculating attenuation...")
-        # Calcular atenuación
-        attenuation_params = calculate_attenuation(voltage, time, events, temporal_params)
-        print(f"DEBUG: Attenuation parameters: {attenuation_params}")
-
-        print("DEBUG: Analyzing errors...")
-        # Análisis de errores
-        error_params = calculate_error_analysis(temporal_params, cable_length, config)
-        print(f"DEBUG: Error analysis: {error_params}")
-
-        print("DEBUG: Generating plot...")
-        # Generar gráfica
-        tdr_plot_base64 = generate_tdr_plot_base64(time, voltage)
-        print("DEBUG: Plot generated successfully")
-
-        # Preparar respuesta
-        data = {
-            "length_meters": cable_length,  # Usar longitud física proporcionada
-            "error_percent": error_params['error_percent'],
-            "velocity_factor": temporal_params['velocity_factor'],
-            "vswr": impedance_params['vswr'],
-            "reflection_coefficient": impedance_params['reflection_coefficient'],
-            "beta": attenuation_params['beta'],
-            "alpha": attenuation_params['alpha'],
-            "Z0": impedance_params['z0'],
-            "load_type": impedance_params['load_type'],
-            "load_value": impedance_params['load_value'],
-            "tdr_plot_base64": tdr_plot_base64,
-            "waveform": [{"time": float(t), "ch1": float(v)} for t, v in zip(time, voltage)]
-        }
+    return data
 
-        # Reemplazar valores infinitos por valores grandes para compatibilidad JSON
-        for k, v in data.items():
-            if isinstance(v, float) and not np.isfinite(v):
-                data[k] = 1e10 if v == float('inf') else -1e10 if v == float('-inf') else 0.0
 
-        return AnalyzeTDRResponse(**data)
+def sweep_parametric_stages(time: np.ndarray, voltage: np.ndarray, config: Dict[str, float],
+                            events: Dict[str, float], cable_lengths: np.ndarray, z0_values: np.ndarray,
+                            dt_method: str = 'auto') -> Dict:
+    """
+    Evalúa temporal → impedancia → error sobre la rejilla cable_lengths ×
+    z0_values con una sola detección. Δt y Γ no dependen de la rejilla y se
+    calculan una vez; el resto se difunde (broadcasting) sobre ella.
+    Retorna los escalares comunes y matrices (len(cable_lengths), len(z0_values)).
+    """
+    lengths = np.asarray(cable_lengths, dtype=float)[:, np.newaxis]
+    z0 = np.asarray(z0_values, dtype=float)[np.newaxis, :]
+    shape = (lengths.shape[0], z0.shape[1])
+
+    with stage('temporal', len(voltage) if dt_method == 'xcorr' else None):
+        temporal_params = calculate_temporal_parameters(events, lengths, method=dt_method,
+                                                        time=time, voltage=voltage)
+
+    # Γ y VSWR no dependen de Z0; la carga se escala desde la impedancia normalizada
+    with stage('impedance', len(voltage)):
+        impedance = analyze_impedance_reflection(voltage, time, events, temporal_params, 1.0)
+        load_value = z0 * impedance['load_value']
+
+    with stage('error', shape[0] * shape[1]):
+        error_params = calculate_error_analysis(temporal_params, lengths, config)
+
+    def grid(values: np.ndarray) -> np.ndarray:
+        values = np.broadcast_to(values, shape)
+        # Mismo reemplazo de infinitos que la respuesta de /analyze-tdr
+        return np.where(np.isposinf(values), 1e10, np.where(np.isneginf(values), -1e10, values))
+
+    return {
+        "cable_length": lengths[:, 0],
+        "z0_expected": z0[0],
+        "delta_t": temporal_params['dt'],
+        "reflection_coefficient": impedance['reflection_coefficient'],
+        "vswr": impedance['vswr'],
+        "load_type": impedance['load_type'],
+        "grid": {
+            "velocity_factor": grid(temporal_params['velocity_factor']),
+            "epsilon_eff": grid(temporal_params['epsilon_eff']),
+            "error_percent": grid(error_params['error_percent']),
+            "load_value": grid(load_value),
+        },
+    }
+
+
+# Límites del modo de incertidumbre (Monte Carlo)
+UNCERTAINTY_MAX_TRIALS = int(os.environ.get('TDR_UNCERTAINTY_MAX_TRIALS', 10000))
+UNCERTAINTY_TIME_BUDGET = float(os.environ.get('TDR_UNCERTAINTY_TIME_BUDGET', 10.0))  # segundos
+UNCERTAINTY_BATCH_BYTES = int(os.environ.get('TDR_UNCERTAINTY_BATCH_BYTES', 64 * 1024 ** 2))
+UNCERTAINTY_WORK_ARRAYS = 8  # Arreglos (filas, N) vivos a la vez durante la detección
+UNCERTAINTY_XCORR_ARRAYS = 16  # Ídem con dt_method=xcorr (derivada, plantillas y espectros)
 
-    except ValueError as e:
-        print(f"DEBUG: ValueError: {str(e)}")
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        print(f"DEBUG: Exception: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Processing error: {str(e)}")
 
+def run_uncertainty_analysis(time: np.ndarray, raw_voltage: np.ndarray, voltage: np.ndarray,
+                             config: Dict[str, float], cable_length: float, z0_expected: float,
+                             trials: int, dt_method: str = 'auto', seed: int = 0) -> Dict:
+    """
+    Repite detección → temporal → impedancia sobre trials perturbaciones de la
+    traza (ver uncertainty.py) y retorna la distribución de Δt, factor de
+    velocidad, coeficiente de reflexión y VSWR. raw_voltage es la traza sin
+    suavizar y voltage la suavizada que usa el pipeline. Los ensayos se
+    procesan por lotes acotados en memoria hasta completar trials o agotar
+    UNCERTAINTY_TIME_BUDGET.
+
+    Los ensayos cuyo Δt sale del método 'rise' (un valor fijo que no depende
+    de la traza) se cuentan pero no entran en las distribuciones de Δt y del
+    factor de velocidad: su dispersión nula sería una precisión ficticia.
+    """
+    n = len(voltage)
+    sample_interval = config.get('sample_interval') or (time[-1] - time[0]) / max(n - 1, 1)
+    quantum = quantization_step(config)
+    residual = noise_residual(raw_voltage, voltage, quantum)
+    # La fase del disparo respecto del reloj de muestreo es uniforme en una muestra
+    jitter_samples = 1 / np.sqrt(12)
+    rng = np.random.default_rng(seed)
+    work_arrays = UNCERTAINTY_XCORR_ARRAYS if dt_method == 'xcorr' else UNCERTAINTY_WORK_ARRAYS
+    batch_rows = max(1, UNCERTAINTY_BATCH_BYTES // (work_arrays * 8 * n))
+
+    started = perf_counter()
+    done = 0
+    dts, sources, gammas, vswrs = [], [], [], []
+    with stage('uncertainty') as uncertainty:
+        while done < trials and (done == 0 or perf_counter() - started < UNCERTAINTY_TIME_BUDGET):
+            rows = min(batch_rows, trials - done)
+            batch = smooth_voltage(perturb_batch(voltage, residual, rows, rng, quantum, jitter_samples,
+                                                 raw_voltage[0]))
+            events = detect_event_arrays(time, batch)
+            if dt_method == 'xcorr':
+                dt = delay_xcorr_arrays(time, batch, events)
+                source = np.full(rows, 'xcorr', dtype='<U10')
+            else:
+                dt = delay_arrays(events, dt_method)
+                source = delay_source_arrays(events, dt_method)
+            valid = np.isfinite(dt)
+            impedance = analyze_impedance_arrays(batch[valid], time, {k: v[valid] for k, v in events.items()},
+                                                 dt[valid], z0_expected)
+            dts.append(dt[valid])
+            sources.append(source[valid])
+            gammas.append(impedance['reflection_coefficient'])
+            vswrs.append(impedance['vswr'])
+            done += rows
+        uncertainty.samples = done * n
+
+    dt = np.concatenate(dts)
+    source = np.concatenate(sources)
+    names, counts = np.unique(source, return_counts=True)
+    measured = dt[source != 'rise']
+    velocity_factor = (2 * cable_length / measured) / 299792458 * 100
+    summary = {
+        'trials': done,
+        'requested': trials,
+        'failed': done - len(dt),
+        'delta_t_source': {str(name): int(count) for name, count in zip(names, counts)},
+        'truncated': done < trials,
+        'seconds': perf_counter() - started,
+        'perturbations': {'noise_rms': float(np.std(residual)), 'quantization_step': quantum,
+                          'jitter_rms': jitter_samples * sample_interval},
+        'delta_t': summarize(measured),
+        'velocity_factor': summarize(velocity_factor),
+        'reflection_coefficient': summarize(np.concatenate(gammas)),
+        'vswr': summarize(np.concatenate(vswrs)),
+        'error_percent': None,
+        'warning': None,
+    }
+    if summary['velocity_factor'] is not None:
+        vf = summary['velocity_factor']
+        summary['error_percent'] = 100 * vf['std'] / vf['mean']
+    if len(measured) < len(dt):
+        summary['warning'] = (f"{len(dt) - len(measured)} trials took Δt from the fixed 'rise' fallback, which "
+                              "does not depend on the trace; they are excluded from delta_t, velocity_factor "
+                              "and error_percent (use dt_method=xcorr)")
+    log_event(logging.DEBUG, "uncertainty_done", trials=done, failed=summary['failed'],
+              seconds=round(summary['seconds'], 3))
+    return summary
+
+
+def run_tdr_pipeline(time: np.ndarray, voltage: np.ndarray, config: Dict[str, float],
+                     cable_length: float, z0_expected: float,
+                     max_points: Optional[int] = None, decimation: str = 'lttb',
+                     plot: str = 'inline', plot_id: Optional[str] = None,
+                     dt_method: str = 'auto', frequency: bool = False,
+                     uncertainty: int = 0, raw_voltage: Optional[np.ndarray] = None) -> Dict:
+    """
+    Ejecuta detección → temporal → impedancia → atenuación → error → gráfica
+    sobre una forma de onda ya procesada y retorna los datos de la respuesta.
+    Si se indica max_points, la forma de onda devuelta se decima conservando
+    los eventos detectados. plot elige entre PNG en base64 ('inline'), URL
+    de renderizado diferido ('url') o sin gráfica ('none'). Con uncertainty > 0
+    se agrega la distribución Monte Carlo de ese número de ensayos; raw_voltage
+    (la traza sin suavizar) aporta el ruido a remuestrear.
+    """
+    # Detectar eventos del pulso
+    events = detect_pulse_events(time, voltage, config)
+
+    data = run_parametric_stages(time, voltage, config, events, cable_length, z0_expected,
+                                 dt_method, frequency)
+    if uncertainty:
+        data["uncertainty"] = run_uncertainty_analysis(
+            time, voltage if raw_voltage is None else raw_voltage, voltage, config,
+            cable_length, z0_expected, uncertainty, dt_method)
+
+    # Generar gráfica
+    data["tdr_plot_base64"] = None
+    data["plot_url"] = None
+    if plot == 'inline':
+        with stage('plot', len(voltage)):
+            data["tdr_plot_base64"] = generate_tdr_plot_base64(time, voltage)
+    elif plot == 'url' and plot_id:
+        # Solo se guardan los puntos; el PNG se renderiza al pedirlo
+        plot_store.save_points(plot_id, time, voltage)
+        data["plot_url"] = f"/plots/{plot_id}.png"
+
+    event_times = (events['t0'], events['plateau_start'], events['plateau_end'], events['reflection_start'])
+    with stage('decimate', len(voltage)):
+        time_out, voltage_out = decimate(time, voltage, max_points, decimation, keep_times=event_times)
+    data["waveform"] = {"time": time_out, "ch1": voltage_out}
+    return data
+
+
+def analyze_tdr_path(path: str, filename: str, cable_length: float, z0_expected: float,
+                     **options) -> Dict:
+    """
+    Análisis TDR completo de un archivo en disco. Se ejecuta en el pool de procesos.
+    """
+    upload = LocalUpload(path, filename)
+    try:
+        # El modo de incertidumbre necesita también la traza sin suavizar
+        raw_voltage = None
+        if options.get('uncertainty'):
+            time, raw_voltage, config = load_waveform_file(upload, smooth=False)
+            with stage('filter', len(raw_voltage)):
+                voltage = smooth_voltage(raw_voltage)
+        else:
+            time, voltage, config = load_waveform_file(upload)
+    finally:
+        upload.close()
+
+    return run_tdr_pipeline(time, voltage, config, cable_length, z0_expected, raw_voltage=raw_voltage, **options)
+
+
+def pipeline_stages(frequency: bool = False, uncertainty: int = 0, plot: str = 'inline', **options) -> List[str]:
+    """
+    Etapas que ejecuta analyze_tdr_path con estas opciones, en orden; son la
+    referencia del progreso de los trabajos asíncronos.
+    """
+    stages = ['parse', 'filter', 'detect', 'temporal', 'impedance', 'attenuation', 'discontinuities', 'error']
+    if frequency:
+        stages.append('frequency')
+    if uncertainty:
+        stages.append('uncertainty')
+    if plot == 'inline':
+        stages.append('plot')
+    stages.append('decimate')
+    return stages
+
+
+def run_analysis_job(job_id: str, owner: Optional[str] = None):
+    """
+    Ejecuta un trabajo de /jobs en un proceso del pool y deja en la cola el
+    resultado o el error. Al terminar cada etapa registra el progreso y, si se
+    pidió cancelar o el trabajo dejó de ser de owner, se detiene.
+    """
+    job = job_store.get(job_id)
+
+    def report(name, seconds, samples):
+        if job_store.progress(job_id, name, owner):
+            raise JobCancelled(job_id)
 
-@app.post("/upload-csv")
-async def upload_csv(file: UploadFile = File(...)):
-    print(f"DEBUG: upload-csv called with file: {file.filename}")
+    params = dict(job['params'])
     try:
-        time_array, voltage_array, config = process_csv_file(file)
-        print(f"DEBUG: upload-csv processed {len(time_array)} points, config: {config}")
-        return {
-            "time": time_array.tolist(),
-            "magnitude": voltage_array.tolist(),
-            "config": config
-        }
+        data = report_stages(report, analyze_tdr_path, job_store.input_path(job), job['filename'],
+                             params.pop('cable_length'), params.pop('z0_expected'),
+                             plot_id=job['digest'], **params)
+    except JobCancelled:
+        job_store.mark_cancelled(job_id, owner)
+        log_event(logging.INFO, "job_cancelled", job=job_id)
     except ValueError as e:
-        print(f"DEBUG: upload-csv ValueError: {str(e)}")
-        raise HTTPException(status_code=400, detail=str(e))
+        job_store.fail(job_id, str(e), owner)
+        log_event(logging.INFO, "job_rejected", job=job_id, error=str(e))
     except Exception as e:
-        print(f"DEBUG: upload-csv Exception: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Processing error: {str(e)}")
+        job_store.fail(job_id, f"Processing error: {str(e)}", owner)
+        log_event(logging.ERROR, "job_error", job=job_id, error=str(e))
+    else:
+        job_store.finish(job_id, data, owner)
 
-@app.get("/")
-def read_root():
-    return {"message": "Hello World"}
 
-if __name__ == "__main__":
+def load_waveform_path(path: str, filename: str,
+                       smooth: bool = True) -> Tuple[np.ndarray, np.ndarray, Dict[str, float]]:
+    """
+    Carga una forma de onda desde disco. Se ejecuta en el pool de procesos.
+    """
+    upload = LocalUpload(path, filename)
+    try:
+        return load_waveform_file(upload, smooth)
+    finally:
+        upload.close()
+
+
+def load_decimated_path(path: str, filename: str, max_points: Optional[int],
+                        decimation: str) -> Tuple[np.ndarray, np.ndarray, Dict[str, float]]:
+    """
+    Carga y decima una forma de onda dentro del worker, para que solo viajen
+    de vuelta los puntos que se van a enviar.
+    """
+    time, voltage, config = load_waveform_path(path, filename)
+    with stage('decimate', len(voltage)):
+        time, voltage = decimate(time, voltage, max_points, decimation)
+    return time, voltage, config
+
+
+def prepare_waveform_path(path: str, filename: str, handle: str) -> Dict:
+    """
+    Parsea, suaviza y detecta eventos una sola vez, guardando el resultado bajo
+    un handle para reanálisis posteriores. Se ejecuta en el pool de procesos.
+    """
+    time, voltage, config = load_waveform_path(path, filename)
+    events = detect_pulse_events(time, voltage, config)
+    waveform_cache.save(handle, time, voltage, config, events)
+    return describe_waveform(handle)
+
+
+def render_plot(plot_id: str) -> bytes:
+    """
+    Renderiza el PNG de una gráfica diferida. Si el id corresponde a un handle
+    de /waveforms, los puntos se toman de la forma de onda guardada.
+    """
+    if not plot_store.exists(plot_id) and waveform_cache.exists(plot_id):
+        time, voltage, _, _ = waveform_cache.load(plot_id)
+        plot_store.save_points(plot_id, time, voltage)
+    with stage('plot'):
+        return plot_store.render(plot_id)
+
+
+def describe_waveform(handle: str) -> Dict:
+    time, _, config, events = waveform_cache.load(handle)
+    return {"handle": handle, "points": len(time), "config": config, "events": events,
+            "plot_url": f"/plots/{handle}.png"}
+
+
+def reanalyze_waveform(handle: str, cable_length: float, z0_expected: float,
+                       dt_method: str = 'auto', frequency: bool = False) -> Dict:
+    """
+    Reejecuta solo las etapas dependientes de los parámetros sobre una forma de
+    onda guardada. Se ejecuta en el pool de procesos.
+    """
+    time, voltage, config, events = waveform_cache.load(handle)
+    data = run_parametric_stages(time, voltage, config, events, cable_length, z0_expected,
+                                 dt_method, frequency)
+    data["handle"] = handle
+    return data
+
+
+def analyze_channels_path(path: str, filename: str, cable_length: float, z0_expected: float,
+                          near_channel: str, far_channel: Optional[str], dt_method: str = 'auto') -> Dict:
+    """
+    Analiza todos los canales de un CSV con un solo parseo. La detección y la
+    impedancia se calculan vectorizadas sobre los canales; el retardo entre el
+    extremo cercano y el lejano da la velocidad de propagación (dos puertos).
+    Se ejecuta en el pool de procesos.
+    """
+    upload = LocalUpload(path, filename)
+    try:
+        time, voltages, config = process_csv_channels(upload)
+    finally:
+        upload.close()
+
+    names = config['channels']
+    if far_channel is None:
+        far_channel = next((ch for ch in names if ch != near_channel), None)
+    for ch in (near_channel, far_channel):
+        if ch is not None and ch not in names:
+            raise ValueError(f"Channel {ch} not found in file (available: {', '.join(names)})")
+
+    with stage('detect', voltages.size):
+        events_list = detect_channel_events(time, voltages)
+
+    # Parámetros temporales por canal; los canales sin pulso o sin Δt quedan fuera
+    channels = {}
+    analyzed = []
+    for i, (name, events) in enumerate(zip(names, events_list)):
+        if events is None:
+            channels[name] = {"error": "No se detectó pulso incidente"}
+            continue
+        try:
+            temporal_params = calculate_temporal_parameters(events, cable_length, method=dt_method,
+                                                            time=time, voltage=voltages[i])
+        except ValueError as e:
+            channels[name] = {"events": events, "error": str(e)}
+            continue
+        channels[name] = {"events": events, "temporal": temporal_params}
+        analyzed.append(i)
+
+    if analyzed:
+        impedance = analyze_impedance_channels(
+            voltages[analyzed], time, [events_list[i] for i in analyzed],
+            np.array([channels[names[i]]["temporal"]['dt'] for i in analyzed]), z0_expected)
+        for row, i in enumerate(analyzed):
+            channels[names[i]]["impedance"] = {k: v[row].item() for k, v in impedance.items()}
+
+    # Retardo de un solo tránsito entre el extremo cercano y el lejano
+    two_port = None
+    near_events = events_list[names.index(near_channel)]
+    far_events = events_list[names.index(far_channel)] if far_channel else None
+    if near_events is not None and far_events is not None:
+        delay = far_events['t0'] - near_events['t0']
+        if delay > 0:
+            vp = cable_length / delay
+            two_port = {
+                "near_channel": near_channel,
+                "far_channel": far_channel,
+                "delay": delay,
+                "vp": vp,
+                "velocity_factor": (vp / 299792458) * 100,
+            }
+
+    return {"config": config, "channels": channels, "two_port": two_port}
+
+
+def sweep_tdr_path(path: str, filename: str, cable_lengths: np.ndarray, z0_values: np.ndarray,
+                   dt_method: str = 'auto') -> Dict:
+    """
+    Barrido de cable_length × z0_expected sobre un archivo en disco, con un
+    solo parseo y una sola detección. Se ejecuta en el pool de procesos.
+    """
+    upload = LocalUpload(path, filename)
+    try:
+        time, voltage, config = load_waveform_file(upload)
+    finally:
+        upload.close()
+
+    events = detect_pulse_events(time, voltage, config)
+    return sweep_parametric_stages(time, voltage, config, events, cable_lengths, z0_values, dt_method)
+
+
+def import_ltspice_path(path: str, filename: str, trace: Optional[str], max_points: Optional[int],
+                       handle: Optional[str] = None, cable_length: Optional[float] = None,
+                       z0_expected: float = 50.0, dt_method: str = 'xcorr') -> Dict:
+    """
+    Importa un barrido AC de LTspice y lo decima para graficar. Si se indica el
+    handle de una forma de onda medida, agrega la comparación con su S11(f)
+    sobre la rejilla de frecuencias medida. Se ejecuta en el pool de procesos.
+    """
+    upload = LocalUpload(path, filename)
+    try:
+        freq, traces, fmt = process_ltspice_file(upload)
+    finally:
+        upload.close()
+
+    if trace is None:
+        trace = next(iter(traces))
+    if trace not in traces:
+        raise ValueError(f"Trace {trace} not found in file (available: {', '.join(traces)})")
+
+    values = traces[trace]
+    magnitude_db = 20 * np.log10(np.maximum(np.abs(values), 1e-300))
+    phase = np.unwrap(np.angle(values))
+
+    # Los barridos suelen ser logarítmicos: decimar sobre log10(f) conserva la forma del Bode
+    axis = np.log10(freq) if np.all(freq > 0) else freq
+    indices = lttb_indices(axis, magnitude_db, max_points) if max_points else np.arange(len(freq))
+
+    comparison = None
+    if handle:
+        time, voltage, config, events = waveform_cache.load(handle)
+        measured = run_parametric_stages(time, voltage, config, events, cable_length, z0_expected,
+                                         dt_method, frequency=True)["frequency"]
+        f_measured = np.array(measured["frequency"])
+        in_range = (f_measured >= freq.min()) & (f_measured <= freq.max())
+        order = np.argsort(freq)
+        f_common = f_measured[in_range]
+        comparison = {
+            "handle": handle,
+            "frequency": f_common.tolist(),
+            "measured_s11_db": np.array(measured["s11_magnitude_db"])[in_range].tolist(),
+            "measured_s11_phase": np.array(measured["s11_phase"])[in_range].tolist(),
+            "simulated_db": np.interp(f_common, freq[order], magnitude_db[order]).tolist(),
+            "simulated_phase": np.interp(f_common, freq[order], phase[order]).tolist(),
+        }
+
+    return {
+        "traces": list(traces),
+        "trace": trace,
+        "format": fmt,
+        "points": len(freq),
+        "frequency": freq[indices].tolist(),
+        "magnitude_db": magnitude_db[indices].tolist(),
+        "phase": phase[indices].tolist(),
+        "comparison": comparison,
+    }
+
+
+def store_capture_path(path: str, filename: str, digest: str, session: Optional[str],
+                       captured_at: Optional[float], cable_length: Optional[float] = None,
+                       z0_expected: float = 50.0, dt_method: str = 'auto') -> Dict:
+    """
+    Parsea, suaviza y detecta eventos una sola vez y guarda la captura en el
+    almacén persistente. Si se indica cable_length, registra también un
+    resultado. Se ejecuta en el pool de procesos.
+    """
+    capture_id = capture_store.find_capture(digest)
+    if capture_id is None:
+        time, voltage, config = load_waveform_path(path, filename)
+        events = detect_pulse_events(time, voltage, config)
+        capture_id = capture_store.add_capture(digest, filename, time, voltage, config, events,
+                                               session=session, captured_at=captured_at)
+    if cable_length is not None:
+        analyze_stored_capture(capture_id, cable_length, z0_expected, dt_method)
+    return capture_store.get_capture(capture_id)
+
+
+def analyze_stored_capture(capture_id: int, cable_length: float, z0_expected: float,
+                           dt_method: str = 'auto') -> Dict:
+    """
+    Analiza una captura almacenada sin volver a parsearla y guarda el resultado.
+    Se ejecuta en el pool de procesos.
+    """
+    time, voltage, config, events = capture_store.load_samples(capture_id)
+    data = run_parametric_stages(time, voltage, config, events, cable_length, z0_expected, dt_method)
+    data["result_id"] = capture_store.add_result(capture_id, cable_length, z0_expected, dt_method, data)
+    data["capture_id"] = capture_id
+    return data
+
+
+def accumulate_waveform_paths(items: List[Tuple[str, str]], reference: Tuple[str, str],
+                              align: str) -> Tuple[RunningStats, np.ndarray, Dict[str, float]]:
+    """
+    Acumula media y varianza de un grupo de adquisiciones sin suavizar,
+    alineadas con la adquisición de referencia. Solo una traza está en memoria
+    a la vez. Se ejecuta en el pool de procesos.
+    """
+    time, reference_voltage, config = load_waveform_path(*reference, smooth=False)
+    aligner = Aligner(time, reference_voltage, align)
+
+    stats = RunningStats()
+    for path, filename in items:
+        if (path, filename) == reference:
+            voltage = reference_voltage
+        else:
+            _, voltage, _ = load_waveform_path(path, filename, smooth=False)
+            if len(voltage) != len(time):
+                raise ValueError(f"{filename}: expected {len(time)} samples, got {len(voltage)}")
+        stats.add(aligner.align(voltage))
+    return stats, time, config
+
+
+def analyze_averaged_waveform(time: np.ndarray, stats: RunningStats, config: Dict[str, float],
+                              cable_length: float, z0_expected: float, align: str = 'xcorr',
+                              smooth: bool = False, dt_method: str = 'auto',
+                              max_points: Optional[int] = None, decimation: str = 'lttb') -> Dict:
+    """
+    Analiza la traza promedio. El ruido por muestra de la media alimenta el
+    análisis de errores. Se ejecuta en el pool de procesos.
+    """
+    std_error = stats.std_error()
+    voltage = condition_voltage(stats.mean, {}, smooth)
+
+    events = detect_pulse_events(time, voltage, config)
+    reflection_time = events['plateau_end'] or events['reflection_start']
+    timing_noise = timing_uncertainty(time, voltage, std_error, (events['t0'], reflection_time))
+
+    data = run_parametric_stages(time, voltage, config, events, cable_length, z0_expected,
+                                 dt_method, timing_noise=timing_noise)
+    data["averaging"] = {
+        "acquisitions": stats.count,
+        "align": align,
+        "noise_rms": float(np.sqrt(np.mean(stats.variance()))),
+        "std_error_rms": float(np.sqrt(np.mean(std_error ** 2))),
+        "timing_noise": timing_noise,
+    }
+
+    event_times = (events['t0'], events['plateau_start'], events['plateau_end'], events['reflection_start'])
+    with stage('decimate', len(voltage)):
+        indices = decimate_indices(time, voltage, max_points, decimation, keep_times=event_times)
+    data["waveform"] = {"time": time[indices], "ch1": voltage[indices], "std_error": std_error[indices]}
+    return data
+
+
+def analyze_stream_frame(time: np.ndarray, voltage: np.ndarray, parameters: Dict
+                         ) -> Tuple[Dict, Dict[str, float], np.ndarray, np.ndarray]:
+    """
+    Analiza una trama del streaming en vivo. Retorna los resultados escalares,
+    los eventos y los índices y voltajes de la forma de onda decimada.
+    Se ejecuta en el pool de procesos.
+    """
+    config = {'sample_interval': float(time[1] - time[0])}
+    voltage = condition_voltage(voltage, config, parameters['smooth'])
+    events = detect_pulse_events(time, voltage, config)
+    result = run_parametric_stages(time, voltage, config, events, parameters['cable_length'],
+                                   parameters['z0_expected'], parameters['dt_method'])
+
+    event_times = (events['t0'], events['plateau_start'], events['plateau_end'], events['reflection_start'])
+    with stage('decimate', len(voltage)):
+        indices = decimate_indices(time, voltage, parameters['max_points'], parameters['decimation'],
+                                   keep_times=event_times)
+    return result, events, indices, voltage[indices]
+
+
+# Pool de procesos para el análisis CPU-intensivo
+ANALYSIS_WORKERS = int(os.environ.get('TDR_ANALYSIS_WORKERS', os.cpu_count() or 1))
+# Trabajos que pueden esperar en cola además de los que están en ejecución
+ANALYSIS_QUEUE_SIZE = int(os.environ.get('TDR_ANALYSIS_QUEUE_SIZE', 2 * ANALYSIS_WORKERS))
+ANALYSIS_RETRY_AFTER = 5  # segundos
+
+_analysis_executor = None
+_analysis_inflight = 0
+
+
+def get_analysis_executor() -> ProcessPoolExecutor:
+    global _analysis_executor
+    if _analysis_executor is None:
+        wait_for_preload()
+        _analysis_executor = ProcessPoolExecutor(max_workers=ANALYSIS_WORKERS)
+    return _analysis_executor
+
+
+def shutdown_analysis_executor():
+    global _analysis_executor
+    if _analysis_executor is not None:
+        _analysis_executor.shutdown(wait=False, cancel_futures=True)
+        _analysis_executor = None
+
+
+async def run_in_analysis_pool(func, *args, **kwargs):
+    """
+    Ejecuta func en el pool de procesos sin bloquear el event loop.
+    Rechaza con 503 cuando los workers y la cola están saturados.
+    """
+    global _analysis_inflight
+    if _analysis_inflight >= ANALYSIS_WORKERS + ANALYSIS_QUEUE_SIZE:
+        raise HTTPException(status_code=503, detail="Analysis workers are busy, retry later",
+                            headers={"Retry-After": str(ANALYSIS_RETRY_AFTER)})
+
+    _analysis_inflight += 1
+    try:
+        loop = asyncio.get_running_loop()
+        result, timings = await loop.run_in_executor(get_analysis_executor(),
+                                                     partial(collect_stages, func, *args, **kwargs))
+    except BrokenProcessPool:
+        # Un worker murió (p. ej. por memoria): recrear el pool para las siguientes peticiones
+        shutdown_analysis_executor()
+        raise HTTPException(status_code=503, detail="Analysis worker crashed, retry later",
+                            headers={"Retry-After": str(ANALYSIS_RETRY_AFTER)})
+    finally:
+        _analysis_inflight -= 1
+
+    # Las etapas medidas en el worker se agregan a la petición en curso
+    for name, seconds, samples in timings:
+        record_stage(name, seconds, samples)
+    return result
+
+
+# Trabajos asíncronos: pool propio, para que los análisis largos no ocupen
+# los workers de las peticiones síncronas
+JOB_WORKERS = int(os.environ.get('TDR_JOB_WORKERS', 1))
+JOB_MAX_QUEUED = int(os.environ.get('TDR_JOB_MAX_QUEUED', 100))
+JOB_POLL_INTERVAL = float(os.environ.get('TDR_JOB_POLL_INTERVAL', 1.0))  # segundos
+# Arriendo de un trabajo en ejecución: el despachador lo renueva en cada vuelta
+# (a lo sumo cada JOB_POLL_INTERVAL) y otro proceso lo recupera si vence
+JOB_LEASE = float(os.environ.get('TDR_JOB_LEASE', 30.0))  # segundos
+JOB_CLEANUP_INTERVAL = 60.0  # segundos
+
+_job_executor = None
+_job_wakeup: Optional[asyncio.Event] = None
+
+
+def get_job_executor() -> ProcessPoolExecutor:
+    global _job_executor
+    if _job_executor is None:
+        wait_for_preload()
+        _job_executor = ProcessPoolExecutor(max_workers=JOB_WORKERS)
+    return _job_executor
+
+
+def shutdown_job_executor():
+    # Los trabajos interrumpidos quedan en 'running' y vuelven a la cola al vencer su arriendo
+    global _job_executor
+    if _job_executor is not None:
+        _job_executor.shutdown(wait=False, cancel_futures=True)
+        _job_executor = None
+
+
+def wake_job_dispatcher():
+    if _job_wakeup is not None:
+        _job_wakeup.set()
+
+
+async def run_job(job_id: str, owner: str):
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(get_job_executor(), run_analysis_job, job_id, owner)
+    except BrokenProcessPool:
+        shutdown_job_executor()
+        await run_in_threadpool(job_store.fail, job_id, "Analysis worker crashed", owner)
+        log_event(logging.ERROR, "job_error", job=job_id, error="worker crashed")
+
+
+async def dispatch_jobs():
+    """
+    Toma trabajos de la cola persistente mientras haya workers libres y purga
+    los vencidos. Se despierta al encolar o terminar un trabajo y, por si otro
+    proceso comparte la cola, cada JOB_POLL_INTERVAL segundos. En cada vuelta
+    renueva el arriendo de sus trabajos y devuelve a la cola los de procesos
+    cuyo arriendo venció; los de otros procesos vivos no se tocan.
+    """
+    global _job_wakeup
+    _job_wakeup = asyncio.Event()
+    owner = f"{os.getpid()}-{uuid.uuid4().hex}"
+    running = set()
+
+    def finished(task):
+        running.discard(task)
+        _job_wakeup.set()
+
+    last_cleanup = None
+    while True:
+        try:
+            if running:
+                await run_in_threadpool(job_store.heartbeat, owner)
+            requeued = await run_in_threadpool(job_store.requeue_expired)
+            if requeued:
+                log_event(logging.WARNING, "jobs_requeued", jobs=requeued)
+            while len(running) < JOB_WORKERS:
+                job = await run_in_threadpool(job_store.claim, owner)
+                if job is None:
+                    break
+                log_event(logging.DEBUG, "job_started", job=job['id'], owner=owner)
+                task = asyncio.create_task(run_job(job['id'], owner))
+                running.add(task)
+                task.add_done_callback(finished)
+            if last_cleanup is None or perf_counter() - last_cleanup >= JOB_CLEANUP_INTERVAL:
+                last_cleanup = perf_counter()
+                await run_in_threadpool(job_store.purge_expired)
+        except Exception as e:
+            log_event(logging.ERROR, "job_dispatch_error", error=str(e))
+
+        try:
+            await asyncio.wait_for(_job_wakeup.wait(), JOB_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _job_wakeup.clear()
+
+
+def _spool_upload_to_disk(file: UploadFile) -> Tuple[str, str]:
+    return _spool_stream_to_disk(file.file, file.filename)
+
+
+def _spool_stream_to_disk(stream, filename: str) -> Tuple[str, str]:
+    """
+    Copia un stream por bloques a un archivo temporal que los workers puedan abrir.
+    Retorna la ruta y el hash SHA-256 del contenido, calculado en la misma pasada.
+    """
+    suffix = os.path.splitext(filename or '')[1]
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+        while True:
+            block = stream.read(1 << 20)
+            if not block:
+                break
+            digest.update(block)
+            tmp.write(block)
+        return tmp.name, digest.hexdigest()
+
+
+# Caché de resultados de /analyze-tdr
+result_cache = ResultCache(
+    max_entries=int(os.environ.get('TDR_CACHE_MAX_ENTRIES', 128)),
+    max_bytes=int(os.environ.get('TDR_CACHE_MAX_BYTES', 256 * 1024 * 1024)),
+    ttl=float(os.environ.get('TDR_CACHE_TTL', 3600)),
+    disk_dir=os.environ.get('TDR_CACHE_DIR') or None,
+    disk_max_bytes=int(os.environ.get('TDR_CACHE_DISK_MAX_BYTES', 1024 * 1024 * 1024)),
+)
+
+# Formas de onda procesadas reutilizables entre análisis con distintos parámetros
+waveform_cache = WaveformCache(
+    root=os.environ.get('TDR_WAVEFORM_DIR') or os.path.join(tempfile.gettempdir(), 'tdr_waveforms'),
+    ttl=float(os.environ.get('TDR_WAVEFORM_TTL', 3600)),
+    max_entries=int(os.environ.get('TDR_WAVEFORM_MAX_ENTRIES', 64)),
+)
+
+# Almacén persistente de capturas y resultados (SQLite + .npy)
+capture_store = CaptureStore(
+    root=os.environ.get('TDR_STORE_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'store'),
+)
+
+# Cola persistente de trabajos asíncronos (SQLite + un directorio por trabajo)
+job_store = JobStore(
+    root=os.environ.get('TDR_JOB_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'jobs'),
+    ttl=float(os.environ.get('TDR_JOB_TTL', 86400)),
+    lease=JOB_LEASE,
+)
+
+# Puntos y PNG de las gráficas servidas por /plots/{id}.png
+plot_store = PlotStore(
+    root=os.environ.get('TDR_PLOT_DIR') or os.path.join(tempfile.gettempdir(), 'tdr_plots'),
+    ttl=float(os.environ.get('TDR_PLOT_TTL', 3600)),
+)
+PLOT_CACHE_MAX_AGE = 86400  # segundos; el id es el hash del contenido
+
+
+def waveform_records(waveform: Dict[str, np.ndarray]) -> List[Dict[str, float]]:
+    """
+    Convierte la forma de onda columnar al formato JSON de lista de puntos.
+    """
+    with stage('serialize', len(waveform["time"])):
+        return [{"time": t, "ch1": v} for t, v in zip(waveform["time"].tolist(), waveform["ch1"].tolist())]
+
+
+def validate_plot_mode(plot: str):
+    if plot not in PLOT_MODES:
+        raise HTTPException(status_code=400, detail=f"plot must be one of {', '.join(PLOT_MODES)}")
+
+
+async def analyze_spooled_file(path: str, digest: str, filename: str, cable_length: float,
+                               z0_expected: float, max_points: Optional[int] = None,
+                               decimation: str = 'lttb', plot: str = 'inline', dt_method: str = 'auto',
+                               frequency: bool = False, uncertainty: int = 0) -> Dict:
+    """
+    Análisis TDR de un archivo ya copiado a disco, consultando primero la caché de resultados.
+    """
+    # Sin incertidumbre la clave no cambia, para no invalidar resultados ya guardados
+    extra = {'uncertainty': uncertainty} if uncertainty else {}
+    cache_key = make_cache_key(digest, cable_length=cable_length, z0_expected=z0_expected,
+                               max_points=max_points, decimation=decimation, plot=plot,
+                               dt_method=dt_method, frequency=frequency, **extra)
+    data = await run_in_threadpool(result_cache.get, cache_key)
+    if data is not None and data["plot_url"] and not plot_store.exists(digest):
+        data = None  # La gráfica diferida expiró: recalcular
+    if data is None:
+        data = await run_in_analysis_pool(analyze_tdr_path, path, filename, cable_length, z0_expected,
+                                          max_points=max_points, decimation=decimation,
+                                          plot=plot, plot_id=digest, dt_method=dt_method,
+                                          frequency=frequency, uncertainty=uncertainty)
+        await run_in_threadpool(result_cache.put, cache_key, data)
+    else:
+        log_event(logging.DEBUG, "cache_hit", filename=filename)
+    return data
+
+
+def tdr_response(data: Dict, media_type: str):
+    """
+    Respuesta de /analyze-tdr (y del resultado de /jobs) en el formato negociado.
+    """
+    if media_type != JSON_MEDIA_TYPE:
+        # Los escalares viajan como metadatos; la gráfica y las secciones extensas solo en JSON
+        metadata = {k: v for k, v in data.items()
+                    if k not in ("waveform", "tdr_plot_base64", "frequency", "uncertainty")}
+        return columnar_response(media_type, data["waveform"], metadata)
+    return AnalyzeTDRResponse(**dict(data, waveform=waveform_records(data["waveform"])))
+
+
+@app.post("/analyze-tdr", response_model=AnalyzeTDRResponse,
+          responses={200: {"content": {NPY_MEDIA_TYPE: {}, ARROW_MEDIA_TYPE: {}}}})
+async def analyze_tdr(
+    request: Request,
+    file: UploadFile = File(...),
+    cable_length: float = Form(...),
+    z0_expected: float = Form(50.0),
+    max_points: Optional[int] = Form(None),
+    decimation: str = Form('lttb'),
+    plot: str = Form('inline'),
+    dt_method: str = Form('auto'),
+    frequency: bool = Form(False),
+    uncertainty: int = Form(0)
+):
+    log_event(logging.DEBUG, "request_received", handler="analyze_tdr", filename=file.filename)
+
+    # Validar entradas
+    if not file.filename.lower().endswith(SUPPORTED_EXTENSIONS):
+        raise HTTPException(status_code=400, detail="Uploaded file must be a CSV or BIN file")
+    validate_line_parameters(cable_length, z0_expected)
+    validate_decimation(max_points, decimation)
+    validate_plot_mode(plot)
+    validate_dt_method(dt_method)
+    validate_uncertainty(uncertainty)
+    media_type = negotiate_media_type(request.headers.get('accept'))
+
+    path, digest = await run_in_threadpool(_spool_upload_to_disk, file)
+    try:
+        data = await analyze_spooled_file(path, digest, file.filename, cable_length, z0_expected,
+                                          max_points=max_points, decimation=decimation, plot=plot,
+                                          dt_method=dt_method, frequency=frequency, uncertainty=uncertainty)
+
+        return tdr_response(data, media_type)
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        log_event(logging.INFO, "request_rejected", handler="analyze_tdr", error=str(e))
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        log_event(logging.ERROR, "processing_error", handler="analyze_tdr", error=str(e))
+        raise HTTPException(status_code=500, detail=f"Processing error: {str(e)}")
+    finally:
+        os.unlink(path)
+
+
+# Límites del análisis por lotes
+BATCH_MAX_FILES = int(os.environ.get('TDR_BATCH_MAX_FILES', 200))
+BATCH_MAX_BYTES = int(os.environ.get('TDR_BATCH_MAX_BYTES', 2 * 1024 ** 3))
+
+
+BATCH_PARAMETERS = ('cable_length', 'z0_expected')  # Sobrescribibles por archivo
+
+
+def _parse_batch_parameters(parameters: Optional[str]) -> Dict[str, Dict[str, float]]:
+    if not parameters:
+        return {}
+    try:
+        parsed = json.loads(parameters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"parameters must be valid JSON: {str(e)}")
+    if not isinstance(parsed, dict) or not all(isinstance(v, dict) for v in parsed.values()):
+        raise HTTPException(status_code=400,
+                            detail="parameters must map file names to {cable_length, z0_expected}")
+    for name, overrides in parsed.items():
+        for key, value in overrides.items():
+            if key not in BATCH_PARAMETERS:
+                raise HTTPException(status_code=400, detail=f"Unknown parameter {key} for {name}")
+            # bool es subclase de int y json.loads acepta NaN: ninguno es una longitud
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not np.isfinite(value):
+                raise HTTPException(status_code=400, detail=f"{key} for {name} must be a finite number")
+    return parsed
+
+
+def _spool_batch_to_disk(files: List[UploadFile]) -> List[Tuple[str, str, str]]:
+    """
+    Copia a disco los archivos de un lote, expandiendo los archivos .zip.
+    Retorna (nombre, ruta, hash) de cada captura soportada.
+    """
+    spooled = []
+    try:
+        for upload in files:
+            name = upload.filename or ''
+            if name.lower().endswith('.zip'):
+                with zipfile.ZipFile(upload.file) as archive:
+                    members = [m for m in archive.infolist()
+                               if not m.is_dir() and m.filename.lower().endswith(SUPPORTED_EXTENSIONS)]
+                    if sum(m.file_size for m in members) > BATCH_MAX_BYTES:
+                        raise ValueError("Zip archive is too large once extracted")
+                    for member in members:
+                        if len(spooled) >= BATCH_MAX_FILES:
+                            raise ValueError(f"Batch exceeds {BATCH_MAX_FILES} files")
+                        with archive.open(member) as stream:
+                            spooled.append((member.filename, *_spool_stream_to_disk(stream, member.filename)))
+            elif name.lower().endswith(SUPPORTED_EXTENSIONS):
+                if len(spooled) >= BATCH_MAX_FILES:
+                    raise ValueError(f"Batch exceeds {BATCH_MAX_FILES} files")
+                spooled.append((name, *_spool_upload_to_disk(upload)))
+            else:
+                raise ValueError(f"Unsupported file in batch: {name}")
+    except Exception:
+        for _, path, _ in spooled:
+            os.unlink(path)
+        raise
+    return spooled
+
+
+@app.post("/analyze-tdr/batch")
+async def analyze_tdr_batch(
+    files: List[UploadFile] = File(...),
+    cable_length: Optional[float] = Form(None),
+    z0_expected: float = Form(50.0),
+    parameters: Optional[str] = Form(None),
+    plot: str = Form('none'),
+    dt_method: str = Form('auto')
+):
+    """
+    Analiza varias capturas (o un .zip) en paralelo y devuelve un resultado por
+    línea en NDJSON a medida que cada archivo termina.
+
+    parameters es un JSON opcional {nombre: {"cable_length": ..., "z0_expected": ...}}
+    que sobrescribe los parámetros compartidos para cada archivo.
+    """
+    log_event(logging.DEBUG, "request_received", handler="analyze_tdr_batch", uploads=len(files))
+    validate_plot_mode(plot)
+    validate_dt_method(dt_method)
+    per_file = _parse_batch_parameters(parameters)
+
+    try:
+        spooled = await run_in_threadpool(_spool_batch_to_disk, files)
+    except (ValueError, zipfile.BadZipFile) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not spooled:
+        raise HTTPException(status_code=400, detail="Batch contains no CSV or BIN files")
+
+    # Resolver y validar los parámetros de cada archivo antes de empezar
+    jobs = []
+    try:
+        for name, path, digest in spooled:
+            overrides = per_file.get(name) or per_file.get(os.path.basename(name)) or {}
+            length = overrides.get('cable_length', cable_length)
+            z0 = overrides.get('z0_expected', z0_expected)
+            if length is None:
+                raise HTTPException(status_code=400, detail=f"cable_length missing for {name}")
+            validate_line_parameters(float(length), float(z0))
+            jobs.append((name, path, digest, float(length), float(z0)))
+    except Exception:
+        for _, path, _ in spooled:
+            os.unlink(path)
+        raise
+
+    async def analyze_one(name: str, path: str, digest: str, length: float, z0: float) -> Dict:
+        try:
+            data = await analyze_spooled_file(path, digest, name, length, z0, plot=plot, dt_method=dt_method)
+            result = {k: v for k, v in data.items() if k != "waveform"}
+            return {"filename": name, "status": "ok", "result": result}
+        except HTTPException as e:
+            return {"filename": name, "status": "error", "status_code": e.status_code, "detail": e.detail}
+        except ValueError as e:
+            return {"filename": name, "status": "error", "status_code": 400, "detail": str(e)}
+        except Exception as e:
+            return {"filename": name, "status": "error", "status_code": 500,
+                    "detail": f"Processing error: {str(e)}"}
+
+    async def stream_results():
+        # Limitar los trabajos simultáneos del lote al tamaño del pool
+        slots = asyncio.Semaphore(ANALYSIS_WORKERS)
+
+        async def limited(job):
+            async with slots:
+                return await analyze_one(*job)
+
+        tasks = [asyncio.ensure_future(limited(job)) for job in jobs]
+        failed = 0
+        try:
+            for finished in asyncio.as_completed(tasks):
+                line = await finished
+                failed += line["status"] != "ok"
+                yield json.dumps(line) + "\n"
+            yield json.dumps({"done": True, "files": len(jobs), "failed": failed}) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+            for _, path, _, _, _ in jobs:
+                os.unlink(path)
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+
+@app.post("/analyze-tdr/channels", response_model=AnalyzeChannelsResponse)
+async def analyze_tdr_channels(
+    file: UploadFile = File(...),
+    cable_length: float = Form(...),
+    z0_expected: float = Form(50.0),
+    near_channel: str = Form('CH1'),
+    far_channel: Optional[str] = Form(None),
+    dt_method: str = Form('auto')
+):
+    """
+    Analiza todos los canales de una captura CSV multicanal y, si hay un canal
+    en el extremo lejano, la medición de dos puertos (retardo y velocidad).
+    """
+    log_event(logging.DEBUG, "request_received", handler="analyze_tdr_channels", filename=file.filename)
+
+    if not file.filename.lower().endswith('.csv'):
+        raise HTTPException(status_code=400, detail="Multi-channel analysis requires a CSV file")
+    validate_line_parameters(cable_length, z0_expected)
+    validate_dt_method(dt_method)
+
+    path, _ = await run_in_threadpool(_spool_upload_to_disk, file)
+    try:
+        return await run_in_analysis_pool(analyze_channels_path, path, file.filename, cable_length,
+                                          z0_expected, near_channel, far_channel, dt_method)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        log_event(logging.INFO, "request_rejected", handler="analyze_tdr_channels", error=str(e))
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        log_event(logging.ERROR, "processing_error", handler="analyze_tdr_channels", error=str(e))
+        raise HTTPException(status_code=500, detail=f"Processing error: {str(e)}")
+    finally:
+        os.unlink(path)
+
+
+# Puntos máximos de la rejilla de /analyze-tdr/sweep
+SWEEP_MAX_POINTS = int(os.environ.get('TDR_SWEEP_MAX_POINTS', 1_000_000))
+SWEEP_COLUMNS = ('velocity_factor', 'epsilon_eff', 'error_percent', 'load_value')
+
+
+def parse_grid(value: str, name: str) -> np.ndarray:
+    """
+    Valores de un eje del barrido: lista separada por comas o 'inicio:fin:n'
+    (n puntos equiespaciados, extremos incluidos). Todos deben ser positivos.
+    """
+    try:
+        if ':' in value:
+            start, stop, count = value.split(':')
+            values = np.linspace(float(start), float(stop), int(count))
+        else:
+            values = np.array([float(v) for v in value.split(',') if v.strip()])
+    except ValueError:
+        raise HTTPException(status_code=400,
+                            detail=f"{name} must be a comma-separated list or start:stop:count")
+    if values.size == 0 or not np.all(np.isfinite(values)) or np.any(values <= 0):
+        raise HTTPException(status_code=400, detail=f"{name} must contain values greater than 0")
+    return values
+
+
+@app.post("/analyze-tdr/sweep", responses={200: {"content": {NPY_MEDIA_TYPE: {}, ARROW_MEDIA_TYPE: {}}}})
+async def analyze_tdr_sweep(
+    request: Request,
+    file: UploadFile = File(...),
+    cable_lengths: str = Form(...),
+    z0_values: str = Form('50'),
+    dt_method: str = Form('auto')
+):
+    """
+    Analiza una captura contra una rejilla de longitudes e impedancias de
+    referencia con un solo parseo y una sola detección.
+    """
+    log_event(logging.DEBUG, "request_received", handler="analyze_tdr_sweep", filename=file.filename)
+
+    if not file.filename.lower().endswith(SUPPORTED_EXTENSIONS):
+        raise HTTPException(status_code=400, detail="Uploaded file must be a CSV or BIN file")
+    lengths = parse_grid(cable_lengths, 'cable_lengths')
+    z0 = parse_grid(z0_values, 'z0_values')
+    if lengths.size * z0.size > SWEEP_MAX_POINTS:
+        raise HTTPException(status_code=400, detail=f"Sweep grid exceeds {SWEEP_MAX_POINTS} points")
+    validate_dt_method(dt_method)
+    media_type = negotiate_media_type(request.headers.get('accept'))
+
+    path, _ = await run_in_threadpool(_spool_upload_to_disk, file)
+    try:
+        data = await run_in_analysis_pool(sweep_tdr_path, path, file.filename, lengths, z0, dt_method)
+        scalars = {k: v for k, v in data.items() if k not in ('grid', 'cable_length', 'z0_expected')}
+
+        if media_type != JSON_MEDIA_TYPE:
+            # Una fila por punto de la rejilla, con los ejes como columnas
+            length_axis, z0_axis = np.meshgrid(data['cable_length'], data['z0_expected'], indexing='ij')
+            columns = {'cable_length': length_axis.ravel(), 'z0_expected': z0_axis.ravel()}
+            columns.update({name: data['grid'][name].ravel() for name in SWEEP_COLUMNS})
+            return columnar_response(media_type, columns, dict(scalars, shape=list(length_axis.shape)))
+
+        with stage('serialize', lengths.size * z0.size):
+            return dict(scalars,
+                        cable_length=data['cable_length'].tolist(),
+                        z0_expected=data['z0_expected'].tolist(),
+                        **{name: data['grid'][name].tolist() for name in SWEEP_COLUMNS})
+    except HTTPException:
+        raise
+    except ValueError as e:
+        log_event(logging.INFO, "request_rejected", handler="analyze_tdr_sweep", error=str(e))
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        log_event(logging.ERROR, "processing_error", handler="analyze_tdr_sweep", error=str(e))
+        raise HTTPException(status_code=500, detail=f"Processing error: {str(e)}")
+    finally:
+        os.unlink(path)
+
+
+@app.post("/analyze-tdr/average", responses={200: {"content": {NPY_MEDIA_TYPE: {}, ARROW_MEDIA_TYPE: {}}}})
+async def analyze_tdr_average(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    cable_length: float = Form(...),
+    z0_expected: float = Form(50.0),
+    align: str = Form('xcorr'),
+    smooth: bool = Form(False),
+    dt_method: str = Form('auto'),
+    max_points: Optional[int] = Form(None),
+    decimation: str = Form('lttb')
+):
+    """
+    Promedia N adquisiciones repetidas de la misma línea (o un .zip con ellas)
+    y analiza la traza promedio, con el ruido por muestra como incertidumbre.
+    """
+    log_event(logging.DEBUG, "request_received", handler="analyze_tdr_average", uploads=len(files))
+    validate_line_parameters(cable_length, z0_expected)
+    validate_dt_method(dt_method)
+    validate_decimation(max_points, decimation)
+    if align not in ALIGN_METHODS:
+        raise HTTPException(status_code=400, detail=f"align must be one of {', '.join(ALIGN_METHODS)}")
+    media_type = negotiate_media_type(request.headers.get('accept'))
+
+    try:
+        spooled = await run_in_threadpool(_spool_batch_to_disk, files)
+    except (ValueError, zipfile.BadZipFile) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        if len(spooled) < 2:
+            raise HTTPException(status_code=400, detail="Averaging needs at least 2 acquisitions")
+        items = [(path, name) for name, path, _ in spooled]
+
+        # Cada proceso acumula un grupo de adquisiciones; los parciales se combinan aquí
+        groups = [group for group in np.array_split(np.arange(len(items)), ANALYSIS_WORKERS) if len(group)]
+        partials = await asyncio.gather(*[
+            run_in_analysis_pool(accumulate_waveform_paths, [items[i] for i in group], items[0], align)
+            for group in groups
+        ])
+        stats = RunningStats()
+        for partial, _, _ in partials:
+            stats.merge(partial)
+        _, time_array, config = partials[0]
+
+        data = await run_in_analysis_pool(analyze_averaged_waveform, time_array, stats, config,
+                                          cable_length, z0_expected, align, smooth, dt_method,
+                                          max_points, decimation)
+
+        if media_type != JSON_MEDIA_TYPE:
+            metadata = {k: v for k, v in data.items() if k != "waveform"}
+            return columnar_response(media_type, data["waveform"], metadata)
+        waveform = data["waveform"]
+        with stage('serialize', len(waveform["time"])):
+            data["waveform"] = [{"time": t, "ch1": v, "std_error": e} for t, v, e in zip(
+                waveform["time"].tolist(), waveform["ch1"].tolist(), waveform["std_error"].tolist())]
+        return data
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        log_event(logging.INFO, "request_rejected", handler="analyze_tdr_average", error=str(e))
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        log_event(logging.ERROR, "processing_error", handler="analyze_tdr_average", error=str(e))
+        raise HTTPException(status_code=500, detail=f"Processing error: {str(e)}")
+    finally:
+        for _, path, _ in spooled:
+            os.unlink(path)
+
+
+@app.post("/upload-csv", responses={200: {"content": {NPY_MEDIA_TYPE: {}, ARROW_MEDIA_TYPE: {}}}})
+async def upload_csv(
+    request: Request,
+    file: UploadFile = File(...),
+    max_points: Optional[int] = Form(None),
+    decimation: str = Form('lttb')
+):
+    log_event(logging.DEBUG, "request_received", handler="upload_csv", filename=file.filename)
+    validate_decimation(max_points, decimation)
+    media_type = negotiate_media_type(request.headers.get('accept'))
+    path, _ = await run_in_threadpool(_spool_upload_to_disk, file)
+    try:
+        time_array, voltage_array, config = await run_in_analysis_pool(
+            load_decimated_path, path, file.filename, max_points, decimation)
+        log_event(logging.DEBUG, "waveform_loaded", handler="upload_csv", points=len(time_array))
+        if media_type != JSON_MEDIA_TYPE:
+            return columnar_response(media_type, {"time": time_array, "magnitude": voltage_array},
+                                     {"config": config})
+        return {
+            "time": time_array.tolist(),
+            "magnitude": voltage_array.tolist(),
+            "config": config
+        }
+    except HTTPException:
+        raise
+    except ValueError as e:
+        log_event(logging.INFO, "request_rejected", handler="upload_csv", error=str(e))
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        log_event(logging.ERROR, "processing_error", handler="upload_csv", error=str(e))
+        raise HTTPException(status_code=500, detail=f"Processing error: {str(e)}")
+    finally:
+        os.unlink(path)
+
+def validate_line_parameters(cable_length: float, z0_expected: float):
+    if cable_length <= 0:
+        raise HTTPException(status_code=400, detail="cable_length must be greater than 0")
+    if z0_expected <= 0:
+        raise HTTPException(status_code=400, detail="z0_expected must be greater than 0")
+
+
+def validate_dt_method(dt_method: str):
+    if dt_method not in DT_METHODS:
+        raise HTTPException(status_code=400, detail=f"dt_method must be one of {', '.join(DT_METHODS)}")
+
+
+def validate_uncertainty(uncertainty: int):
+    if not 0 <= uncertainty <= UNCERTAINTY_MAX_TRIALS:
+        raise HTTPException(status_code=400,
+                            detail=f"uncertainty must be between 0 and {UNCERTAINTY_MAX_TRIALS} trials")
+
+
+def validate_decimation(max_points: Optional[int], decimation: str):
+    if max_points is not None and max_points < 3:
+        raise HTTPException(status_code=400, detail="max_points must be at least 3")
+    if decimation not in DECIMATION_METHODS:
+        raise HTTPException(status_code=400,
+                            detail=f"decimation must be one of {', '.join(DECIMATION_METHODS)}")
+
+
+# Streaming en vivo
+STREAM_MAX_RATE = float(os.environ.get('TDR_STREAM_MAX_RATE', 10))  # Actualizaciones por segundo
+STREAM_MAX_POINTS = 1000  # Puntos de la forma de onda decimada por defecto
+
+
+def parse_stream_parameters(message: str) -> Dict:
+    """
+    Valida el mensaje de configuración de una sesión de streaming.
+    """
+    try:
+        raw = json.loads(message)
+        if not isinstance(raw, dict):
+            raise ValueError("configuration must be a JSON object")
+        parameters = {
+            'cable_length': float(raw['cable_length']),
+            'z0_expected': float(raw.get('z0_expected', 50.0)),
+            'dt_method': raw.get('dt_method', 'auto'),
+            'sample_interval': float(raw['sample_interval']) if raw.get('sample_interval') else None,
+            'max_points': int(raw.get('max_points', STREAM_MAX_POINTS)),
+            'decimation': raw.get('decimation', 'lttb'),
+            'average': int(raw.get('average', 1)),
+            'smooth': bool(raw.get('smooth', True)),
+            'change_threshold': float(raw.get('change_threshold', CHANGE_THRESHOLD)),
+        }
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"Missing stream parameter: {e.args[0]}")
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid stream configuration: {str(e)}")
+
+    validate_line_parameters(parameters['cable_length'], parameters['z0_expected'])
+    validate_dt_method(parameters['dt_method'])
+    validate_decimation(parameters['max_points'], parameters['decimation'])
+    if parameters['sample_interval'] is not None and parameters['sample_interval'] <= 0:
+        raise HTTPException(status_code=400, detail="sample_interval must be greater than 0")
+    if not 1 <= parameters['average'] <= STREAM_BUFFER_FRAMES:
+        raise HTTPException(status_code=400, detail=f"average must be between 1 and {STREAM_BUFFER_FRAMES}")
+    if parameters['change_threshold'] < 0:
+        raise HTTPException(status_code=400, detail="change_threshold must be non-negative")
+    return parameters
+
+
+@app.websocket("/stream")
+async def stream_acquisition(websocket: WebSocket):
+    """
+    Adquisición en vivo. El primer mensaje (texto) es la configuración JSON
+    (cable_length, z0_expected, dt_method, sample_interval, max_points,
+    decimation, average, smooth, change_threshold) y puede reenviarse para
+    cambiarla. Luego se envían tramas binarias .npy. El servidor responde con
+    mensajes "update" a lo sumo STREAM_MAX_RATE veces por segundo, analizando
+    solo la trama más reciente y solo si cambió respecto de la última analizada.
+    """
+    await websocket.accept()
+    session = StreamSession()
+    frame_ready = asyncio.Event()
+
+    async def receive_frames():
+        while True:
+            message = await websocket.receive()
+            if message['type'] == 'websocket.disconnect':
+                return
+            try:
+                if message.get('text') is not None:
+                    session.configure(parse_stream_parameters(message['text']))
+                    await websocket.send_json({"type": "ready", "parameters": session.parameters})
+                    frame_ready.set()
+                elif message.get('bytes') is not None:
+                    if not session.parameters:
+                        raise ValueError("Send the stream configuration before the first frame")
+                    session.push(message['bytes'])
+                    frame_ready.set()
+            except HTTPException as e:
+                await websocket.send_json({"type": "error", "detail": e.detail})
+            except ValueError as e:
+                await websocket.send_json({"type": "error", "detail": str(e)})
+
+    async def push_updates():
+        interval = 1 / STREAM_MAX_RATE
+        while True:
+            await frame_ready.wait()
+            frame_ready.clear()
+            frame = session.pending()
+            if frame is None:
+                continue
+
+            time, voltage = frame
+            parameters = session.parameters
+            try:
+                result, events, indices, decimated = await run_in_analysis_pool(
+                    analyze_stream_frame, time, voltage, parameters)
+            except HTTPException as e:
+                # Pool saturado: se reintenta con la trama más reciente
+                session.analyzed = None
+                frame_ready.set()
+                await websocket.send_json({"type": "error", "detail": e.detail})
+                await asyncio.sleep(interval)
+                continue
+            except Exception as e:
+                log_event(logging.ERROR, "stream_analysis_error", error=str(e))
+                await websocket.send_json({"type": "error", "detail": f"Processing error: {str(e)}"})
+                continue
+
+            if parameters is session.parameters:
+                await websocket.send_json(session.update_message(time, result, events, indices, decimated))
+            await asyncio.sleep(interval)
+
+    tasks = [asyncio.create_task(receive_frames()), asyncio.create_task(push_updates())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() is not None and not isinstance(task.exception(), WebSocketDisconnect):
+                log_event(logging.WARNING, "stream_closed", error=str(task.exception()))
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+@app.post("/waveforms", response_model=WaveformHandleResponse)
+async def upload_waveform(file: UploadFile = File(...)):
+    """
+    Sube una forma de onda una sola vez y retorna un handle para reanálisis.
+    """
+    log_event(logging.DEBUG, "request_received", handler="upload_waveform", filename=file.filename)
+    if not file.filename.lower().endswith(SUPPORTED_EXTENSIONS):
+        raise HTTPException(status_code=400, detail="Uploaded file must be a CSV or BIN file")
+
+    path, digest = await run_in_threadpool(_spool_upload_to_disk, file)
+    try:
+        # El handle es el hash del contenido: subir el mismo archivo reutiliza el trazo
+        if waveform_cache.exists(digest):
+            waveform_cache.touch(digest)
+            return await run_in_threadpool(describe_waveform, digest)
+        return await run_in_analysis_pool(prepare_waveform_path, path, file.filename, digest)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        log_event(logging.INFO, "request_rejected", handler="upload_waveform", error=str(e))
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        log_event(logging.ERROR, "processing_error", handler="upload_waveform", error=str(e))
+        raise HTTPException(status_code=500, detail=f"Processing error: {str(e)}")
+    finally:
+        os.unlink(path)
+
+
+@app.post("/simulations/ltspice", response_model=LTspiceImportResponse)
+async def import_ltspice(
+    file: UploadFile = File(...),
+    trace: Optional[str] = Form(None),
+    max_points: Optional[int] = Form(2000),
+    handle: Optional[str] = Form(None),
+    cable_length: Optional[float] = Form(None),
+    z0_expected: float = Form(50.0),
+    dt_method: str = Form('xcorr')
+):
+    """
+    Importa un barrido AC exportado por LTspice (polar dB/° o cartesiano re/im).
+    Con el handle de una forma de onda medida (POST /waveforms) y cable_length,
+    retorna además la simulación superpuesta a la S11(f) medida.
+    """
+    log_event(logging.DEBUG, "request_received", handler="import_ltspice", filename=file.filename)
+    if not file.filename.lower().endswith(LTSPICE_EXTENSIONS):
+        raise HTTPException(status_code=400, detail="Uploaded file must be an LTspice text export (.txt)")
+    validate_decimation(max_points, 'lttb')
+    if handle is not None:
+        if cable_length is None:
+            raise HTTPException(status_code=400, detail="cable_length is required to compare with a waveform")
+        validate_line_parameters(cable_length, z0_expected)
+        validate_dt_method(dt_method)
+        if not waveform_cache.exists(handle):
+            raise HTTPException(status_code=404, detail="Unknown or expired waveform handle")
+
+    path, _ = await run_in_threadpool(_spool_upload_to_disk, file)
+    try:
+        return await run_in_analysis_pool(import_ltspice_path, path, file.filename, trace, max_points,
+                                          handle, cable_length, z0_expected, dt_method)
+    except HTTPException:
+        raise
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Unknown or expired waveform handle")
+    except ValueError as e:
+        log_event(logging.INFO, "request_rejected", handler="import_ltspice", error=str(e))
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        log_event(logging.ERROR, "processing_error", handler="import_ltspice", error=str(e))
+        raise HTTPException(status_code=500, detail=f"Processing error: {str(e)}")
+    finally:
+        os.unlink(path)
+
+
+@app.post("/waveforms/{handle}/analyze", response_model=ReanalyzeTDRResponse)
+async def reanalyze_tdr(
+    handle: str,
+    cable_length: float = Form(...),
+    z0_expected: float = Form(50.0),
+    dt_method: str = Form('auto'),
+    frequency: bool = Form(False)
+):
+    """
+    Recalcula los parámetros dependientes de cable_length, z0_expected y
+    dt_method sin volver a parsear ni filtrar la forma de onda.
+    """
+    validate_line_parameters(cable_length, z0_expected)
+    validate_dt_method(dt_method)
+    if not waveform_cache.exists(handle):
+        raise HTTPException(status_code=404, detail="Unknown or expired waveform handle")
+
+    try:
+        return await run_in_analysis_pool(reanalyze_waveform, handle, cable_length, z0_expected,
+                                          dt_method, frequency)
+    except HTTPException:
+        raise
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Unknown or expired waveform handle")
+    except ValueError as e:
+        log_event(logging.INFO, "request_rejected", handler="reanalyze_tdr", error=str(e))
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        log_event(logging.ERROR, "processing_error", handler="reanalyze_tdr", error=str(e))
+        raise HTTPException(status_code=500, detail=f"Processing error: {str(e)}")
+
+
+@app.get("/plots/{plot_id}.png")
+async def get_plot(plot_id: str, request: Request):
+    """
+    Renderiza bajo demanda la gráfica de un análisis pedido con plot=url o de
+    un handle de /waveforms. El id es el hash del contenido, así que la
+    respuesta es inmutable y se puede cachear en el navegador.
+    """
+    etag = f'"{plot_id}"'
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={PLOT_CACHE_MAX_AGE}, immutable"}
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=304, headers=headers)
+
+    if not plot_store.exists(plot_id) and not waveform_cache.exists(plot_id):
+        raise HTTPException(status_code=404, detail="Unknown or expired plot")
+
+    png = await run_in_threadpool(plot_store.load_png, plot_id)
+    if png is None:
+        try:
+            png = await run_in_analysis_pool(render_plot, plot_id)
+        except KeyError:
+            raise HTTPException(status_code=404, detail="Unknown or expired plot")
+    return Response(content=png, media_type="image/png", headers=headers)
+
+
+def _parse_timestamp(value: Optional[str]) -> Optional[float]:
+    """
+    Convierte una fecha ISO 8601 (o segundos Unix) en segundos Unix.
+    """
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid timestamp: {value}")
+
+
+@app.post("/store/captures")
+async def store_capture(
+    file: UploadFile = File(...),
+    session: Optional[str] = Form(None),
+    captured_at: Optional[str] = Form(None),
+    cable_length: Optional[float] = Form(None),
+    z0_expected: float = Form(50.0),
+    dt_method: str = Form('auto')
+):
+    """
+    Guarda una captura en el almacén persistente, indexada por osciloscopio
+    (número de serie y modelo de la cabecera), sesión y fecha de captura.
+    Con cable_length se analiza y el resultado queda registrado.
+    """
+    log_event(logging.DEBUG, "request_received", handler="store_capture", filename=file.filename)
+    if not file.filename.lower().endswith(SUPPORTED_EXTENSIONS):
+        raise HTTPException(status_code=400, detail="Uploaded file must be a CSV or BIN file")
+    if cable_length is not None:
+        validate_line_parameters(cable_length, z0_expected)
+    validate_dt_method(dt_method)
+    timestamp = _parse_timestamp(captured_at)
+
+    path, digest = await run_in_threadpool(_spool_upload_to_disk, file)
+    try:
+        return await run_in_analysis_pool(store_capture_path, path, file.filename, digest, session,
+                                          timestamp, cable_length, z0_expected, dt_method)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        log_event(logging.INFO, "request_rejected", handler="store_capture", error=str(e))
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        log_event(logging.ERROR, "processing_error", handler="store_capture", error=str(e))
+        raise HTTPException(status_code=500, detail=f"Processing error: {str(e)}")
+    finally:
+        os.unlink(path)
+
+
+@app.get("/store/captures")
+async def query_captures(
+    serial_number: Optional[str] = None,
+    model_number: Optional[str] = None,
+    session: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    load_type: Optional[str] = None,
+    min_velocity_factor: Optional[float] = None,
+    max_velocity_factor: Optional[float] = None,
+    min_vswr: Optional[float] = None,
+    max_vswr: Optional[float] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0)
+):
+    """
+    Historial de capturas filtrado por osciloscopio, sesión, fechas y el último
+    resultado de cada captura.
+    """
+    return await run_in_threadpool(
+        capture_store.query_captures, limit=limit, offset=offset,
+        serial_number=serial_number, model_number=model_number, session=session,
+        since=_parse_timestamp(since), until=_parse_timestamp(until), load_type=load_type,
+        min_velocity_factor=min_velocity_factor, max_velocity_factor=max_velocity_factor,
+        min_vswr=min_vswr, max_vswr=max_vswr)
+
+
+@app.get("/store/captures/{capture_id}")
+async def get_capture(capture_id: int):
+    try:
+        return await run_in_threadpool(capture_store.get_capture, capture_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Unknown capture")
+
+
+@app.delete("/store/captures/{capture_id}")
+async def delete_capture(capture_id: int):
+    try:
+        await run_in_threadpool(capture_store.delete_capture, capture_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Unknown capture")
+    return {"deleted": capture_id}
+
+
+@app.get("/store/captures/{capture_id}/waveform",
+         responses={200: {"content": {NPY_MEDIA_TYPE: {}, ARROW_MEDIA_TYPE: {}}}})
+async def get_capture_waveform(
+    capture_id: int,
+    request: Request,
+    max_points: Optional[int] = None,
+    decimation: str = 'lttb'
+):
+    """
+    Forma de onda procesada de una captura almacenada, sin volver a parsearla.
+    """
+    validate_decimation(max_points, decimation)
+    media_type = negotiate_media_type(request.headers.get('accept'))
+    try:
+        time_array, voltage_array, config, _ = await run_in_threadpool(capture_store.load_samples, capture_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Unknown capture")
+
+    with stage('decimate', len(voltage_array)):
+        time_array, voltage_array = decimate(time_array, voltage_array, max_points, decimation)
+    if media_type != JSON_MEDIA_TYPE:
+        return columnar_response(media_type, {"time": time_array, "magnitude": voltage_array},
+                                 {"config": config})
+    return {"time": time_array.tolist(), "magnitude": voltage_array.tolist(), "config": config}
+
+
+@app.post("/store/captures/{capture_id}/analyze")
+async def analyze_capture(
+    capture_id: int,
+    cable_length: float = Form(...),
+    z0_expected: float = Form(50.0),
+    dt_method: str = Form('auto')
+):
+    """
+    Analiza una captura almacenada y agrega el resultado a su historial.
+    """
+    validate_line_parameters(cable_length, z0_expected)
+    validate_dt_method(dt_method)
+    try:
+        return await run_in_analysis_pool(analyze_stored_capture, capture_id, cable_length,
+                                          z0_expected, dt_method)
+    except HTTPException:
+        raise
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Unknown capture")
+    except ValueError as e:
+        log_event(logging.INFO, "request_rejected", handler="analyze_capture", error=str(e))
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        log_event(logging.ERROR, "processing_error", handler="analyze_capture", error=str(e))
+        raise HTTPException(status_code=500, detail=f"Processing error: {str(e)}")
+
+
+@app.get("/store/sessions")
+async def list_sessions():
+    return await run_in_threadpool(capture_store.group_counts, 'session')
+
+
+@app.get("/store/scopes")
+async def list_scopes():
+    return await run_in_threadpool(capture_store.group_counts, 'serial_number')
+
+
+REGISTRY.register(Gauge('tdr_analysis_inflight', 'Analysis jobs running or queued in the process pool.',
+                        lambda: _analysis_inflight))
+REGISTRY.register(Gauge('tdr_result_cache_entries', 'Results held in the in-memory cache.',
+                        lambda: result_cache.snapshot()['entries']))
+REGISTRY.register(Gauge('tdr_result_cache_hit_ratio', 'Result cache hit ratio since start.',
+                        lambda: result_cache.snapshot()['hit_ratio']))
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job(
+    file: UploadFile = File(...),
+    cable_length: float = Form(...),
+    z0_expected: float = Form(50.0),
+    max_points: Optional[int] = Form(None),
+    decimation: str = Form('lttb'),
+    plot: str = Form('inline'),
+    dt_method: str = Form('auto'),
+    frequency: bool = Form(False),
+    uncertainty: int = Form(0)
+):
+    """
+    Encola el mismo análisis que /analyze-tdr y retorna el trabajo de
+    inmediato; el progreso se consulta en /jobs/{id} y el resultado en
+    /jobs/{id}/result.
+    """
+    log_event(logging.DEBUG, "request_received", handler="submit_job", filename=file.filename)
+    if not file.filename.lower().endswith(SUPPORTED_EXTENSIONS):
+        raise HTTPException(status_code=400, detail="Uploaded file must be a CSV or BIN file")
+    validate_line_parameters(cable_length, z0_expected)
+    validate_decimation(max_points, decimation)
+    validate_plot_mode(plot)
+    validate_dt_method(dt_method)
+    validate_uncertainty(uncertainty)
+    if await run_in_threadpool(job_store.count, 'queued') >= JOB_MAX_QUEUED:
+        raise HTTPException(status_code=503, detail="Job queue is full, retry later",
+                            headers={"Retry-After": str(ANALYSIS_RETRY_AFTER)})
+
+    params = {'cable_length': cable_length, 'z0_expected': z0_expected, 'max_points': max_points,
+              'decimation': decimation, 'plot': plot, 'dt_method': dt_method,
+              'frequency': frequency, 'uncertainty': uncertainty}
+    path, digest = await run_in_threadpool(_spool_upload_to_disk, file)
+    try:
+        job_id = await run_in_threadpool(job_store.create, file.filename, digest, path, params,
+                                         pipeline_stages(**params))
+    finally:
+        if os.path.exists(path):
+            os.unlink(path)
+    wake_job_dispatcher()
+    return await run_in_threadpool(job_store.get, job_id)
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    try:
+        return await run_in_threadpool(job_store.get, job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Unknown job")
+
+
+@app.get("/jobs/{job_id}/result", response_model=AnalyzeTDRResponse,
+         responses={200: {"content": {NPY_MEDIA_TYPE: {}, ARROW_MEDIA_TYPE: {}}}})
+async def get_job_result(job_id: str, request: Request):
+    """
+    Resultado de un trabajo terminado, en el mismo formato que /analyze-tdr.
+    Mientras no haya terminado (o si falló o se canceló) responde 409.
+    """
+    media_type = negotiate_media_type(request.headers.get('accept'))
+    try:
+        job = await run_in_threadpool(job_store.get, job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    if job['status'] != 'done':
+        detail = f"Job is {job['status']}" + (f": {job['error']}" if job['error'] else "")
+        raise HTTPException(status_code=409, detail=detail)
+    data = await run_in_threadpool(job_store.load_result, job_id)
+    return tdr_response(data, media_type)
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """
+    Cancela un trabajo en cola; uno en ejecución se detiene al terminar la
+    etapa en curso.
+    """
+    try:
+        return await run_in_threadpool(job_store.cancel, job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Unknown job")
+
+
+@app.get("/metrics")
+def get_metrics():
+    """
+    Métricas en formato de exposición de texto de Prometheus.
+    """
+    return Response(content=REGISTRY.expose(), media_type=METRICS_MEDIA_TYPE)
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    return result_cache.snapshot()
+
+
+@app.get("/")
+def read_root():
+    return {"message": "Hello World"}
+
+if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,367 @@
+"""
+Instrumentación del backend: tiempos por etapa, métricas estilo Prometheus,
+cabecera Server-Timing y logs estructurados.
+
+Las etapas del pipeline (parse, filter, detect, temporal, impedance,
+attenuation, discontinuities, error, frequency, plot, decimate, serialize) se
+miden con `stage()`. Dentro de una petición los tiempos se acumulan en una
+lista de la petición; en los procesos del pool se devuelven junto al resultado
+(`collect_stages`) y el proceso principal los registra. Los trabajos
+asíncronos usan las mismas etapas como progreso (`report_stages`). Al terminar la
+petición se agregan por etapa en los histogramas y, si está habilitado, se
+envían en la cabecera Server-Timing.
+
+Con TDR_METRICS=0 `stage()` no mide nada, y los logs solo se formatean si
+su nivel está habilitado (TDR_LOG_LEVEL, por defecto WARNING).
+"""
+import bisect
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+METRICS_ENABLED = os.environ.get('TDR_METRICS', '1') != '0'
+SERVER_TIMING_ENABLED = os.environ.get('TDR_SERVER_TIMING', '0') == '1'
+LOG_LEVEL = os.environ.get('TDR_LOG_LEVEL', 'WARNING').upper()
+LOG_FORMAT = os.environ.get('TDR_LOG_FORMAT', 'json')
+
+METRICS_MEDIA_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SAMPLE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+BYTE_BUCKETS = (1 << 10, 1 << 14, 1 << 17, 1 << 20, 1 << 23, 1 << 26, 1 << 30)
+
+logger = logging.getLogger('tdr')
+
+# (etapa, segundos, muestras) de la petición en curso; None fuera de una petición
+_timings: ContextVar[Optional[List[Tuple[str, float, Optional[int]]]]] = ContextVar('tdr_timings', default=None)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def expose(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # Por combinación de etiquetas: conteos por bucket (no acumulados), suma y total
+        self._series: Dict[Tuple[str, ...], List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *label_values: str) -> int:
+        series = self._series.get(label_values)
+        return series[2] if series else 0
+
+    def expose(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, (counts, total, n) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += bucket_count
+                    le = '+Inf' if bound == float('inf') else f"{bound:g}"
+                    labels = _format_labels(self.labels, label_values, 'le="' + le + '"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labels, label_values)
+                lines.append(f"{self.name}_sum{labels} {total:g}")
+                lines.append(f"{self.name}_count{labels} {n}")
+        return lines
+
+
+class Gauge:
+    """
+    Valor leído en el momento de la consulta a través de una función.
+    """
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], float]):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+
+    def expose(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge",
+                f"{self.name} {self.read():g}"]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def expose(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.expose())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'tdr_stage_duration_seconds', 'Duration of each analysis stage per request.', ['stage']))
+STAGE_SAMPLES = REGISTRY.register(Histogram(
+    'tdr_stage_samples', 'Samples processed by each analysis stage per request.', ['stage'], SAMPLE_BUCKETS))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'tdr_http_request_duration_seconds', 'HTTP request duration until the last body byte.', ['handler']))
+REQUESTS = REGISTRY.register(Counter(
+    'tdr_http_requests_total', 'HTTP requests by handler and status code.', ['handler', 'status']))
+PAYLOAD_BYTES = REGISTRY.register(Histogram(
+    'tdr_http_payload_bytes', 'Request and response body sizes.', ['handler', 'direction'], BYTE_BUCKETS))
+
+
+class _Stage:
+    __slots__ = ('samples',)
+
+    def __init__(self, samples: Optional[int]):
+        self.samples = samples
+
+
+_DISABLED_STAGE = _Stage(None)
+
+
+@contextmanager
+def stage(name: str, samples: Optional[int] = None):
+    """
+    Mide un bloque como la etapa name. El objeto devuelto permite fijar
+    .samples cuando el número de muestras se conoce al final (p. ej. al parsear).
+    """
+    # El progreso de los trabajos asíncronos se informa aunque las métricas estén apagadas
+    if not METRICS_ENABLED and not isinstance(_timings.get(), _ReportedTimings):
+        yield _DISABLED_STAGE
+        return
+    record = _Stage(samples)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record_stage(name, time.perf_counter() - start, record.samples)
+
+
+def record_stage(name: str, seconds: float, samples: Optional[int] = None):
+    """
+    Agrega una medición a la petición en curso, o directamente a los
+    histogramas si no hay petición (p. ej. el streaming por WebSocket).
+    """
+    timings = _timings.get()
+    if timings is not None:
+        timings.append((name, seconds, samples))
+    else:
+        _observe_stages([(name, seconds, samples)])
+
+
+def collect_stages(func: Callable, *args, **kwargs):
+    """
+    Ejecuta func (en un proceso del pool) y retorna (resultado, mediciones),
+    para que el proceso principal registre las etapas medidas en el worker.
+    """
+    timings = []
+    token = _timings.set(timings)
+    try:
+        return func(*args, **kwargs), timings
+    finally:
+        _timings.reset(token)
+
+
+class _ReportedTimings(list):
+    """
+    Lista de mediciones que además avisa de cada etapa terminada.
+    """
+
+    def __init__(self, report: Callable[[str, float, Optional[int]], None]):
+        super().__init__()
+        self.report = report
+
+    def append(self, timing: Tuple[str, float, Optional[int]]):
+        super().append(timing)
+        self.report(*timing)
+
+
+def report_stages(report: Callable[[str, float, Optional[int]], None], func: Callable, *args, **kwargs):
+    """
+    Ejecuta func llamando a report(etapa, segundos, muestras) al terminar cada
+    etapa (progreso de los trabajos asíncronos). Una excepción de report
+    interrumpe func, lo que permite cancelar entre etapas.
+    """
+    token = _timings.set(_ReportedTimings(report))
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _timings.reset(token)
+
+
+def _aggregate(timings: List[Tuple[str, float, Optional[int]]]) -> Dict[str, List]:
+    # Una etapa puede ejecutarse varias veces en una petición: se suman
+    totals: Dict[str, List] = {}
+    for name, seconds, samples in timings:
+        entry = totals.setdefault(name, [0.0, None])
+        entry[0] += seconds
+        if samples is not None:
+            entry[1] = (entry[1] or 0) + samples
+    return totals
+
+
+def _observe_stages(timings: List[Tuple[str, float, Optional[int]]]):
+    for name, (seconds, samples) in _aggregate(timings).items():
+        STAGE_SECONDS.observe(seconds, name)
+        if samples is not None:
+            STAGE_SAMPLES.observe(samples, name)
+
+
+def server_timing(timings: List[Tuple[str, float, Optional[int]]], total: float) -> str:
+    """
+    Valor de la cabecera Server-Timing (duraciones en ms).
+    """
+    parts = [f"{name};dur={1e3 * seconds:.3f}" for name, (seconds, _) in _aggregate(timings).items()]
+    parts.append(f"total;dur={1e3 * total:.3f}")
+    return ', '.join(parts)
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI: abre la lista de mediciones de cada petición HTTP, cuenta
+    peticiones y tamaños de cuerpo, y agrega Server-Timing si está habilitado.
+    """
+
+    def __init__(self, app, server_timing_header: bool = SERVER_TIMING_ENABLED):
+        self.app = app
+        self.server_timing_header = server_timing_header
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        timings = []
+        token = _timings.set(timings)
+        start = time.perf_counter()
+        status = 500
+        response_bytes = 0
+
+        async def send_wrapper(message):
+            nonlocal status, response_bytes
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                if self.server_timing_header:
+                    headers = list(message.get('headers', []))
+                    headers.append((b'server-timing',
+                                    server_timing(timings, time.perf_counter() - start).encode('latin-1')))
+                    message = dict(message, headers=headers)
+            elif message['type'] == 'http.response.body':
+                response_bytes += len(message.get('body', b''))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _timings.reset(token)
+            endpoint = scope.get('endpoint')
+            handler = getattr(endpoint, '__name__', 'unmatched')
+            REQUEST_SECONDS.observe(time.perf_counter() - start, handler)
+            REQUESTS.inc(handler, str(status))
+            request_bytes = _content_length(scope)
+            if request_bytes is not None:
+                PAYLOAD_BYTES.observe(request_bytes, handler, 'request')
+            PAYLOAD_BYTES.observe(response_bytes, handler, 'response')
+            _observe_stages(timings)
+
+
+def _content_length(scope) -> Optional[int]:
+    for name, value in scope.get('headers', []):
+        if name == b'content-length':
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': round(record.created, 6),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'event': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        fields = ' '.join(f"{k}={v}" for k, v in getattr(record, 'fields', {}).items())
+        line = f"{record.levelname} {record.name}: {record.getMessage()}"
+        return f"{line} {fields}" if fields else line
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT):
+    """
+    Configura el logger 'tdr' (una sola vez) con salida a stderr.
+    """
+    if not any(getattr(h, '_tdr', False) for h in logger.handlers):
+        handler = logging.StreamHandler(sys.stderr)
+        handler._tdr = True
+        handler.setFormatter(TextFormatter() if fmt == 'text' else JsonFormatter())
+        logger.addHandler(handler)
+        logger.propagate = False
+    logger.setLevel(getattr(logging, level, logging.WARNING))
+
+
+def log_event(level: int, event: str, **fields):
+    """
+    Log estructurado; los campos solo se formatean si el nivel está habilitado.
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={'fields': fields})
@@ -0,0 +1,146 @@
+"""
+Subsistema de renderizado de gráficas TDR.
+
+Usa la API orientada a objetos de Agg (sin el estado global de pyplot) con
+una figura reutilizable por hilo, y dibuja los datos decimados a la
+resolución de la imagen. Las gráficas pueden renderizarse bajo demanda desde
+un PlotStore en disco, identificado por el hash del archivo original.
+"""
+import base64
+import io
+import os
+import threading
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+
+from decimation import decimate
+
+PLOT_WIDTH_IN = 6.4
+PLOT_HEIGHT_IN = 4.8
+PLOT_DPI = 100
+# Dos puntos (mín/máx) por columna de píxeles bastan para una imagen sin pérdidas visibles
+PLOT_MAX_POINTS = 2 * int(PLOT_WIDTH_IN * PLOT_DPI)
+
+PLOT_MODES = ('inline', 'url', 'none')
+
+_local = threading.local()
+
+
+def _get_figure():
+    """
+    Figura, ejes y línea reutilizables del hilo actual.
+    """
+    cached = getattr(_local, 'figure', None)
+    if cached is None:
+        # matplotlib se importa al dibujar la primera gráfica, no al cargar el módulo
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        fig = Figure(figsize=(PLOT_WIDTH_IN, PLOT_HEIGHT_IN), dpi=PLOT_DPI)
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+        line, = ax.plot([], [])
+        ax.set_xlabel('Time')
+        ax.set_ylabel('Magnitude')
+        ax.set_title('TDR Waveform')
+        cached = _local.figure = (fig, ax, line)
+    return cached
+
+
+def plot_points(time_data: np.ndarray, magnitude_data: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Decima la forma de onda a la resolución de la imagen.
+    """
+    return decimate(np.asarray(time_data), np.asarray(magnitude_data), PLOT_MAX_POINTS, 'minmax')
+
+
+def render_tdr_png(time_data: np.ndarray, magnitude_data: np.ndarray) -> bytes:
+    fig, ax, line = _get_figure()
+    line.set_data(*plot_points(time_data, magnitude_data))
+    ax.relim()
+    ax.autoscale_view()
+
+    buf = io.BytesIO()
+    fig.canvas.print_png(buf)
+    return buf.getvalue()
+
+
+def generate_tdr_plot_base64(time_data, magnitude_data) -> str:
+    return base64.b64encode(render_tdr_png(time_data, magnitude_data)).decode('utf-8')
+
+
+class PlotStore:
+    """
+    Puntos decimados y PNG renderizados en disco, con expiración por TTL.
+    """
+
+    def __init__(self, root: str, ttl: float = 3600.0):
+        self.root = root
+        self.ttl = ttl
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, plot_id: str, ext: str) -> str:
+        if not plot_id or not all(c in '0123456789abcdef' for c in plot_id):
+            raise KeyError(plot_id)
+        return os.path.join(self.root, f"{plot_id}.{ext}")
+
+    def _fresh(self, path: str) -> bool:
+        try:
+            return time.time() - os.path.getmtime(path) <= self.ttl
+        except OSError:
+            return False
+
+    def exists(self, plot_id: str) -> bool:
+        try:
+            return self._fresh(self._path(plot_id, 'npy'))
+        except KeyError:
+            return False
+
+    def save_points(self, plot_id: str, time_data: np.ndarray, magnitude_data: np.ndarray):
+        path = self._path(plot_id, 'npy')
+        if self._fresh(path):
+            os.utime(path)
+            return
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.vstack(plot_points(time_data, magnitude_data)))
+        os.replace(tmp_path, path)
+        self.cleanup()
+
+    def load_png(self, plot_id: str) -> Optional[bytes]:
+        path = self._path(plot_id, 'png')
+        if not self._fresh(path):
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def render(self, plot_id: str) -> bytes:
+        """
+        Renderiza y guarda el PNG a partir de los puntos almacenados.
+        """
+        png = self.load_png(plot_id)
+        if png is not None:
+            return png
+        if not self.exists(plot_id):
+            raise KeyError(plot_id)
+        points = np.load(self._path(plot_id, 'npy'))
+        png = render_tdr_png(points[0], points[1])
+
+        path = self._path(plot_id, 'png')
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(png)
+        os.replace(tmp_path, path)
+        return png
+
+    def cleanup(self):
+        now = time.time()
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                if now - os.path.getmtime(path) > self.ttl:
+                    os.unlink(path)
+            except OSError:
+                continue
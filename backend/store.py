@@ -0,0 +1,246 @@
+"""
+Almacén persistente de capturas TDR.
+
+Los metadatos (osciloscopio, sesión, fecha de captura, configuración, eventos)
+y los resultados de cada análisis se indexan en SQLite; las muestras procesadas
+se guardan como un .npy (2, N) por captura y se cargan mapeadas en memoria.
+Una captura se identifica por el hash SHA-256 de su archivo original, de modo
+que volver a subir el mismo archivo no duplica datos.
+"""
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS captures (
+    id INTEGER PRIMARY KEY,
+    digest TEXT NOT NULL UNIQUE,
+    filename TEXT NOT NULL,
+    session TEXT,
+    serial_number TEXT,
+    model_number TEXT,
+    captured_at REAL NOT NULL,
+    stored_at REAL NOT NULL,
+    points INTEGER NOT NULL,
+    sample_interval REAL,
+    config TEXT NOT NULL,
+    events TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS captures_serial ON captures (serial_number, captured_at);
+CREATE INDEX IF NOT EXISTS captures_session ON captures (session, captured_at);
+CREATE INDEX IF NOT EXISTS captures_captured_at ON captures (captured_at);
+
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    capture_id INTEGER NOT NULL REFERENCES captures (id) ON DELETE CASCADE,
+    analyzed_at REAL NOT NULL,
+    cable_length REAL NOT NULL,
+    z0_expected REAL NOT NULL,
+    dt_method TEXT NOT NULL,
+    velocity_factor REAL,
+    vswr REAL,
+    load_type TEXT,
+    reflection_coefficient REAL,
+    error_percent REAL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_capture ON results (capture_id, analyzed_at);
+CREATE INDEX IF NOT EXISTS results_load_type ON results (load_type);
+CREATE INDEX IF NOT EXISTS results_velocity_factor ON results (velocity_factor);
+CREATE INDEX IF NOT EXISTS results_vswr ON results (vswr);
+"""
+
+# Columnas de la última medición que se devuelven junto a cada captura
+_LATEST_RESULT = """
+LEFT JOIN results r ON r.id = (
+    SELECT id FROM results WHERE capture_id = c.id ORDER BY analyzed_at DESC, id DESC LIMIT 1
+)
+"""
+
+# Filtros de consulta: nombre del parámetro → condición SQL
+CAPTURE_FILTERS = {
+    'serial_number': 'c.serial_number = ?',
+    'model_number': 'c.model_number = ?',
+    'session': 'c.session = ?',
+    'since': 'c.captured_at >= ?',
+    'until': 'c.captured_at <= ?',
+    'load_type': 'r.load_type = ?',
+    'min_velocity_factor': 'r.velocity_factor >= ?',
+    'max_velocity_factor': 'r.velocity_factor <= ?',
+    'min_vswr': 'r.vswr >= ?',
+    'max_vswr': 'r.vswr <= ?',
+}
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class CaptureStore:
+    """
+    Índice SQLite más blobs .npy de las capturas y sus resultados.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.blob_dir = os.path.join(root, 'samples')
+        self.db_path = os.path.join(root, 'index.sqlite3')
+        os.makedirs(self.blob_dir, exist_ok=True)
+        with self._connect() as db:
+            db.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # Una conexión por operación: el almacén se usa desde varios procesos del pool
+        db = sqlite3.connect(self.db_path, timeout=30)
+        db.row_factory = sqlite3.Row
+        try:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA foreign_keys=ON')
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def _blob_path(self, digest: str) -> str:
+        if not digest or not all(c in '0123456789abcdef' for c in digest):
+            raise KeyError(digest)
+        return os.path.join(self.blob_dir, f"{digest}.npy")
+
+    def add_capture(self, digest: str, filename: str, time_data: np.ndarray, voltage: np.ndarray,
+                    config: Dict, events: Dict, session: Optional[str] = None,
+                    captured_at: Optional[float] = None) -> int:
+        """
+        Guarda una captura y retorna su id; si ya existe, retorna el id existente.
+        """
+        existing = self.find_capture(digest)
+        if existing is not None:
+            return existing
+
+        path = self._blob_path(digest)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.vstack((time_data, voltage)))
+        os.replace(tmp_path, path)
+
+        now = time.time()
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR IGNORE INTO captures (digest, filename, session, serial_number, model_number,"
+                " captured_at, stored_at, points, sample_interval, config, events)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (digest, filename, session, config.get('serial_number'), config.get('model_number'),
+                 captured_at if captured_at is not None else now, now, len(time_data),
+                 config.get('sample_interval'), json.dumps(config, default=_json_default),
+                 json.dumps(events, default=_json_default)))
+            return db.execute("SELECT id FROM captures WHERE digest = ?", (digest,)).fetchone()['id']
+
+    def find_capture(self, digest: str) -> Optional[int]:
+        with self._connect() as db:
+            row = db.execute("SELECT id FROM captures WHERE digest = ?", (digest,)).fetchone()
+        return row['id'] if row else None
+
+    def add_result(self, capture_id: int, cable_length: float, z0_expected: float,
+                   dt_method: str, data: Dict) -> int:
+        with self._connect() as db:
+            cursor = db.execute(
+                "INSERT INTO results (capture_id, analyzed_at, cable_length, z0_expected, dt_method,"
+                " velocity_factor, vswr, load_type, reflection_coefficient, error_percent, data)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (capture_id, time.time(), cable_length, z0_expected, dt_method,
+                 data.get('velocity_factor'), data.get('vswr'), data.get('load_type'),
+                 data.get('reflection_coefficient'), data.get('error_percent'),
+                 json.dumps(data, default=_json_default)))
+            return cursor.lastrowid
+
+    def query_captures(self, limit: int = 100, offset: int = 0, **filters) -> List[Dict]:
+        """
+        Capturas que cumplen los filtros (ver CAPTURE_FILTERS), de la más reciente
+        a la más antigua, con el último resultado de cada una.
+        """
+        conditions, params = [], []
+        for name, value in filters.items():
+            if value is None:
+                continue
+            if name not in CAPTURE_FILTERS:
+                raise ValueError(f"Unknown filter: {name}")
+            conditions.append(CAPTURE_FILTERS[name])
+            params.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT c.id, c.digest, c.filename, c.session, c.serial_number, c.model_number,"
+                " c.captured_at, c.points, c.sample_interval, r.data AS latest_result"
+                f" FROM captures c {_LATEST_RESULT} {where}"
+                " ORDER BY c.captured_at DESC, c.id DESC LIMIT ? OFFSET ?",
+                (*params, limit, offset)).fetchall()
+        return [self._capture_summary(row) for row in rows]
+
+    def get_capture(self, capture_id: int) -> Dict:
+        with self._connect() as db:
+            row = db.execute("SELECT * FROM captures WHERE id = ?", (capture_id,)).fetchone()
+            if row is None:
+                raise KeyError(capture_id)
+            results = db.execute(
+                "SELECT id, analyzed_at, cable_length, z0_expected, dt_method, data FROM results"
+                " WHERE capture_id = ? ORDER BY analyzed_at DESC, id DESC", (capture_id,)).fetchall()
+
+        capture = {k: row[k] for k in row.keys() if k not in ('config', 'events')}
+        capture['config'] = json.loads(row['config'])
+        capture['events'] = json.loads(row['events'])
+        capture['results'] = [
+            {'id': r['id'], 'analyzed_at': r['analyzed_at'], 'cable_length': r['cable_length'],
+             'z0_expected': r['z0_expected'], 'dt_method': r['dt_method'], 'result': json.loads(r['data'])}
+            for r in results
+        ]
+        return capture
+
+    def load_samples(self, capture_id: int) -> Tuple[np.ndarray, np.ndarray, Dict, Dict]:
+        """
+        Tiempo y voltaje mapeados en memoria, más configuración y eventos.
+        """
+        with self._connect() as db:
+            row = db.execute("SELECT digest, config, events FROM captures WHERE id = ?",
+                             (capture_id,)).fetchone()
+        if row is None:
+            raise KeyError(capture_id)
+        samples = np.load(self._blob_path(row['digest']), mmap_mode='r')
+        return samples[0], samples[1], json.loads(row['config']), json.loads(row['events'])
+
+    def group_counts(self, column: str) -> List[Dict]:
+        """
+        Número de capturas y rango de fechas por sesión u osciloscopio.
+        """
+        if column not in ('session', 'serial_number'):
+            raise ValueError(f"Cannot group by {column}")
+        with self._connect() as db:
+            rows = db.execute(
+                f"SELECT {column}, MIN(model_number) AS model_number, COUNT(*) AS captures,"
+                " MIN(captured_at) AS first_capture, MAX(captured_at) AS last_capture"
+                f" FROM captures GROUP BY {column} ORDER BY last_capture DESC").fetchall()
+        return [dict(row) for row in rows]
+
+    def delete_capture(self, capture_id: int):
+        with self._connect() as db:
+            row = db.execute("SELECT digest FROM captures WHERE id = ?", (capture_id,)).fetchone()
+            if row is None:
+                raise KeyError(capture_id)
+            db.execute("DELETE FROM captures WHERE id = ?", (capture_id,))
+        try:
+            os.unlink(self._blob_path(row['digest']))
+        except OSError:
+            pass
+
+    @staticmethod
+    def _capture_summary(row: sqlite3.Row) -> Dict:
+        summary = {k: row[k] for k in row.keys() if k != 'latest_result'}
+        summary['latest_result'] = json.loads(row['latest_result']) if row['latest_result'] else None
+        return summary
@@ -0,0 +1,260 @@
+"""
+Adquisición en vivo por WebSocket.
+
+Un agente local de adquisición (o el osciloscopio simulado de este módulo)
+envía tramas .npy continuamente. Cada sesión guarda las últimas tramas en un
+buffer circular y solo vuelve a analizar cuando la trama (o el promedio de
+las últimas) difiere de forma apreciable de la última analizada. La forma de
+onda decimada se envía al navegador como diferencias respecto de la anterior.
+"""
+import io
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+STREAM_BUFFER_FRAMES = 32  # Capacidad del buffer circular por sesión
+CHANGE_THRESHOLD = 0.01  # Diferencia RMS mínima, relativa a la excursión de la señal
+DELTA_TOLERANCE = 1e-3  # Cambio mínimo de un punto decimado, relativo a la excursión
+
+
+def decode_frame(data: bytes, sample_interval: Optional[float]) -> Tuple[Optional[np.ndarray], np.ndarray]:
+    """
+    Decodifica una trama .npy: (N,) voltaje sobre una rejilla de sample_interval,
+    o (2, N) tiempo y voltaje. Retorna (tiempo o None, voltaje).
+    """
+    try:
+        array = np.load(io.BytesIO(data), allow_pickle=False)
+    except (ValueError, OSError, EOFError) as e:
+        raise ValueError(f"Frame must be a .npy array: {str(e)}")
+    if array.dtype.kind not in 'fiu':
+        raise ValueError("Frame must contain numeric samples")
+    array = array.astype(np.float64, copy=False)
+
+    if array.ndim == 1:
+        if not sample_interval:
+            raise ValueError("1-D frames need sample_interval in the stream configuration")
+        time = None
+        voltage = array
+    elif array.ndim == 2 and array.shape[0] == 2:
+        time, voltage = array[0], array[1]
+    else:
+        raise ValueError(f"Frame must have shape (N,) or (2, N), got {array.shape}")
+
+    if len(voltage) < 10:
+        raise ValueError("Frame has too few samples")
+    if not np.all(np.isfinite(voltage)):
+        raise ValueError("Frame contains non-finite samples")
+    return time, voltage
+
+
+def frame_changed(previous: Optional[np.ndarray], current: np.ndarray,
+                  threshold: float = CHANGE_THRESHOLD) -> bool:
+    """
+    True si la diferencia RMS entre tramas supera threshold veces la excursión
+    de la trama anterior.
+    """
+    if previous is None or previous.shape != current.shape:
+        return True
+    span = np.ptp(previous)
+    if span == 0:
+        return bool(np.any(previous != current))
+    return float(np.sqrt(np.mean((current - previous) ** 2))) > threshold * span
+
+
+class FrameRing:
+    """
+    Buffer circular preasignado de las últimas tramas sobre una misma rejilla.
+    """
+
+    def __init__(self, capacity: int = STREAM_BUFFER_FRAMES):
+        self.capacity = capacity
+        self.frames: Optional[np.ndarray] = None
+        self.count = 0  # Tramas recibidas desde el último reinicio
+        self.time: Optional[np.ndarray] = None
+
+    def push(self, time: np.ndarray, voltage: np.ndarray):
+        """
+        Agrega una trama; si cambia la rejilla temporal el buffer se reinicia.
+        """
+        same_grid = self.time is time or (self.time is not None and np.array_equal(self.time, time))
+        if self.frames is None or not same_grid:
+            self.frames = np.empty((self.capacity, len(voltage)))
+            self.time = time
+            self.count = 0
+        self.frames[self.count % self.capacity] = voltage
+        self.count += 1
+
+    def __len__(self) -> int:
+        return min(self.count, self.capacity)
+
+    def latest(self, n: int = 1) -> np.ndarray:
+        """
+        La última trama, o el promedio de las últimas n.
+        """
+        if self.count == 0:
+            raise ValueError("No frames received")
+        n = max(1, min(n, len(self)))
+        if n == 1:
+            return self.frames[(self.count - 1) % self.capacity].copy()
+        slots = (self.count - 1 - np.arange(n)) % self.capacity
+        return self.frames[slots].mean(axis=0)
+
+
+class WaveformDelta:
+    """
+    Codifica la forma de onda decimada como diferencias con la última enviada.
+    Los puntos se identifican por su índice en la trama original.
+    """
+
+    def __init__(self):
+        self.values: Dict[int, float] = {}
+        self.grid: Optional[Tuple[int, float, float]] = None
+
+    def reset(self):
+        self.values = {}
+        self.grid = None
+
+    def update(self, grid: Tuple[int, float, float], indices: np.ndarray, time: np.ndarray,
+               values: np.ndarray) -> Dict:
+        """
+        Retorna {"reset", "index", "time", "ch1", "removed"}: con reset=True
+        (primera traza o nueva rejilla de la trama) los puntos reemplazan toda la
+        traza; si no, solo van los puntos nuevos o que cambiaron más que la
+        tolerancia y los índices que ya no están.
+        """
+        reset = grid != self.grid
+        self.grid = grid
+
+        tolerance = DELTA_TOLERANCE * float(np.ptp(values)) if len(values) else 0.0
+        previous = self.values
+        current = dict(zip(indices.tolist(), values.tolist()))
+
+        if reset:
+            send = np.ones(len(indices), dtype=bool)
+            removed = []
+        else:
+            old = np.array([previous.get(i, np.nan) for i in indices.tolist()])
+            send = ~(np.abs(values - old) <= tolerance)  # NaN (punto nuevo) también se envía
+            removed = sorted(set(previous) - set(current))
+            # Los puntos no enviados conservan el valor que tiene el cliente
+            for i, keep in zip(indices.tolist(), ~send):
+                if keep:
+                    current[i] = previous[i]
+        self.values = current
+
+        return {
+            "reset": reset,
+            "index": indices[send].tolist(),
+            "time": time[send].tolist(),
+            "ch1": values[send].tolist(),
+            "removed": removed,
+        }
+
+
+class StreamSession:
+    """
+    Estado de una conexión: parámetros, buffer de tramas, última trama
+    analizada y forma de onda enviada.
+    """
+
+    def __init__(self, capacity: int = STREAM_BUFFER_FRAMES):
+        self.parameters: Dict = {}
+        self.ring = FrameRing(capacity)
+        self.delta = WaveformDelta()
+        self.analyzed: Optional[np.ndarray] = None
+        self.received = 0
+        self.analyses = 0
+        self.skipped = 0
+        self._grid: Optional[Tuple[int, float]] = None
+        self._time: Optional[np.ndarray] = None
+
+    def configure(self, parameters: Dict):
+        """
+        Reemplaza los parámetros; la siguiente trama se analiza siempre.
+        """
+        self.parameters = parameters
+        self.analyzed = None
+        self.delta.reset()
+
+    def push(self, data: bytes):
+        time, voltage = decode_frame(data, self.parameters.get('sample_interval'))
+        if time is None:
+            time = self._uniform_time(len(voltage))
+        self.ring.push(time, voltage)
+        self.received += 1
+
+    def _uniform_time(self, n: int) -> np.ndarray:
+        # Se reutiliza el mismo arreglo para que el buffer reconozca la rejilla
+        grid = (n, self.parameters['sample_interval'])
+        if grid != self._grid:
+            self._grid = grid
+            self._time = np.arange(n) * grid[1]
+        return self._time
+
+    def pending(self) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Trama a analizar (promediando las últimas 'average'), o None si no
+        difiere de la última analizada.
+        """
+        if self.ring.count == 0:
+            return None
+        voltage = self.ring.latest(self.parameters.get('average', 1))
+        if not frame_changed(self.analyzed, voltage, self.parameters.get('change_threshold', CHANGE_THRESHOLD)):
+            self.skipped += 1
+            return None
+        self.analyzed = voltage
+        self.analyses += 1
+        return self.ring.time, voltage
+
+    def update_message(self, time: np.ndarray, result: Dict, events: Dict, indices: np.ndarray,
+                       voltage: np.ndarray) -> Dict:
+        """
+        Mensaje para el navegador con los resultados del análisis de la trama
+        (tiempo time) y las diferencias de la forma de onda decimada.
+        """
+        grid = (len(time), float(time[0]), float(time[-1]))
+        return {
+            "type": "update",
+            "received": self.received,
+            "analyses": self.analyses,
+            "skipped": self.skipped,
+            "result": result,
+            "events": events,
+            "waveform": self.delta.update(grid, indices, time[indices], voltage),
+        }
+
+
+class SimulatedScope:
+    """
+    Osciloscopio simulado: escalón incidente más la reflexión de una carga a
+    una distancia configurable, con ruido gaussiano. Sirve para probar el
+    streaming sin hardware.
+    """
+
+    def __init__(self, points: int = 2000, sample_interval: float = 1e-9, delay: float = 500e-9,
+                 reflection: float = 0.5, noise: float = 0.005, rise_time: float = 5e-9, seed: Optional[int] = None):
+        self.points = points
+        self.sample_interval = sample_interval
+        self.delay = delay  # Tiempo de ida y vuelta hasta la carga
+        self.reflection = reflection
+        self.noise = noise
+        self.rise_time = rise_time
+        self.rng = np.random.default_rng(seed)
+
+    def waveform(self) -> Tuple[np.ndarray, np.ndarray]:
+        time = np.arange(self.points) * self.sample_interval
+        t0 = 0.1 * self.points * self.sample_interval
+        scale = self.rise_time / 4
+        incident = 1 / (1 + np.exp(-(time - t0) / scale))
+        reflected = self.reflection / (1 + np.exp(-(time - t0 - self.delay) / scale))
+        voltage = incident + reflected + self.rng.normal(0, self.noise, self.points)
+        return time, voltage
+
+    def frame(self, with_time: bool = False) -> bytes:
+        """
+        Trama .npy lista para enviar: (N,) voltaje o, con with_time, (2, N).
+        """
+        time, voltage = self.waveform()
+        buffer = io.BytesIO()
+        np.save(buffer, np.vstack((time, voltage)) if with_time else voltage)
+        return buffer.getvalue()
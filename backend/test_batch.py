@@ -0,0 +1,106 @@
+"""
+Endpoint de lotes: .zip con varias capturas, parámetros por archivo y una
+línea NDJSON por archivo, también para los que fallan.
+"""
+import io
+import json
+import os
+import sys
+import zipfile
+
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.dirname(__file__))
+
+import main
+from benchmark import synthetic_step, write_siglent_csv
+
+
+@pytest.fixture
+def archive(tmp_path):
+    path = str(tmp_path / 'capture.csv')
+    write_siglent_csv(path, *synthetic_step(1400, 'open', 0.005))
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zf:
+        zf.write(path, 'session/short_line.csv')
+        zf.write(path, 'session/long_line.csv')
+        zf.writestr('session/broken.csv', 'not,a\nwaveform,export\n')
+        zf.writestr('session/notes.txt', 'ignored')
+    return buffer.getvalue()
+
+
+def post(client, archive, **data):
+    return client.post('/analyze-tdr/batch', files={'files': ('session.zip', archive, 'application/zip')},
+                       data=dict({'cable_length': '30'}, **data))
+
+
+def test_batch_streams_one_line_per_file(archive):
+    overrides = {'long_line.csv': {'cable_length': 60}}
+    with TestClient(main.app) as client:
+        response = post(client, archive, parameters=json.dumps(overrides))
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[-1] == {'done': True, 'files': 3, 'failed': 1}
+
+    results = {line['filename']: line for line in lines[:-1]}
+    short, long = results['session/short_line.csv'], results['session/long_line.csv']
+    assert short['status'] == long['status'] == 'ok'
+    assert (short['result']['length_meters'], long['result']['length_meters']) == (30.0, 60.0)
+    # Mismo Δt medido: el factor de velocidad escala con la longitud indicada
+    assert long['result']['velocity_factor'] == pytest.approx(2 * short['result']['velocity_factor'])
+    assert 'waveform' not in short['result']
+
+    broken = results['session/broken.csv']
+    assert broken['status'] == 'error' and broken['status_code'] == 400
+
+
+@pytest.mark.parametrize('parameters', [
+    '{"long_line.csv": {"cable_length": "abc"}}',
+    '{"long_line.csv": {"cable_length": true}}',
+    '{"long_line.csv": {"z0_expected": null}}',
+    '{"long_line.csv": {"cable_length": NaN}}',  # No es JSON estándar, pero json.loads lo acepta
+    '{"long_line.csv": {"length": 60}}',
+    '{"long_line.csv": {"cable_length": -1}}',
+    '{"long_line.csv": 60}',
+])
+def test_invalid_overrides_are_rejected(archive, parameters):
+    with TestClient(main.app) as client:
+        response = post(client, archive, parameters=parameters)
+    assert response.status_code == 400, response.text
+
+
+def test_one_invalid_override_rejects_the_whole_batch(archive):
+    # Los parámetros se validan antes de analizar: ningún archivo llega a procesarse
+    parameters = {'short_line.csv': {'cable_length': 45}, 'long_line.csv': {'z0_expected': 0}}
+    with TestClient(main.app) as client:
+        response = post(client, archive, parameters=json.dumps(parameters))
+        assert response.status_code == 400 and response.headers['content-type'] == 'application/json'
+
+        missing = client.post('/analyze-tdr/batch', files={'files': ('session.zip', archive, 'application/zip')},
+                              data={'parameters': json.dumps({'short_line.csv': {'cable_length': 30}})})
+    assert missing.status_code == 400 and 'long_line.csv' in missing.json()['detail']
+
+
+def test_mixed_uploads_report_each_failure_in_the_stream(tmp_path):
+    path = str(tmp_path / 'capture.csv')
+    write_siglent_csv(path, *synthetic_step(1400, 'open', 0.005))
+    with open(path, 'rb') as f:
+        content = f.read()
+    files = [
+        ('files', ('good.csv', content, 'text/csv')),
+        ('files', ('empty.csv', b'', 'text/csv')),
+        ('files', ('truncated.bin', b'\x00' * 64, 'application/octet-stream')),
+    ]
+    with TestClient(main.app) as client:
+        response = client.post('/analyze-tdr/batch', files=files,
+                               data={'cable_length': '30', 'parameters': '{"good.csv": {"z0_expected": 75}}'})
+    assert response.status_code == 200 and response.headers['content-type'].startswith('application/x-ndjson')
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[-1] == {'done': True, 'files': 3, 'failed': 2}
+
+    results = {line['filename']: line for line in lines[:-1]}
+    assert results['good.csv']['status'] == 'ok' and results['good.csv']['result']['Z0'] > 0
+    for name in ('empty.csv', 'truncated.bin'):
+        assert results[name]['status'] == 'error' and results[name]['status_code'] == 400
+        assert results[name]['detail']
@@ -0,0 +1,62 @@
+"""
+Benchmark del pipeline: trazas sintéticas en formato Siglent, documento de
+resultados y comparación entre ejecuciones.
+"""
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(__file__))
+
+from benchmark import compare, run_benchmark, synthetic_step, write_siglent_csv
+from main import LocalUpload, detect_pulse_events, process_csv_file
+
+
+@pytest.mark.parametrize('load, sign', [('open', 1), ('short', -1), ('matched', 0)])
+def test_synthetic_csv_round_trip(tmp_path, load, sign):
+    time_data, voltage, sample_interval = synthetic_step(14_000, load, noise=0.01)
+    path = str(tmp_path / 'trace.csv')
+    write_siglent_csv(path, time_data, voltage, sample_interval)
+
+    upload = LocalUpload(path, 'trace.csv')
+    try:
+        parsed_time, parsed_voltage, config = process_csv_file(upload)
+    finally:
+        upload.close()
+    assert len(parsed_time) == 14_000
+    assert config['sample_interval'] == pytest.approx(sample_interval)
+
+    # El nivel final refleja el signo de la carga respecto de la meseta incidente
+    events = detect_pulse_events(parsed_time, parsed_voltage, config)
+    plateau = np.median(parsed_voltage[(parsed_time > events['t0'] + 50e-9) & (parsed_time < events['t0'] + 250e-9)])
+    final = np.median(parsed_voltage[-500:])
+    assert np.sign(round((final - plateau) / plateau, 1)) == sign
+
+
+def test_run_and_compare():
+    document = run_benchmark([700], ['open', 'matched'], noise=0.01, repeat=1)
+    stages = {(r['load'], r['stage']): r for r in document['results']}
+
+    assert stages[('open', 'endpoint')]['median'] > 0
+    assert stages[('open', 'startup_import')]['median'] > 0
+    assert stages[('open', 'startup_first_request')]['median'] > 0
+    assert stages[('open', 'parse')]['peak_memory_bytes'] > 0
+    assert 'error' in stages[('matched', 'temporal_xcorr')]
+    assert document['environment']['numpy'] == np.__version__
+
+    slower = {'results': [dict(r, median=r['median'] * 3 + 1e-3 if r['median'] is not None else None)
+                          for r in document['results']]}
+    rows = compare(slower, document)
+    assert rows and all(r['regression'] for r in rows)
+    assert not any(r['regression'] for r in compare(document, document))
+
+
+def test_import_defers_heavy_dependencies():
+    code = ("import sys, main; print(','.join(m for m in ('pandas', 'scipy.signal', 'matplotlib', 'pyarrow')"
+            " if m in sys.modules))")
+    output = subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                            env=dict(os.environ, TDR_PRELOAD='off'), capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == ''
@@ -0,0 +1,112 @@
+"""
+Lector del formato binario Siglent (.bin, versión 2): escalas con magnitud de
+unidad, códigos por división de la cabecera y muestras de 8 y 16 bits.
+"""
+import io
+import os
+import struct
+import sys
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.dirname(__file__))
+
+import main
+from uncertainty import CODES_PER_DIV
+
+MILLI, UNIT, GIGA = 7, 8, 11
+
+
+def write_siglent_bin(path, codes, vdiv, offset, sample_rate, code_per_div=0, width=1, big_endian=False,
+                      channels=(False, True, True, False)):
+    """
+    Escribe una cabecera V2 y las muestras de cada canal activo. vdiv, offset y
+    sample_rate son pares (valor, magnitud) como los guarda el osciloscopio.
+    """
+    header = bytearray(main.BIN_DATA_OFFSET)
+    struct.pack_into('<4i', header, main.BIN_CH_ON_OFFSET, *channels)
+    for channel in range(main.BIN_MAX_CHANNELS):
+        for base, (value, magnitude) in ((main.BIN_VDIV_OFFSET, vdiv), (main.BIN_VOFFSET_OFFSET, offset)):
+            position = base + channel * main.BIN_DATA_WITH_UNIT_SIZE
+            struct.pack_into('<di', header, position, value, magnitude)
+        struct.pack_into('<i', header, main.BIN_CODE_PER_DIV_OFFSET + 4 * channel, code_per_div)
+    struct.pack_into('<di', header, main.BIN_TDIV_OFFSET, 50.0, 5)  # 50 ns/div
+    struct.pack_into('<i', header, main.BIN_WAVE_LENGTH_OFFSET, len(codes))
+    struct.pack_into('<di', header, main.BIN_SAMPLE_RATE_OFFSET, *sample_rate)
+    header[main.BIN_DATA_WIDTH_OFFSET] = width == 2
+    header[main.BIN_BYTE_ORDER_OFFSET] = big_endian
+
+    dtype = np.int8 if width == 1 else ('>i2' if big_endian else '<i2')
+    samples = np.asarray(codes, dtype=np.int64) * (256 if width == 2 else 1)
+    with open(path, 'wb') as f:
+        f.write(bytes(header))
+        for _ in range(sum(map(bool, channels))):
+            f.write(samples.astype(dtype).tobytes())
+
+
+@pytest.mark.parametrize('width, big_endian', [(1, False), (2, False), (2, True)])
+def test_round_trip_uses_header_units_and_codes(tmp_path, width, big_endian):
+    codes = np.arange(-100, 101)
+    path = str(tmp_path / 'capture.bin')
+    write_siglent_bin(path, codes, vdiv=(500.0, MILLI), offset=(-1.0, UNIT), sample_rate=(1.0, GIGA),
+                      code_per_div=30, width=width, big_endian=big_endian)
+
+    with open(path, 'rb') as f:
+        time, voltage, config = main._read_bin(f)
+    assert config['vertical_scale'] == pytest.approx(0.5)
+    assert config['sample_interval'] == pytest.approx(1e-9)
+    assert config['horizontal_scale'] == pytest.approx(0.05)
+    assert config['code_per_div'] == 30 and config['record_length'] == len(codes)
+    np.testing.assert_allclose(time, np.arange(len(codes)) * 1e-9)
+    np.testing.assert_allclose(voltage, codes * 0.5 / 30 + 1.0)
+
+
+def test_headers_without_codes_or_magnitudes_use_defaults(tmp_path):
+    codes = np.array([-25, 0, 25, 50])
+    path = str(tmp_path / 'capture.bin')
+    write_siglent_bin(path, codes, vdiv=(2.0, 0), offset=(0.0, 0), sample_rate=(2e9, 0),
+                      channels=(True, False, False, False))
+
+    with open(path, 'rb') as f:
+        _, voltage, config = main._read_bin(f)
+    assert config['code_per_div'] == CODES_PER_DIV
+    assert config['sample_interval'] == pytest.approx(0.5e-9)
+    np.testing.assert_allclose(voltage, [-2.0, 0.0, 2.0, 4.0])
+
+    # El pipeline lee el mismo archivo, también cuando no se puede mapear en memoria
+    with open(path, 'rb') as f:
+        content = f.read()
+    upload = main.UploadFile(file=io.BytesIO(content), filename='capture.bin')
+    _, parsed, _ = main.load_waveform_file(upload, smooth=False)
+    np.testing.assert_allclose(parsed, voltage)
+
+
+def test_truncated_file_is_rejected(tmp_path):
+    path = str(tmp_path / 'capture.bin')
+    write_siglent_bin(path, np.zeros(100), vdiv=(1.0, UNIT), offset=(0.0, UNIT), sample_rate=(1.0, GIGA))
+    with open(path, 'r+b') as f:
+        f.truncate(main.BIN_DATA_OFFSET + 50)
+    with pytest.raises(ValueError, match='truncated'):
+        main.load_waveform_path(path, 'capture.bin', smooth=False)
+
+
+def test_bin_upload_through_the_endpoints(tmp_path):
+    # Escalón cuantizado a 25 códigos por división, como lo guarda el osciloscopio
+    codes = np.where(np.arange(2000) < 500, 0, 50)
+    path = str(tmp_path / 'capture.bin')
+    write_siglent_bin(path, codes, vdiv=(100.0, MILLI), offset=(0.0, UNIT), sample_rate=(1.0, GIGA))
+    with open(path, 'rb') as f:
+        content = f.read()
+
+    files = {'file': ('capture.bin', content, 'application/octet-stream')}
+    with TestClient(main.app) as client:
+        response = client.post('/upload-csv', files=files)
+        assert response.status_code == 200, response.text
+        body = response.json()
+        assert len(body['time']) == len(codes) and body['config']['code_per_div'] == CODES_PER_DIV
+        np.testing.assert_allclose(body['magnitude'][-1], 0.2)
+
+        response = client.post('/upload-csv', files={'file': ('capture.bin', content[:300], 'application/octet-stream')})
+        assert response.status_code == 400
@@ -0,0 +1,98 @@
+"""
+Caché de resultados: expulsión LRU por entradas y bytes, TTL y nivel en disco
+(pickle) compartido entre instancias.
+"""
+import os
+import pickle
+import sys
+import time
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(__file__))
+
+import cache
+from cache import ResultCache, make_cache_key
+
+
+def result(n=10):
+    return {'velocity_factor': np.float64(0.66), 'waveform': {'time': np.arange(n) * 1e-9}}
+
+
+def test_lru_evicts_by_entries_and_bytes():
+    results = ResultCache(max_entries=2)
+    for key in 'abc':
+        results.put(key, result())
+        if key == 'b':
+            results.get('a')  # 'a' pasa a ser la más reciente
+    assert results.get('b') is None and results.get('a') is not None and results.get('c') is not None
+
+    size = len(pickle.dumps(result(1000), protocol=pickle.HIGHEST_PROTOCOL))
+    results = ResultCache(max_bytes=int(2.5 * size))
+    for key in 'abc':
+        results.put(key, result(1000))
+    stats = results.snapshot()
+    assert stats['entries'] == 2 and stats['bytes'] <= results.max_bytes and stats['evictions'] == 1
+
+    # Un resultado mayor que el límite no se guarda en memoria
+    results.put('d', result(10_000))
+    assert results.get('d') is None
+
+
+def test_ttl_expires_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, 'time', lambda: now[0])
+    results = ResultCache(ttl=60)
+    results.put('a', result())
+    now[0] += 59
+    assert results.get('a') is not None
+    now[0] += 61
+    assert results.get('a') is None and results.snapshot()['entries'] == 0
+
+
+def test_disk_tier_survives_restarts(tmp_path):
+    disk_dir = str(tmp_path / 'cache')
+    ResultCache(disk_dir=disk_dir).put('a' * 64, result())
+    assert os.listdir(disk_dir) == [f"v{cache.ANALYSIS_VERSION}-{'a' * 64}.pkl"]
+
+    restarted = ResultCache(disk_dir=disk_dir)
+    value = restarted.get('a' * 64)
+    np.testing.assert_array_equal(value['waveform']['time'], result()['waveform']['time'])
+    assert restarted.snapshot()['disk_hits'] == 1
+    assert restarted.get('a' * 64) is not None and restarted.snapshot()['hits'] == 1
+
+    # Un archivo corrupto o a medias es un fallo de caché, no un error
+    with open(restarted._disk_path('b' * 64), 'wb') as f:
+        f.write(b'\x80\x05truncated')
+    assert restarted.get('b' * 64) is None and restarted.snapshot()['misses'] == 1
+
+
+def test_key_depends_on_content_parameters_and_version(monkeypatch):
+    key = make_cache_key('digest', cable_length=10.0, z0_expected=50.0)
+    assert key == make_cache_key('digest', z0_expected=50.0, cable_length=10.0)
+    assert key != make_cache_key('other', cable_length=10.0, z0_expected=50.0)
+    assert key != make_cache_key('digest', cable_length=10.5, z0_expected=50.0)
+
+    monkeypatch.setattr(cache, 'ANALYSIS_VERSION', cache.ANALYSIS_VERSION + 1)
+    assert key != make_cache_key('digest', cable_length=10.0, z0_expected=50.0)
+
+
+def test_disk_sweep_drops_expired_stale_and_oldest_files(tmp_path, monkeypatch):
+    disk_dir = tmp_path / 'cache'
+    size = len(pickle.dumps(result(1000), protocol=pickle.HIGHEST_PROTOCOL))
+    results = ResultCache(disk_dir=str(disk_dir), ttl=60, disk_max_bytes=int(2.5 * size))
+    results.put('old', result(1000))
+    os.utime(results._disk_path('old'), (0, 0))
+    (disk_dir / 'unversioned.pkl').write_bytes(b'')  # formato anterior a la versión en el nombre
+
+    monkeypatch.setattr(cache, 'ANALYSIS_VERSION', cache.ANALYSIS_VERSION - 1)
+    results.put('stale', result(1000))
+    monkeypatch.undo()
+
+    now = time.time()
+    for i, key in enumerate('abc'):
+        results.put(key, result(1000))
+        os.utime(results._disk_path(key), (now - 30 + i, now - 30 + i))
+    results.cleanup_disk()
+    assert sorted(os.listdir(disk_dir)) == [os.path.basename(results._disk_path(key)) for key in 'bc']
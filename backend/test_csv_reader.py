@@ -0,0 +1,98 @@
+"""
+Lector por bloques del CSV del Siglent: arreglos preasignados según el
+"Record Length", crecimiento si la cabecera se queda corta, varios canales y
+filas no numéricas.
+"""
+import io
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(__file__))
+
+import main
+
+
+def siglent_csv(time, voltages, record_length, offsets=(0.0, 0.0), units_row=True, rows=None):
+    channels = [f"CH{i + 1}" for i in range(len(voltages))]
+
+    def per_channel(values):
+        return ' '.join(f"{ch}:{value}" for ch, value in zip(channels, values))
+
+    header = (
+        f"Record Length,Analog:{record_length}\n"
+        f"Sample Interval,{per_channel([1e-9] * len(channels))}\n"
+        "Vertical Units,CH1:V\n"
+        f"Vertical Scale,{per_channel([1.0, 0.5])}\n"
+        f"Vertical Offset,{per_channel(offsets)}\n"
+        "Horizontal Units,us\n"
+        "Horizontal Scale,0.1\n"
+        "Model Number,SDS1104X-E\n"
+        "Serial Number,TEST\n"
+        "Software Version,1\n"
+        f"Source,{','.join(channels)}\n"
+    )
+    body = io.StringIO()
+    if units_row:
+        body.write("Second," + ','.join('Volt' for _ in channels) + "\n")
+    np.savetxt(body, np.column_stack((time, *voltages)), fmt='%.9e', delimiter=',')
+    lines = body.getvalue().splitlines(keepends=True)
+    for index, line in (rows or {}).items():
+        lines[index] = line
+    return (header + ''.join(lines)).encode()
+
+
+class Upload:
+    def __init__(self, content):
+        self.filename = 'capture.csv'
+        self.file = io.BytesIO(content)
+
+
+@pytest.fixture
+def trace():
+    time = np.arange(1000) * 1e-9
+    return time, np.vstack((np.sin(time * 1e7), np.cos(time * 1e7)))
+
+
+@pytest.mark.parametrize('record_length', [1000, 10, 5000, 0])
+@pytest.mark.parametrize('units_row', [True, False])
+def test_chunks_fill_preallocated_arrays(monkeypatch, trace, record_length, units_row):
+    # Bloques pequeños: el cuerpo se reparte entre muchos bloques y, si la
+    # cabecera subestima las filas, los arreglos crecen a mitad de lectura
+    monkeypatch.setattr(main, 'CSV_CHUNK_ROWS', 7)
+    time, voltages = trace
+    content = siglent_csv(time, voltages, record_length, units_row=units_row)
+
+    parsed_time, parsed, config = main._read_csv(Upload(content))
+    np.testing.assert_allclose(parsed_time, time, rtol=1e-8)
+    np.testing.assert_allclose(parsed, voltages, rtol=1e-8, atol=1e-12)
+    assert config['channels'] == ['CH1', 'CH2'] and config['model_number'] == 'SDS1104X-E'
+
+
+def test_channels_keep_their_own_offsets(trace):
+    time, voltages = trace
+    content = siglent_csv(time, voltages, len(time), offsets=(0.25, -0.5))
+
+    _, single, config = main.process_csv_file(Upload(content), smooth=False)
+    np.testing.assert_allclose(single, voltages[0] + 0.25, atol=1e-8)
+    assert config['channel_config']['CH2'] == {'sample_interval': 1e-9, 'vertical_scale': 0.5,
+                                               'vertical_offset': -0.5}
+
+    _, both, _ = main.process_csv_channels(Upload(content))
+    assert both.shape == (2, len(time))
+
+
+def test_non_numeric_rows(trace):
+    time, voltages = trace
+    content = siglent_csv(time, voltages, len(time), rows={100: "garbage,row,here\n", 500: ",,\n"})
+    parsed_time, parsed, _ = main.process_csv_file(Upload(content), smooth=False)
+    assert len(parsed_time) == len(time) - 2 and not np.isnan(parsed).any()
+
+    rows = {i: "n/a,n/a,n/a\n" for i in range(1, 400)}
+    with pytest.raises(ValueError, match='Too many invalid values'):
+        main.process_csv_file(Upload(siglent_csv(time, voltages, len(time), rows=rows)), smooth=False)
+
+    with pytest.raises(ValueError, match='CSV'):
+        main.process_csv_file(Upload(siglent_csv(time[:0], voltages[:, :0], 0)), smooth=False)
@@ -0,0 +1,77 @@
+"""
+Decimación de la forma de onda: LTTB estándar, min/max por bucket e índices
+forzados alrededor de los eventos.
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(__file__))
+
+from decimation import decimate, decimate_indices, lttb_indices, minmax_indices
+
+
+def reference_lttb(time, values, threshold):
+    """LTTB de Steinarsson (2013), punto a punto."""
+    n = len(values)
+    every = (n - 2) / (threshold - 2)
+    selected, a = [0], 0
+    for i in range(threshold - 2):
+        avg_start, avg_end = int(np.floor((i + 1) * every)) + 1, min(int(np.floor((i + 2) * every)) + 1, n)
+        avg_t, avg_v = time[avg_start:avg_end].mean(), values[avg_start:avg_end].mean()
+        start, stop = int(np.floor(i * every)) + 1, int(np.floor((i + 1) * every)) + 1
+        area = np.abs((time[a] - avg_t) * (values[start:stop] - values[a])
+                      - (time[a] - time[start:stop]) * (avg_v - values[a]))
+        a = start + int(np.argmax(area))
+        selected.append(a)
+    return np.array(selected + [n - 1])
+
+
+@pytest.mark.parametrize('n, max_points', [(1000, 100), (1001, 3), (14_000, 1400), (1400, 1000), (10, 9)])
+def test_lttb_matches_reference_and_returns_max_points(n, max_points):
+    rng = np.random.default_rng(n)
+    time = np.sort(rng.uniform(0, 1, n))
+    values = np.cumsum(rng.normal(size=n))
+
+    indices = lttb_indices(time, values, max_points)
+    assert len(indices) == max_points
+    np.testing.assert_array_equal(indices, reference_lttb(time, values, max_points))
+
+
+def test_minmax_keeps_spikes_and_the_point_budget():
+    values = np.sin(np.linspace(0, 20, 10_000))
+    values[1234], values[8765] = 5.0, -5.0
+    indices = minmax_indices(values, 200)
+    assert len(indices) == 200 and np.all(np.diff(indices) > 0)
+    assert {1234, 8765} <= set(indices.tolist())
+    assert values[indices].max() == 5.0 and values[indices].min() == -5.0
+
+
+def test_events_are_kept_and_short_traces_untouched():
+    time = np.arange(5000) * 1e-9
+    values = np.where(time > 2.5e-6, 1.0, 0.0) + 1e-3 * np.sin(time * 1e7)
+    event = time[1234]
+    for method in ('lttb', 'minmax'):
+        indices = decimate_indices(time, values, 100, method, keep_times=[event, None])
+        assert {1233, 1234, 1235} <= set(indices.tolist()) and len(indices) <= 100
+
+    t, v = decimate(time[:50], values[:50], 100)
+    assert len(t) == 50
+    with pytest.raises(ValueError):
+        decimate(time, values, 100, 'every_nth')
+
+
+@pytest.mark.parametrize('method', ['lttb', 'minmax'])
+def test_anchors_count_inside_the_budget(method):
+    time = np.arange(10_000) * 1e-9
+    values = np.sin(time * 1e7)
+    events = time[[100, 2000, 5000, 9000]]
+    indices = decimate_indices(time, values, 20, method, keep_times=events)
+    assert len(indices) <= 20
+    assert {99, 100, 101, 8999, 9000, 9001} <= set(indices.tolist())
+
+    # Sin lugar para los vecinos de todos los eventos quedan los centros
+    indices = decimate_indices(time, values, 8, method, keep_times=events)
+    assert len(indices) <= 8 and {100, 2000, 5000, 9000} <= set(indices.tolist())
@@ -0,0 +1,128 @@
+"""
+Regresión de detect_pulse_events: la versión vectorizada debe producir los
+mismos eventos que la implementación original con bucle por muestra.
+"""
+import glob
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(__file__))
+
+from main import (LocalUpload, analyze_impedance_channels, analyze_impedance_reflection,
+                  detect_channel_events, detect_pulse_events, process_csv_file)
+
+CSV_ROOT = os.path.join(os.path.dirname(__file__), '..', 'Csv')
+CAPTURES = sorted(glob.glob(os.path.join(CSV_ROOT, 'taller*', '**', '*.csv'), recursive=True))
+EVENT_KEYS = ('t0', 'plateau_start', 'plateau_end', 'reflection_start')
+
+
+def reference_detect_pulse_events(time, voltage):
+    """Implementación original (bucle en Python), usada como referencia."""
+    v_max = np.max(voltage)
+    t0 = time[np.where(voltage > 0.1 * v_max)[0][0]]
+    t_90 = time[np.where(voltage >= 0.9 * v_max)[0][0]]
+
+    dv_dt = np.gradient(voltage, time)
+    plateau_mask = np.abs(dv_dt) < (v_max / len(time)) * 0.01
+
+    plateau_segments = []
+    in_plateau = False
+    start_idx = 0
+    for i in range(len(plateau_mask)):
+        if plateau_mask[i] and not in_plateau:
+            in_plateau = True
+            start_idx = i
+        elif not plateau_mask[i] and in_plateau:
+            in_plateau = False
+            duration = time[i-1] - time[start_idx]
+            if duration >= 20e-9:
+                plateau_segments.append((start_idx, i-1, duration))
+
+    plateau_start = plateau_end = None
+    valid_plateaus = [p for p in plateau_segments if time[p[0]] > t_90]
+    if valid_plateaus:
+        best_plateau = max(valid_plateaus, key=lambda x: x[2])
+        plateau_start = time[best_plateau[0]]
+        plateau_end = time[best_plateau[1]]
+
+    reflection_start = None
+    if plateau_end:
+        post_plateau = voltage[time > plateau_end]
+        time_post = time[time > plateau_end]
+        if len(post_plateau) > 10:
+            dv_dt_post = np.abs(np.gradient(post_plateau, time_post))
+            reflection_idx = np.where(dv_dt_post > np.max(dv_dt_post) * 0.5)[0]
+            if len(reflection_idx) > 0:
+                reflection_start = time_post[reflection_idx[0]]
+
+    return {'t0': t0, 'plateau_start': plateau_start, 'plateau_end': plateau_end,
+            'reflection_start': reflection_start}
+
+
+def synthetic_trace(reflection: float, n: int = 4000, dt: float = 1e-9, seed: int = 0):
+    """Escalón TDR con meseta exacta y una reflexión (abierto > 0, corto < 0)."""
+    rng = np.random.default_rng(seed)
+    time = np.arange(n) * dt
+    voltage = np.zeros(n)
+    voltage[200:] = 1.0
+    voltage[2500:] = 1.0 + reflection
+    voltage[:150] += rng.normal(0, 1e-3, 150)
+    voltage[3000:] += rng.normal(0, 1e-3, n - 3000)
+    return time, voltage
+
+
+def assert_same_events(time, voltage):
+    expected = reference_detect_pulse_events(time, voltage)
+    events = detect_pulse_events(time, voltage, {})
+    for key in EVENT_KEYS:
+        assert events[key] == expected[key], key
+
+
+@pytest.mark.parametrize('path', CAPTURES, ids=lambda p: os.path.relpath(p, CSV_ROOT))
+def test_events_match_reference_on_captures(path):
+    upload = LocalUpload(path, os.path.basename(path))
+    try:
+        time, voltage, _ = process_csv_file(upload)
+    except ValueError as e:
+        pytest.skip(f"captura no soportada por el parser: {e}")
+    finally:
+        upload.close()
+
+    assert_same_events(time, voltage)
+
+
+@pytest.mark.parametrize('reflection', [0.8, -0.9, 0.0])
+def test_events_match_reference_on_synthetic_steps(reflection):
+    time, voltage = synthetic_trace(reflection)
+    assert_same_events(time, voltage)
+
+
+def test_plateau_and_reflection_detected_on_synthetic_step():
+    time, voltage = synthetic_trace(0.8)
+    events = detect_pulse_events(time, voltage, {})
+    assert events['plateau_start'] is not None
+    assert events['plateau_end'] < events['reflection_start']
+
+
+def test_channel_events_match_single_channel_detection():
+    time, open_end = synthetic_trace(0.8, seed=1)
+    _, short_end = synthetic_trace(-0.9, seed=2)
+    voltages = np.vstack((open_end, short_end, np.zeros_like(time)))
+
+    events_list = detect_channel_events(time, voltages)
+    assert events_list[2] is None
+    for voltage, events in zip(voltages[:2], events_list[:2]):
+        expected = detect_pulse_events(time, voltage, {})
+        for key in EVENT_KEYS:
+            assert events[key] == expected[key], key
+
+    dts = np.array([e['plateau_end'] - e['t0'] for e in events_list[:2]])
+    impedance = analyze_impedance_channels(voltages[:2], time, events_list[:2], dts, 50.0)
+    for row in range(2):
+        single = analyze_impedance_reflection(voltages[row], time, events_list[row], {'dt': dts[row]}, 50.0)
+        assert single['vi'] == pytest.approx(impedance['vi'][row])
+        assert single['reflection_coefficient'] == pytest.approx(impedance['reflection_coefficient'][row])
+        assert single['load_type'] == impedance['load_type'][row]
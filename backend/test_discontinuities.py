@@ -0,0 +1,116 @@
+"""
+Localización de discontinuidades y tabla de impedancias por tramo.
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+from scipy.special import erf
+
+sys.path.append(os.path.dirname(__file__))
+
+import main
+from benchmark import (CABLE_LENGTH, ROUND_TRIP, STEP_VOLTAGE, VERTICAL_SCALE, WINDOW, synthetic_step,
+                       write_siglent_csv)
+from discontinuities import find_discontinuities
+from uncertainty import quantization_step
+
+VP = 2e8
+Z0 = 50.0
+T0 = 50e-9
+RISE = 2e-9
+
+
+def step(time, center):
+    return 0.5 * (1 + erf((time - center) / RISE))
+
+
+def line_with_mismatch(noise=0.002, points=20_000, seed=0):
+    """
+    Línea de 50 Ω con un tramo de 75 Ω entre 10 m y 12 m, abierta a 30 m,
+    suavizada como en el pipeline.
+    """
+    time = np.linspace(0, 600e-9, points)
+    gamma = (75 - 50) / (75 + 50)
+    voltage = (step(time, T0)
+               + gamma * step(time, T0 + 2 * 10 / VP)
+               - gamma * step(time, T0 + 2 * 12 / VP)
+               + step(time, T0 + 2 * 30 / VP))
+    voltage += np.random.default_rng(seed).normal(0, noise, points)
+    return time, main.smooth_voltage(voltage)
+
+
+def test_locates_every_discontinuity():
+    time, voltage = line_with_mismatch()
+    result = find_discontinuities(time, voltage, T0, VP, Z0)
+
+    distances = [event['distance'] for event in result['events']]
+    assert distances == pytest.approx([10.0, 12.0, 30.0], abs=0.1)
+    impedances = [segment['impedance'] for segment in result['segments']]
+    assert impedances[:3] == pytest.approx([50.0, 75.0, 50.0], rel=0.02)
+    # Abierto: ρ recortado en RHO_LIMIT
+    assert impedances[3] > 10 * Z0
+    assert result['segments'][0]['start'] == 0.0
+    assert result['segments'][-1]['start'] == pytest.approx(30.0, abs=0.1)
+    assert result['events'][0]['reflection_coefficient'] == pytest.approx(0.2, abs=0.01)
+
+
+def test_flat_line_has_no_discontinuities():
+    time = np.linspace(0, 600e-9, 20_000)
+    voltage = step(time, T0) + np.random.default_rng(1).normal(0, 0.002, len(time))
+    result = find_discontinuities(time, main.smooth_voltage(voltage), T0, VP, Z0)
+
+    assert result['events'] == []
+    assert len(result['segments']) == 1
+    assert result['segments'][0]['impedance'] == pytest.approx(Z0, rel=0.01)
+
+
+def test_without_velocity_returns_empty_table():
+    time, voltage = line_with_mismatch()
+    assert find_discontinuities(time, voltage, T0, 0.0, Z0)['events'] == []
+
+
+def two_splices(points, noise=0.005, seed=0):
+    """
+    Traza del benchmark con un tramo de 75 Ω entre 10 m y 15 m de una línea
+    abierta a CABLE_LENGTH, con los mismos frentes y cuantización.
+    """
+    sample_interval = WINDOW / points
+    time = np.arange(points) * sample_interval
+    t0 = 0.1 * WINDOW
+    scale = 5e-9 / 4
+
+    def edge(delay):
+        return 1 / (1 + np.exp(-(time - t0 - delay) / scale))
+
+    gamma = (75 - 50) / (75 + 50)
+    splice = ROUND_TRIP / CABLE_LENGTH
+    voltage = edge(0) + gamma * edge(10 * splice) - gamma * (1 - gamma ** 2) * edge(15 * splice) + edge(ROUND_TRIP)
+    voltage = STEP_VOLTAGE * (voltage + np.random.default_rng(seed).normal(0, noise / STEP_VOLTAGE, points))
+    code = quantization_step({'vertical_scale': VERTICAL_SCALE})
+    return time, np.round(voltage / code) * code, sample_interval
+
+
+@pytest.mark.parametrize('points', [1400, 14_000])
+@pytest.mark.parametrize('load, distances, impedances', [
+    ('open', [30.0], [50.0, None]),
+    ('short', [30.0], [50.0, 0.0]),
+    ('splices', [10.0, 15.0, 30.0], [50.0, 75.0, 50.0, None]),
+])
+def test_pipeline_reports_each_edge_once(tmp_path, points, load, distances, impedances):
+    path = str(tmp_path / 'capture.csv')
+    trace = two_splices(points) if load == 'splices' else synthetic_step(points, load, 0.005)
+    write_siglent_csv(path, *trace)
+    # xcorr mide Δt sobre la traza, de modo que vp y las distancias son reales
+    result = main.analyze_tdr_path(path, 'capture.csv', CABLE_LENGTH, Z0, plot='none',
+                                   dt_method='xcorr')['discontinuities']
+
+    assert [event['distance'] for event in result['events']] == pytest.approx(distances, abs=0.3)
+    segments = [segment['impedance'] for segment in result['segments']]
+    assert len(segments) == len(impedances)
+    for measured, expected in zip(segments, impedances):
+        if expected is None:
+            assert measured > 100 * Z0  # Abierto
+        else:
+            assert measured == pytest.approx(expected, abs=1.5)
@@ -0,0 +1,65 @@
+"""
+Análisis en frecuencia sobre líneas sintéticas: una línea sin pérdidas y una
+con pérdidas por efecto pelicular (α ∝ √f) de parámetros conocidos.
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(__file__))
+
+from frequency import frequency_domain_analysis
+
+SAMPLE_INTERVAL = 0.2e-9
+N = 8192
+T0 = 200e-9
+DELAY = 101.3e-9
+LENGTH = 10.0
+
+
+def synthetic_line(reflection: float, skin_loss: float = 0.0):
+    """
+    Escalón gaussiano (σ = 1 ns) más su reflexión tras DELAY, atenuada por
+    exp(-2 α(f) L) con α(f) = skin_loss · √(f / 1 GHz) en Np/m.
+    """
+    time = np.arange(N) * SAMPLE_INTERVAL
+    freq = np.fft.rfftfreq(N, SAMPLE_INTERVAL)
+    alpha = skin_loss * np.sqrt(freq / 1e9)
+    edge = np.exp(-(np.pi * freq * 1e-9) ** 2 / 2 - 2j * np.pi * freq * T0)
+    reflected = reflection * edge * np.exp(-2 * alpha * LENGTH - 2j * np.pi * freq * DELAY)
+    derivative = np.fft.irfft(edge + reflected, N)
+    return time, np.cumsum(derivative), freq, alpha
+
+
+@pytest.mark.parametrize('reflection', [0.9, -0.9, 0.5])
+def test_lossless_line(reflection):
+    time, voltage, _, _ = synthetic_line(reflection)
+    result = frequency_domain_analysis(time, voltage, T0, 1.0, DELAY, LENGTH, 50.0)
+
+    freq = np.array(result['frequency'])
+    assert len(freq) > 10
+    assert np.allclose(result['s11_magnitude_db'], 20 * np.log10(abs(reflection)), atol=0.05)
+    assert np.allclose(result['alpha'], 0.0, atol=1e-3)
+    assert np.allclose(result['beta'], 2 * np.pi * freq * DELAY / (2 * LENGTH), rtol=1e-3, atol=1e-3)
+
+
+def test_skin_effect_attenuation_is_recovered():
+    time, voltage, freq, alpha = synthetic_line(-1.0, skin_loss=0.02)
+    result = frequency_domain_analysis(time, voltage, T0, 1.0, DELAY, LENGTH, 50.0)
+
+    expected = np.interp(result['frequency'], freq, alpha)
+    assert np.allclose(result['alpha'], expected, atol=2e-3)
+    assert result['alpha'][-1] > result['alpha'][1] > 0
+
+
+def test_impedance_profile_steps_to_load():
+    time, voltage, _, _ = synthetic_line(0.5)
+    result = frequency_domain_analysis(time, voltage, T0, 1.0, DELAY, LENGTH, 50.0)
+
+    distance = np.array(result['distance'])
+    impedance = np.array(result['impedance'])
+    assert distance[-1] == pytest.approx(1.5 * LENGTH, rel=0.01)
+    assert np.median(impedance[(distance > 0.2 * LENGTH) & (distance < 0.8 * LENGTH)]) == pytest.approx(50.0, rel=0.01)
+    assert np.median(impedance[distance > 1.2 * LENGTH]) == pytest.approx(150.0, rel=0.01)
@@ -0,0 +1,157 @@
+"""
+Trabajos asíncronos: cola persistente en SQLite, progreso por etapa,
+cancelación, resultado y limpieza por TTL.
+"""
+import os
+import sys
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.dirname(__file__))
+
+import main
+from benchmark import synthetic_step, write_siglent_csv
+from jobs import JobStore
+
+
+@pytest.fixture
+def job_store(tmp_path, monkeypatch):
+    store = JobStore(str(tmp_path / 'jobs'), ttl=60.0)
+    monkeypatch.setattr(main, 'job_store', store)
+    return store
+
+
+@pytest.fixture
+def capture(tmp_path):
+    path = str(tmp_path / 'capture.csv')
+    write_siglent_csv(path, *synthetic_step(1400, 'short', 0.005))
+    return path
+
+
+def submit(store, capture, tmp_path, **params):
+    # create mueve el archivo: se encola una copia
+    source = str(tmp_path / 'upload.csv')
+    with open(capture, 'rb') as src, open(source, 'wb') as dst:
+        dst.write(src.read())
+    params = dict({'cable_length': 10.0, 'z0_expected': 50.0, 'plot': 'none'}, **params)
+    return store.create('capture.csv', 'ab' * 32, source, params, main.pipeline_stages(**params))
+
+
+def test_queue_lifecycle_and_ttl(job_store, capture, tmp_path):
+    first = submit(job_store, capture, tmp_path)
+    second = submit(job_store, capture, tmp_path)
+    assert job_store.get(first)['status'] == 'queued'
+
+    assert job_store.claim('a')['id'] == first
+    assert job_store.progress(first, 'parse', 'a') is False
+    job = job_store.get(first)
+    assert job['progress']['completed'] == ['parse']
+    assert job['progress']['current'] == 'filter'
+
+    # El proceso que lo ejecutaba se detuvo: vuelve a la cola al vencer el arriendo
+    assert job_store.requeue_expired(now=time.time() + job_store.lease + 1) == 1
+    assert job_store.get(first)['status'] == 'queued'
+    assert job_store.get(first)['progress']['completed'] == []
+
+    assert job_store.cancel(second)['status'] == 'cancelled'
+    assert job_store.claim('a')['id'] == first
+    assert job_store.claim('a') is None
+    job_store.finish(first, {'alpha': 0.0})
+    assert job_store.get(first)['progress']['fraction'] == 1.0
+    assert job_store.load_result(first) == {'alpha': 0.0}
+
+    assert job_store.purge_expired() == 0
+    assert job_store.purge_expired(now=time.time() + 120) == 2
+    with pytest.raises(KeyError):
+        job_store.get(first)
+    assert not os.path.exists(job_store.job_dir(first))
+
+
+def test_only_expired_leases_are_requeued(job_store, capture, tmp_path):
+    first = submit(job_store, capture, tmp_path)
+    second = submit(job_store, capture, tmp_path)
+    job_store.claim('a')
+    job_store.claim('b')
+
+    # Un proceso nuevo no reinicia los trabajos de sus hermanos vivos
+    later = time.time() + job_store.lease - 1
+    assert job_store.requeue_expired(now=later) == 0
+    assert job_store.heartbeat('a') == 1
+
+    # Solo vence el arriendo de 'b', que dejó de renovarlo
+    with job_store._connect() as db:
+        db.execute("UPDATE jobs SET heartbeat = heartbeat - ? WHERE owner = 'b'", (job_store.lease,))
+    assert job_store.requeue_expired(now=later) == 1
+    assert job_store.get(first)['status'] == 'running'
+    assert job_store.get(second)['status'] == 'queued'
+
+    # Otro despachador lo toma; el worker anterior se detiene y no lo termina
+    assert job_store.claim('c')['id'] == second
+    assert job_store.progress(second, 'parse', 'b') is True
+    job_store.fail(second, 'stale', 'b')
+    job_store.finish(second, {'stale': True}, 'b')
+    assert job_store.get(second)['status'] == 'running'
+    job_store.finish(second, {'alpha': None}, 'c')
+    assert job_store.load_result(second) == {'alpha': None}
+    assert 'owner' not in job_store.get(second)
+
+
+def test_worker_reports_stages_and_stops_when_cancelled(job_store, capture, tmp_path):
+    job_id = submit(job_store, capture, tmp_path, frequency=True)
+    job_store.claim('a')
+    main.run_analysis_job(job_id, 'a')
+    job = job_store.get(job_id)
+    assert job['status'] == 'done'
+    assert job['progress']['completed'] == job['progress']['stages']
+    assert 'frequency' in job['progress']['stages']
+    assert job_store.load_result(job_id)['frequency'] is not None
+
+    job_id = submit(job_store, capture, tmp_path)
+    job_store.claim('a')
+    job_store.cancel(job_id)
+    main.run_analysis_job(job_id, 'a')
+    job = job_store.get(job_id)
+    assert job['status'] == 'cancelled'
+    # Se detiene al terminar la primera etapa
+    assert job['progress']['completed'] == ['parse']
+
+
+def test_jobs_endpoints(job_store, capture):
+    with TestClient(main.app) as client:
+        with open(capture, 'rb') as f:
+            response = client.post('/jobs', files={'file': ('capture.csv', f, 'text/csv')},
+                                   data={'cable_length': '10', 'plot': 'none'})
+        assert response.status_code == 202
+        job_id = response.json()['id']
+
+        deadline = time.time() + 60
+        while client.get(f'/jobs/{job_id}').json()['status'] in ('queued', 'running'):
+            assert time.time() < deadline
+            time.sleep(0.05)
+        job = client.get(f'/jobs/{job_id}').json()
+        assert job['status'] == 'done', job['error']
+        assert job['progress']['fraction'] == 1.0
+
+        result = client.get(f'/jobs/{job_id}/result').json()
+        with open(capture, 'rb') as f:
+            direct = client.post('/analyze-tdr', files={'file': ('capture.csv', f, 'text/csv')},
+                                 data={'cable_length': '10', 'plot': 'none'}).json()
+        assert result['velocity_factor'] == direct['velocity_factor']
+        assert result['waveform'] == direct['waveform']
+
+        assert client.get('/jobs/0123abcd').status_code == 404
+        assert client.get('/jobs/not-an-id/result').status_code == 404
+
+
+def test_unfinished_job_result_conflicts(job_store, capture, monkeypatch):
+    # Sin despachador el trabajo queda en cola
+    monkeypatch.setattr(main, 'JOB_WORKERS', 0)
+    with TestClient(main.app) as client:
+        with open(capture, 'rb') as f:
+            job_id = client.post('/jobs', files={'file': ('capture.csv', f, 'text/csv')},
+                                 data={'cable_length': '10'}).json()['id']
+        assert client.get(f'/jobs/{job_id}/result').status_code == 409
+        assert client.delete(f'/jobs/{job_id}').json()['status'] == 'cancelled'
+        assert client.get(f'/jobs/{job_id}/result').json()['detail'] == 'Job is cancelled'
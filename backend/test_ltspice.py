@@ -0,0 +1,72 @@
+"""
+Importador de barridos AC de LTspice: formato polar (dB/°) del taller 2 y
+variantes cartesiana y UTF-16.
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(__file__))
+
+from ltspice import parse_ltspice_ac
+
+TALLER_2 = os.path.join(os.path.dirname(__file__), '..', 'Csv', 'taller 2', 'circuito_linea.txt')
+
+
+def export(rows, header='Freq.\tV(out)', polar=True, encoding='latin-1'):
+    """Texto exportado por LTspice para una lista de (f, valor complejo)."""
+    lines = [header]
+    for freq, value in rows:
+        if polar:
+            lines.append(f"{freq:.14e}\t({20 * np.log10(abs(value)):.14e}dB,{np.angle(value, deg=True):.14e}°)")
+        else:
+            lines.append(f"{freq:.14e}\t{value.real:.14e},{value.imag:.14e}")
+    return ('\n'.join(lines) + '\n').encode(encoding)
+
+
+def test_parses_taller_2_export():
+    with open(TALLER_2, 'rb') as f:
+        freq, traces, fmt = parse_ltspice_ac(f.read())
+
+    assert fmt == 'polar'
+    assert list(traces) == ['V(a)-V(b)']
+    assert len(freq) == 700
+    assert freq[0] == 5e6 and freq[-1] == 25e6
+    first = traces['V(a)-V(b)'][0]
+    assert 20 * np.log10(abs(first)) == pytest.approx(-26.0268347846104)
+    assert np.angle(first, deg=True) == pytest.approx(-9.63607332947384)
+
+
+@pytest.mark.parametrize('polar', [True, False])
+@pytest.mark.parametrize('encoding', ['latin-1', 'utf-8', 'utf-16'])
+def test_round_trips_polar_and_cartesian(polar, encoding):
+    freq = np.logspace(3, 9, 200)
+    values = 0.5 * np.exp(-1j * freq / 1e8)
+    parsed_freq, traces, fmt = parse_ltspice_ac(export(zip(freq, values), polar=polar, encoding=encoding))
+
+    assert fmt == ('polar' if polar else 'cartesian')
+    np.testing.assert_allclose(parsed_freq, freq)
+    np.testing.assert_allclose(traces['V(out)'], values, atol=1e-12)
+
+
+def test_multiple_traces():
+    data = (b"Freq.\tV(a)\tI(R1)\n"
+            b"1.0e+03\t(0.0e+00dB,9.0e+01\xb0)\t(-2.0e+01dB,0.0e+00\xb0)\n"
+            b"2.0e+03\t(-6.0e+00dB,4.5e+01\xb0)\t(-4.0e+01dB,-1.8e+02\xb0)\n")
+    freq, traces, _ = parse_ltspice_ac(data)
+
+    assert list(traces) == ['V(a)', 'I(R1)']
+    np.testing.assert_allclose(traces['V(a)'][0], 1j, atol=1e-12)
+    np.testing.assert_allclose(abs(traces['I(R1)']), [0.1, 0.01])
+
+
+@pytest.mark.parametrize('data', [
+    b"time\tV(out)\n0\t1\n",
+    b"Freq.\tV(a)\tV(b)\n1.0e+03\t(0.0e+00dB,9.0e+01\xb0)\n",
+    b"Step Information: R=1k\nFreq.\tV(a)\n",
+])
+def test_rejects_unsupported_exports(data):
+    with pytest.raises(ValueError):
+        parse_ltspice_ac(data)
@@ -0,0 +1,113 @@
+"""
+Instrumentación: etapas por petición, exposición Prometheus, cabecera
+Server-Timing y logs estructurados.
+"""
+import json
+import logging
+import os
+import sys
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.dirname(__file__))
+
+import metrics
+from metrics import (Counter, Histogram, MetricsMiddleware, collect_stages, log_event, record_stage,
+                     server_timing, stage)
+
+
+def work(n):
+    with stage('detect', n):
+        pass
+    with stage('detect', n):
+        pass
+    return n * 2
+
+
+def test_collect_stages_returns_worker_timings():
+    result, timings = collect_stages(work, 10)
+    assert result == 20
+    assert [(name, samples) for name, _, samples in timings] == [('detect', 10), ('detect', 10)]
+
+    header = server_timing(timings, 0.5)
+    assert header.startswith('detect;dur=') and header.endswith('total;dur=500.000')
+    assert header.count('detect') == 1  # repeticiones de una etapa se suman
+
+
+def test_histogram_and_counter_exposition():
+    histogram = Histogram('test_seconds', 'Test.', ['stage'], buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value, 'parse')
+    counter = Counter('test_total', 'Test.', ['status'])
+    counter.inc('200')
+    counter.inc('200')
+
+    lines = histogram.expose() + counter.expose()
+    assert 'test_seconds_bucket{stage="parse",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{stage="parse",le="1"} 2' in lines
+    assert 'test_seconds_bucket{stage="parse",le="+Inf"} 3' in lines
+    assert 'test_seconds_count{stage="parse"} 3' in lines
+    assert 'test_total{status="200"} 2' in lines
+
+
+def make_app():
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware, server_timing_header=True)
+
+    @app.get('/measured')
+    def measured():
+        record_stage('parse', 0.002, 700)
+        with stage('plot'):
+            pass
+        return {'ok': True}
+
+    return app
+
+
+def test_middleware_records_request_stages():
+    before = metrics.STAGE_SECONDS.count('parse')
+    requests_before = metrics.REQUESTS.value('measured', '200')
+
+    with TestClient(make_app()) as client:
+        response = client.get('/measured')
+
+    timing = response.headers['server-timing']
+    assert 'parse;dur=2.000' in timing and 'plot;dur=' in timing and 'total;dur=' in timing
+    assert metrics.STAGE_SECONDS.count('parse') == before + 1
+    assert metrics.REQUESTS.value('measured', '200') == requests_before + 1
+
+
+def test_structured_logs_only_when_enabled():
+    calls, records = [], []
+
+    class Expensive:
+        def __str__(self):
+            calls.append(1)
+            return 'expensive'
+
+    class Collect(logging.Handler):
+        def emit(self, record):
+            records.append(record)
+
+    handler = Collect()
+    level = metrics.logger.level
+    metrics.logger.addHandler(handler)
+    metrics.logger.setLevel(logging.WARNING)
+    try:
+        log_event(logging.DEBUG, 'skipped', value=Expensive())
+        log_event(logging.WARNING, 'kept', points=700)
+    finally:
+        metrics.logger.removeHandler(handler)
+        metrics.logger.setLevel(level)
+
+    assert [r.getMessage() for r in records] == ['kept']
+    assert not calls
+    entry = json.loads(metrics.JsonFormatter().format(records[0]))
+    assert entry['event'] == 'kept' and entry['points'] == 700 and entry['level'] == 'warning'
+
+
+def test_stage_is_free_when_disabled(monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_ENABLED', False)
+    _, timings = collect_stages(work, 5)
+    assert timings == []
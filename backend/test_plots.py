@@ -0,0 +1,74 @@
+"""
+Gráficas diferidas: PNG renderizados una vez a partir de los puntos
+guardados, expiración y respuestas cacheables de /plots/{id}.png.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.dirname(__file__))
+
+import main
+from benchmark import write_siglent_csv
+from plots import PlotStore
+from test_discontinuities import two_splices
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def age(path, seconds):
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def test_plot_store_renders_once_and_expires(tmp_path):
+    plots = PlotStore(str(tmp_path), ttl=60)
+    with pytest.raises(KeyError):
+        plots.render('ff')
+
+    plots.save_points('ff', np.arange(5000) * 1e-9, np.linspace(0, 1, 5000))
+    png = plots.render('ff')
+    assert png.startswith(PNG_SIGNATURE) and plots.load_png('ff') == png
+
+    age(tmp_path / 'ff.npy', 120)
+    age(tmp_path / 'ff.png', 120)
+    assert not plots.exists('ff') and plots.load_png('ff') is None
+
+
+@pytest.fixture(scope='module')
+def capture(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('plots') / 'capture.csv')
+    write_siglent_csv(path, *two_splices(14_000))
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_deferred_plot_url(capture):
+    files = {'file': ('capture.csv', capture, 'text/csv')}
+    with TestClient(main.app) as client:
+        body = client.post('/analyze-tdr', files=files, data={'cable_length': '30', 'plot': 'url'}).json()
+        assert body['plot_url'] and body['tdr_plot_base64'] is None
+
+        plot = client.get(body['plot_url'])
+        assert plot.status_code == 200 and plot.headers['content-type'] == 'image/png'
+        assert plot.content.startswith(PNG_SIGNATURE)
+        etag = plot.headers['etag']
+        assert 'immutable' in plot.headers['cache-control']
+
+        cached = client.get(body['plot_url'], headers={'If-None-Match': etag})
+        assert cached.status_code == 304 and not cached.content
+
+        assert client.get('/plots/0123abcd.png').status_code == 404
+        assert client.get('/plots/not-a-hash.png').status_code == 404
+
+
+def test_waveform_handle_plot(capture):
+    with TestClient(main.app) as client:
+        handle = client.post('/waveforms', files={'file': ('capture.csv', capture, 'text/csv')}).json()['handle']
+        plot = client.get(f'/plots/{handle}.png')
+        assert plot.status_code == 200 and plot.content.startswith(PNG_SIGNATURE)
+        assert plot.headers['etag'] == f'"{handle}"'
@@ -0,0 +1,37 @@
+"""
+Pool de procesos de análisis: rechazo con 503 al saturarse y recreación del
+pool cuando un worker muere.
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+from fastapi import HTTPException
+
+sys.path.append(os.path.dirname(__file__))
+
+import main
+
+
+def test_saturated_pool_rejects_with_retry_after(monkeypatch):
+    monkeypatch.setattr(main, '_analysis_inflight', main.ANALYSIS_WORKERS + main.ANALYSIS_QUEUE_SIZE)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(main.run_in_analysis_pool(abs, -1))
+    assert error.value.status_code == 503
+    assert error.value.headers['Retry-After'] == str(main.ANALYSIS_RETRY_AFTER)
+
+
+def test_crashed_worker_recreates_the_pool():
+    async def scenario():
+        with pytest.raises(HTTPException) as error:
+            await main.run_in_analysis_pool(os._exit, 1)
+        assert error.value.status_code == 503 and 'Retry-After' in error.value.headers
+        assert main._analysis_executor is None
+        return await main.run_in_analysis_pool(abs, -1)
+
+    try:
+        assert asyncio.run(scenario()) == 1
+        assert main._analysis_inflight == 0
+    finally:
+        main.shutdown_analysis_executor()
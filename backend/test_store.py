@@ -0,0 +1,72 @@
+"""
+Almacén persistente de capturas: deduplicación por hash, consultas por
+osciloscopio/sesión/fecha/resultado y carga de muestras mapeadas en memoria.
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(__file__))
+
+from store import CaptureStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return CaptureStore(str(tmp_path / 'store'))
+
+
+def add(store, digest, serial, session, captured_at, velocity_factor=None, load_type='open'):
+    time_data = np.arange(10) * 1e-9
+    config = {'serial_number': serial, 'model_number': 'SDS1202X-E', 'sample_interval': 1e-9}
+    capture_id = store.add_capture(digest, f"{digest[:4]}.csv", time_data, np.sin(time_data),
+                                   config, {'t0': 0.0}, session=session, captured_at=captured_at)
+    if velocity_factor is not None:
+        store.add_result(capture_id, 10.0, 50.0, 'auto',
+                         {'velocity_factor': np.float64(velocity_factor), 'vswr': 1.5, 'load_type': load_type})
+    return capture_id
+
+
+def test_same_file_is_stored_once(store):
+    first = add(store, 'aa' * 32, 'SN1', 's1', 100.0)
+    assert add(store, 'aa' * 32, 'SN1', 's2', 200.0) == first
+    assert len(store.query_captures()) == 1
+
+
+def test_query_filters_and_latest_result(store):
+    a = add(store, 'a1' * 32, 'SN1', 'lab1', 100.0, velocity_factor=66.0)
+    b = add(store, 'b2' * 32, 'SN1', 'lab2', 200.0, velocity_factor=70.0, load_type='short')
+    c = add(store, 'c3' * 32, 'SN2', 'lab2', 300.0)
+    store.add_result(a, 12.0, 50.0, 'xcorr', {'velocity_factor': 80.0, 'load_type': 'open'})
+
+    assert [r['id'] for r in store.query_captures()] == [c, b, a]
+    assert [r['id'] for r in store.query_captures(serial_number='SN1')] == [b, a]
+    assert [r['id'] for r in store.query_captures(session='lab2', since=250.0)] == [c]
+    assert [r['id'] for r in store.query_captures(load_type='short')] == [b]
+    # Los filtros de resultado usan la última medición de cada captura
+    assert [r['id'] for r in store.query_captures(min_velocity_factor=75.0)] == [a]
+    assert store.query_captures(serial_number='SN1', limit=1, offset=1)[0]['latest_result']['velocity_factor'] == 80.0
+
+    with pytest.raises(ValueError):
+        store.query_captures(cable='x')
+
+
+def test_capture_history_samples_and_delete(store):
+    capture_id = add(store, 'd4' * 32, 'SN1', 'lab1', 100.0, velocity_factor=66.0)
+    store.add_result(capture_id, 12.0, 50.0, 'xcorr', {'velocity_factor': 67.0})
+
+    capture = store.get_capture(capture_id)
+    assert capture['serial_number'] == 'SN1'
+    assert [r['result']['velocity_factor'] for r in capture['results']] == [67.0, 66.0]
+
+    time_data, voltage, config, events = store.load_samples(capture_id)
+    assert isinstance(voltage, np.memmap)
+    np.testing.assert_array_equal(voltage, np.sin(time_data))
+    assert config['model_number'] == 'SDS1202X-E' and events == {'t0': 0.0}
+
+    assert store.group_counts('serial_number')[0]['captures'] == 1
+    store.delete_capture(capture_id)
+    with pytest.raises(KeyError):
+        store.get_capture(capture_id)
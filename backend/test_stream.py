@@ -0,0 +1,121 @@
+"""
+Streaming en vivo: buffer circular, detección de cambios entre tramas,
+diferencias de la forma de onda decimada y el protocolo del WebSocket.
+"""
+import io
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(__file__))
+
+from stream import FrameRing, SimulatedScope, StreamSession, WaveformDelta, decode_frame, frame_changed
+
+
+def npy(array):
+    buffer = io.BytesIO()
+    np.save(buffer, array)
+    return buffer.getvalue()
+
+
+def test_decode_frame_shapes():
+    time, voltage = decode_frame(npy(np.arange(20.0)), 1e-9)
+    assert time is None and len(voltage) == 20
+
+    time, voltage = decode_frame(npy(np.vstack((np.arange(20) * 1e-9, np.ones(20)))), None)
+    assert time[1] == 1e-9 and np.all(voltage == 1)
+
+    for data, sample_interval in [(npy(np.arange(20.0)), None), (npy(np.ones((3, 20))), 1e-9),
+                                  (b'not a frame', 1e-9), (npy(np.array(['a'] * 20)), 1e-9)]:
+        with pytest.raises(ValueError):
+            decode_frame(data, sample_interval)
+
+
+def test_ring_keeps_last_frames_and_resets_on_new_grid():
+    ring = FrameRing(capacity=4)
+    time = np.arange(10) * 1e-9
+    for k in range(6):
+        ring.push(time, np.full(10, float(k)))
+
+    assert len(ring) == 4
+    assert ring.latest()[0] == 5
+    assert ring.latest(3)[0] == pytest.approx(4)  # promedio de 5, 4 y 3
+    assert ring.latest(10)[0] == pytest.approx(3.5)  # solo quedan 5, 4, 3 y 2
+
+    ring.push(np.arange(12) * 1e-9, np.zeros(12))
+    assert len(ring) == 1
+
+
+def test_frame_changed_ignores_noise():
+    scope = SimulatedScope(noise=0.002, seed=0)
+    _, first = scope.waveform()
+    _, second = scope.waveform()
+    assert not frame_changed(first, second)
+
+    scope.delay += 100e-9
+    _, moved = scope.waveform()
+    assert frame_changed(first, moved)
+    assert frame_changed(None, first)
+
+
+def test_waveform_delta_sends_only_changes():
+    delta = WaveformDelta()
+    grid = (100, 0.0, 99e-9)
+    time = np.arange(100) * 1e-9
+    values = np.linspace(0, 1, 100)
+
+    indices = np.array([0, 10, 20, 99])
+    first = delta.update(grid, indices, time[indices], values[indices])
+    assert first['reset'] and first['index'] == [0, 10, 20, 99]
+
+    values[20] += 0.5
+    indices = np.array([0, 15, 20, 99])
+    second = delta.update(grid, indices, time[indices], values[indices])
+    assert not second['reset']
+    assert second['index'] == [15, 20] and second['removed'] == [10]
+
+    assert delta.update((200, 0.0, 199e-9), indices, time[indices], values[indices])['reset']
+
+
+def test_session_skips_unchanged_frames():
+    scope = SimulatedScope(noise=0.001, seed=1)
+    session = StreamSession()
+    session.configure({'sample_interval': scope.sample_interval})
+
+    session.push(scope.frame())
+    assert session.pending() is not None
+    session.push(scope.frame())
+    assert session.pending() is None
+    scope.reflection = -0.5
+    session.push(scope.frame(with_time=True))
+    assert session.pending() is not None
+    assert (session.received, session.analyses, session.skipped) == (3, 2, 1)
+
+
+def test_websocket_stream_updates():
+    from fastapi.testclient import TestClient
+    import main
+
+    scope = SimulatedScope(points=2000, seed=2)
+    with TestClient(main.app) as client, client.websocket_connect('/stream') as ws:
+        ws.send_text(json.dumps({'cable_length': 0}))
+        assert ws.receive_json()['type'] == 'error'
+
+        ws.send_text(json.dumps({'cable_length': 100, 'sample_interval': 1e-9,
+                                 'dt_method': 'xcorr', 'max_points': 200}))
+        assert ws.receive_json()['type'] == 'ready'
+
+        ws.send_bytes(scope.frame())
+        update = ws.receive_json()
+        assert update['type'] == 'update'
+        assert update['result']['delta_t'] == pytest.approx(scope.delay, rel=0.02)
+        assert update['waveform']['reset'] and 0 < len(update['waveform']['index']) <= 204
+
+        scope.delay = 600e-9
+        ws.send_bytes(scope.frame())
+        update = ws.receive_json()
+        assert update['result']['delta_t'] == pytest.approx(600e-9, rel=0.02)
+        assert not update['waveform']['reset']
@@ -0,0 +1,83 @@
+"""
+Barrido de cable_length × z0_expected: una detección, etapas difundidas
+sobre la rejilla y respuesta matricial o columnar.
+"""
+import io
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.dirname(__file__))
+
+import main
+from benchmark import synthetic_step, write_siglent_csv
+from transport import METADATA_HEADER, NPY_MEDIA_TYPE
+
+
+@pytest.fixture
+def capture(tmp_path):
+    path = str(tmp_path / 'capture.csv')
+    write_siglent_csv(path, *synthetic_step(1400, 'short', 0.005))
+    return path
+
+
+def load(path):
+    upload = main.LocalUpload(path, 'capture.csv')
+    try:
+        return main.process_csv_file(upload)
+    finally:
+        upload.close()
+
+
+@pytest.mark.parametrize('dt_method', ['auto', 'xcorr'])
+def test_sweep_matches_single_analyses(capture, dt_method):
+    time, voltage, config = load(capture)
+    events = main.detect_pulse_events(time, voltage, config)
+    lengths, z0 = np.linspace(5, 50, 100), np.linspace(25, 100, 100)
+
+    sweep = main.sweep_parametric_stages(time, voltage, config, events, lengths, z0, dt_method)
+    assert sweep['grid']['velocity_factor'].shape == (100, 100)
+    for i, j in [(0, 0), (37, 5), (99, 99)]:
+        single = main.run_parametric_stages(time, voltage, config, events, lengths[i], z0[j], dt_method)
+        for name in ('velocity_factor', 'error_percent', 'load_value'):
+            assert sweep['grid'][name][i, j] == pytest.approx(single[name], rel=1e-12)
+        for name in ('delta_t', 'reflection_coefficient', 'vswr'):
+            assert sweep[name] == pytest.approx(single[name])
+        assert sweep['load_type'] == single['load_type']
+
+
+def test_parse_grid():
+    assert main.parse_grid('10:20:3', 'x').tolist() == [10, 15, 20]
+    assert main.parse_grid('50, 75', 'x').tolist() == [50, 75]
+    for value in ('', 'a,b', '0:10:5', '10,-1', '1:2'):
+        with pytest.raises(main.HTTPException):
+            main.parse_grid(value, 'x')
+
+
+def test_sweep_endpoint(capture):
+    with open(capture, 'rb') as f:
+        content = f.read()
+    form = {'cable_lengths': '10:30:21', 'z0_values': '50,75'}
+    with TestClient(main.app) as client:
+        response = client.post('/analyze-tdr/sweep', files={'file': ('capture.csv', content, 'text/csv')},
+                               data=form)
+        assert response.status_code == 200
+        body = response.json()
+        assert len(body['cable_length']) == 21 and body['z0_expected'] == [50, 75]
+        assert np.shape(body['velocity_factor']) == (21, 2)
+
+        response = client.post('/analyze-tdr/sweep', files={'file': ('capture.csv', content, 'text/csv')},
+                               data=form, headers={'Accept': NPY_MEDIA_TYPE})
+        columns = np.load(io.BytesIO(response.content))
+        metadata = json.loads(response.headers[METADATA_HEADER])
+        assert columns.shape == (2 + len(main.SWEEP_COLUMNS), 42) and metadata['shape'] == [21, 2]
+        velocity = columns[metadata['columns'].index('velocity_factor')].reshape(21, 2)
+        assert np.allclose(velocity, body['velocity_factor'])
+
+        response = client.post('/analyze-tdr/sweep', files={'file': ('capture.csv', content, 'text/csv')},
+                               data={'cable_lengths': f'1:2:{main.SWEEP_MAX_POINTS + 1}'})
+        assert response.status_code == 400
@@ -0,0 +1,114 @@
+"""
+Transporte columnar: la cabecera X-TDR-Metadata queda acotada y es JSON
+válido; las tablas de tamaño variable viajan solo en el cuerpo.
+"""
+import io
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.dirname(__file__))
+
+import main
+from benchmark import write_siglent_csv
+from test_discontinuities import two_splices
+from transport import (ARROW_AVAILABLE, ARROW_MEDIA_TYPE, JSON_MEDIA_TYPE, METADATA_HEADER, NPY_MEDIA_TYPE,
+                       header_metadata, negotiate_media_type)
+
+
+@pytest.mark.parametrize('accept, expected', [
+    (None, JSON_MEDIA_TYPE),
+    ('*/*', JSON_MEDIA_TYPE),
+    ('text/html', JSON_MEDIA_TYPE),
+    (NPY_MEDIA_TYPE, NPY_MEDIA_TYPE),
+    (f'application/json;q=0.5, {NPY_MEDIA_TYPE}', NPY_MEDIA_TYPE),
+    (f'{NPY_MEDIA_TYPE};q=0, application/json', JSON_MEDIA_TYPE),
+    (f'{NPY_MEDIA_TYPE};q=0.2, application/json;q=0.9', JSON_MEDIA_TYPE),
+])
+def test_negotiation_follows_client_preference(accept, expected):
+    assert negotiate_media_type(accept) == expected
+
+
+def test_header_keeps_bounded_values_only():
+    header = header_metadata({
+        'delta_t': np.float64(3e-7),
+        'alpha': float('nan'),
+        'attenuation': {'alpha': None, 'ci': [np.float64(1.0), np.inf], 'reason': 'degenerate_fit'},
+        'discontinuities': {'events': [{'distance': 10.0}] * 500, 'segments': []},
+        'waveform_points': list(range(100)),
+    })
+    assert header['delta_t'] == 3e-7 and header['alpha'] is None
+    assert header['attenuation']['ci'] == [1.0, None]
+    assert header['omitted'] == ['discontinuities', 'waveform_points']
+    json.dumps(header, allow_nan=False)
+
+
+@pytest.fixture
+def capture(tmp_path):
+    # Dos empalmes y la carga: la tabla de discontinuidades tiene varias filas
+    path = str(tmp_path / 'capture.csv')
+    write_siglent_csv(path, *two_splices(14_000))
+    return path
+
+
+def post(client, url, files, accept, **data):
+    return client.post(url, files=files, headers={'Accept': accept},
+                       data=dict({'cable_length': '30', 'plot': 'none'}, **data))
+
+
+def test_tables_stay_out_of_the_header(capture):
+    with open(capture, 'rb') as f:
+        content = f.read()
+    with TestClient(main.app) as client:
+        body = post(client, '/analyze-tdr', {'file': ('capture.csv', content, 'text/csv')},
+                    'application/json', dt_method='xcorr').json()
+        assert len(body['discontinuities']['events']) == 3
+
+        response = post(client, '/analyze-tdr', {'file': ('capture.csv', content, 'text/csv')},
+                        NPY_MEDIA_TYPE, dt_method='xcorr')
+        assert response.status_code == 200
+        header = response.headers[METADATA_HEADER]
+        assert len(header) < 2048
+        metadata = json.loads(header, parse_constant=pytest.fail)
+        assert 'discontinuities' in metadata['omitted']
+        assert metadata['delta_t'] == body['delta_t']
+        assert np.load(io.BytesIO(response.content)).shape[0] == len(metadata['columns'])
+
+        # El promedio enviaba en la cabecera todo salvo la forma de onda
+        files = [('files', (f'capture{i}.csv', content, 'text/csv')) for i in range(2)]
+        response = post(client, '/analyze-tdr/average', files, NPY_MEDIA_TYPE)
+        assert response.status_code == 200
+        metadata = json.loads(response.headers[METADATA_HEADER], parse_constant=pytest.fail)
+        assert 'discontinuities' in metadata['omitted'] and metadata['averaging']['acquisitions'] == 2
+
+        if ARROW_AVAILABLE:
+            import pyarrow as pa
+
+            response = post(client, '/analyze-tdr', {'file': ('capture.csv', content, 'text/csv')},
+                            ARROW_MEDIA_TYPE, dt_method='xcorr')
+            schema = pa.ipc.open_stream(response.content).schema
+            metadata = json.loads(schema.metadata[b'tdr'], parse_constant=pytest.fail)
+            assert metadata['discontinuities'] == body['discontinuities']
+
+
+def test_upload_csv_negotiates_the_waveform_format(capture):
+    with open(capture, 'rb') as f:
+        content = f.read()
+    files = {'file': ('capture.csv', content, 'text/csv')}
+    with TestClient(main.app) as client:
+        body = client.post('/upload-csv', files=files, data={'max_points': '500'}).json()
+
+        response = client.post('/upload-csv', files=files, data={'max_points': '500'},
+                               headers={'Accept': NPY_MEDIA_TYPE})
+        assert response.status_code == 200 and response.headers['content-type'] == NPY_MEDIA_TYPE
+        header = response.headers[METADATA_HEADER]
+        assert len(header) < 2048
+        metadata = json.loads(header, parse_constant=pytest.fail)
+        columns = np.load(io.BytesIO(response.content))
+        assert metadata['columns'] == ['time', 'magnitude'] and columns.shape == (2, len(body['time']))
+        np.testing.assert_allclose(columns[1], body['magnitude'])
+        assert 'config' in metadata or 'config' in metadata['omitted']
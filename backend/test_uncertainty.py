@@ -0,0 +1,142 @@
+"""
+Modo de incertidumbre: perturbaciones por lotes, Δt vectorizado y
+distribuciones Monte Carlo del endpoint.
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.dirname(__file__))
+
+import main
+from benchmark import synthetic_step, write_siglent_csv
+from uncertainty import CODES_PER_DIV, noise_residual, perturb_batch, quantization_step, summarize
+
+
+def quantized_capture(tmp_path, load='open', noise=0.005):
+    path = str(tmp_path / 'capture.csv')
+    write_siglent_csv(path, *synthetic_step(1400, load, noise))
+    return path
+
+
+def test_perturbations_stay_on_adc_grid():
+    rng = np.random.default_rng(0)
+    signal = np.linspace(0, 1, 200)
+    batch = perturb_batch(signal, np.array([-0.01, 0.0, 0.01]), 50, rng, quantum=0.04, jitter_samples=0.3,
+                          origin=0.02)
+    assert batch.shape == (50, 200)
+    codes = (batch - 0.02) / 0.04
+    assert np.allclose(codes, np.round(codes))
+    assert np.abs(batch - signal).max() < 0.06
+
+    # Sin ruido la parte de cuantización no se vuelve a sumar
+    raw = np.round(signal / 0.04) * 0.04
+    assert noise_residual(raw, signal, 0.04).std() == pytest.approx(0.0, abs=1e-3)
+
+
+def test_quantization_step_uses_header_codes():
+    assert quantization_step({'vertical_scale': 0.5, 'code_per_div': 30}) == pytest.approx(0.5 / 30)
+    assert quantization_step({'vertical_scale': 0.5}) == pytest.approx(0.5 / CODES_PER_DIV)
+    assert quantization_step({}) == 0.0
+
+
+@pytest.mark.parametrize('method', ['auto', 'plateau', 'reflection', 'rise'])
+def test_delay_arrays_match_scalar_temporal(method):
+    from test_detect_pulse_events import synthetic_trace
+    time, open_end = synthetic_trace(0.8, seed=1)
+    _, short_end = synthetic_trace(-0.9, seed=2)
+    voltages = np.vstack((open_end, short_end, np.linspace(0, 1, len(time)), np.zeros_like(time)))
+
+    dt = main.delay_arrays(main.detect_event_arrays(time, voltages), method)
+    for row, events in enumerate(main.detect_channel_events(time, voltages)):
+        try:
+            expected = main.calculate_temporal_parameters(events, 30.0, method=method)['dt'] if events else np.nan
+        except ValueError:
+            expected = np.nan
+        assert dt[row] == pytest.approx(expected, nan_ok=True, rel=1e-12)
+
+    with pytest.raises(ValueError):
+        main.delay_arrays(main.detect_event_arrays(time, voltages), 'xcorr')
+
+
+def test_delay_xcorr_arrays_match_scalar_estimate():
+    time = synthetic_step(1400, 'open')[0]
+    rows = [main.smooth_voltage(synthetic_step(1400, load, 0.01, seed)[1])
+            for seed, load in enumerate(('open', 'short', 'matched'))]
+    voltages = np.vstack(rows + [np.zeros_like(time)])
+
+    dt = main.delay_xcorr_arrays(time, voltages, main.detect_event_arrays(time, voltages))
+    for row, events in enumerate(main.detect_channel_events(time, voltages)):
+        expected = main.estimate_delay_xcorr(time, voltages[row], events) if events else None
+        assert dt[row] == pytest.approx(np.nan if expected is None else expected, nan_ok=True, rel=1e-9)
+    assert dt[0] == pytest.approx(300e-9, rel=1e-3) and np.isnan(dt[3])
+
+
+def test_monte_carlo_distributions(tmp_path, monkeypatch):
+    data = main.analyze_tdr_path(quantized_capture(tmp_path), 'capture.csv', 30.0, 50.0, plot='none',
+                                 uncertainty=500)
+    result = data['uncertainty']
+    assert (result['trials'], result['failed'], result['truncated']) == (500, 0, False)
+    low, high = result['delta_t']['ci']
+    assert low <= data['delta_t'] <= high
+    assert 0 < result['delta_t']['std'] < 1e-9  # Jitter y cuantización: fracciones de muestra
+    assert sum(result['velocity_factor']['histogram']['counts']) == 500
+    assert set(result) >= {'reflection_coefficient', 'vswr', 'error_percent', 'perturbations'}
+    assert result['delta_t_source'] == {'plateau': 500} and result['warning'] is None
+
+    # El presupuesto de tiempo corta tras el primer lote
+    monkeypatch.setattr(main, 'UNCERTAINTY_TIME_BUDGET', 0.0)
+    monkeypatch.setattr(main, 'UNCERTAINTY_BATCH_BYTES', 64 * 1400 * main.UNCERTAINTY_WORK_ARRAYS * 8)
+    time, voltage, config = main.process_csv_file(main.LocalUpload(quantized_capture(tmp_path), 'capture.csv'))
+    truncated = main.run_uncertainty_analysis(time, voltage, voltage, config, 30.0, 50.0, 1000)
+    assert truncated['trials'] == 64 and truncated['truncated']
+
+
+def test_xcorr_trials_measure_the_trace(tmp_path):
+    data = main.analyze_tdr_path(quantized_capture(tmp_path), 'capture.csv', 30.0, 50.0, plot='none',
+                                 dt_method='xcorr', uncertainty=200)
+    result = data['uncertainty']
+    assert result['delta_t_source'] == {'xcorr': 200} and result['failed'] == 0
+    assert result['delta_t']['mean'] == pytest.approx(300e-9, rel=1e-3)
+    assert result['delta_t']['std'] > 1e-12 and result['error_percent'] > 1e-4
+
+
+def test_fixed_rise_fallback_is_not_reported_as_precision(tmp_path):
+    # 'rise' da siempre 900 ns: la dispersión de Δt sería nula por construcción
+    data = main.analyze_tdr_path(quantized_capture(tmp_path), 'capture.csv', 30.0, 50.0, plot='none',
+                                 dt_method='rise', uncertainty=100)
+    result = data['uncertainty']
+    assert result['delta_t_source'] == {'rise': 100}
+    assert result['delta_t'] is None and result['velocity_factor'] is None
+    assert result['error_percent'] is None and 'rise' in result['warning']
+    assert result['reflection_coefficient'] is not None
+
+
+def test_summarize_ignores_non_finite():
+    summary = summarize(np.array([1.0, 2.0, 3.0, np.nan, np.inf]))
+    assert summary['mean'] == 2.0 and summary['median'] == 2.0
+    assert summarize(np.array([np.nan])) is None
+
+
+def test_endpoint_uncertainty(tmp_path):
+    path = quantized_capture(tmp_path)
+    with TestClient(main.app) as client, open(path, 'rb') as f:
+        content = f.read()
+        response = client.post('/analyze-tdr', files={'file': ('capture.csv', content, 'text/csv')},
+                               data={'cable_length': '30', 'plot': 'none', 'uncertainty': '200'})
+        assert response.status_code == 200
+        assert response.json()['uncertainty']['trials'] == 200
+
+        response = client.post('/analyze-tdr', files={'file': ('capture.csv', content, 'text/csv')},
+                               data={'cable_length': '30', 'plot': 'none', 'uncertainty': '50',
+                                     'dt_method': 'xcorr'})
+        assert response.status_code == 200
+        assert response.json()['uncertainty']['delta_t_source'] == {'xcorr': 50}
+
+        response = client.post('/analyze-tdr', files={'file': ('capture.csv', content, 'text/csv')},
+                               data={'cable_length': '30', 'plot': 'none',
+                                     'uncertainty': str(main.UNCERTAINTY_MAX_TRIALS + 1)})
+        assert response.status_code == 400
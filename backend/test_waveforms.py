@@ -0,0 +1,81 @@
+"""
+Formas de onda reutilizables: arreglos mapeados en memoria, expiración,
+límite de entradas y reanálisis por handle.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.dirname(__file__))
+
+import main
+from benchmark import write_siglent_csv
+from test_discontinuities import two_splices
+from waveform_cache import WaveformCache
+
+
+def save(waveforms, handle, n=100):
+    time_data = np.arange(n) * 1e-9
+    waveforms.save(handle, time_data, np.sin(time_data * 1e7), {'sample_interval': 1e-9}, {'t0': 0.0})
+
+
+def age(path, seconds):
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def test_waveforms_load_read_only_mmaps(tmp_path):
+    waveforms = WaveformCache(str(tmp_path))
+    save(waveforms, 'ab12')
+    time_data, voltage, config, events = waveforms.load('ab12')
+    assert isinstance(time_data, np.memmap) and isinstance(voltage, np.memmap)
+    assert not voltage.flags.writeable
+    np.testing.assert_allclose(time_data, np.arange(100) * 1e-9)
+    assert config == {'sample_interval': 1e-9} and events == {'t0': 0.0}
+
+    with pytest.raises(KeyError):
+        waveforms.load('../etc')
+    assert not waveforms.exists('cd34')
+
+
+def test_waveforms_expire_and_respect_max_entries(tmp_path):
+    waveforms = WaveformCache(str(tmp_path), ttl=60, max_entries=2)
+    save(waveforms, 'aa')
+    age(tmp_path / 'aa' / 'meta.json', 120)
+    assert not waveforms.exists('aa') and not (tmp_path / 'aa').exists()
+
+    for i, handle in enumerate(('b1', 'b2', 'b3')):
+        save(waveforms, handle)
+        age(tmp_path / handle / 'meta.json', 30 - 10 * i)
+    assert sorted(os.listdir(tmp_path)) == ['b2', 'b3']
+
+
+@pytest.fixture(scope='module')
+def capture(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('waveforms') / 'capture.csv')
+    write_siglent_csv(path, *two_splices(14_000))
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_handle_reanalysis_matches_full_analysis(capture):
+    files = {'file': ('capture.csv', capture, 'text/csv')}
+    with TestClient(main.app) as client:
+        full = client.post('/analyze-tdr', files=files, data={'cable_length': '30', 'plot': 'none'}).json()
+
+        uploaded = client.post('/waveforms', files=files)
+        assert uploaded.status_code == 200
+        handle = uploaded.json()['handle']
+        assert uploaded.json()['points'] == 14_000
+        assert client.post('/waveforms', files=files).json()['handle'] == handle
+
+        response = client.post(f'/waveforms/{handle}/analyze', data={'cable_length': '30'})
+        assert response.status_code == 200
+        for key in ('delta_t', 'velocity_factor', 'Z0', 'reflection_coefficient', 'length_meters'):
+            assert response.json()[key] == pytest.approx(full[key]), key
+
+        assert client.post('/waveforms/0123abcd/analyze', data={'cable_length': '30'}).status_code == 404
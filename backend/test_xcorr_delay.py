@@ -0,0 +1,56 @@
+"""
+Estimador de Δt por correlación cruzada: resolución menor que el intervalo
+de muestreo sobre escalones sintéticos con retardo fraccionario.
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+from scipy.special import erf
+
+sys.path.append(os.path.dirname(__file__))
+
+from main import (calculate_temporal_parameters, condition_voltage, detect_pulse_events,
+                  estimate_delay_xcorr)
+
+SAMPLE_INTERVAL = 2e-9
+
+
+def synthetic_reflection(delay: float, reflection: float, n: int = 2000, seed: int = 0):
+    """Frente incidente y reflejado con forma erf, desplazados una fracción de muestra."""
+    rng = np.random.default_rng(seed)
+    time = np.arange(n) * SAMPLE_INTERVAL
+    t_incident = 200.37 * SAMPLE_INTERVAL
+    voltage = (0.5 * (1 + erf((time - t_incident) / 3e-9))
+               + reflection * 0.5 * (1 + erf((time - t_incident - delay) / 3e-9))
+               + rng.normal(0, 1e-3, n))
+    voltage = condition_voltage(voltage, {})
+    return time, voltage, detect_pulse_events(time, voltage, {})
+
+
+@pytest.mark.parametrize('reflection', [0.8, 0.3, -0.9])
+@pytest.mark.parametrize('delay', [101.3e-9, 95.77e-9])
+def test_xcorr_delay_has_sub_sample_accuracy(delay, reflection):
+    time, voltage, events = synthetic_reflection(delay, reflection)
+    estimate = estimate_delay_xcorr(time, voltage, events)
+    assert estimate == pytest.approx(delay, abs=0.25 * SAMPLE_INTERVAL)
+
+
+def test_xcorr_delay_is_none_without_reflection():
+    time, voltage, events = synthetic_reflection(100e-9, 0.0)
+    assert estimate_delay_xcorr(time, voltage, events) is None
+    with pytest.raises(ValueError):
+        calculate_temporal_parameters(events, 10.0, method='xcorr', time=time, voltage=voltage)
+
+
+def test_xcorr_method_in_temporal_parameters():
+    time, voltage, events = synthetic_reflection(101.3e-9, -0.9)
+    params = calculate_temporal_parameters(events, 10.0, method='xcorr', time=time, voltage=voltage)
+    assert params['method'] == 'xcorr'
+    assert params['vp'] == pytest.approx(2 * 10.0 / params['dt'])
+
+    with pytest.raises(ValueError):
+        calculate_temporal_parameters(events, 10.0, method='unknown')
+    with pytest.raises(ValueError, match='requires the waveform'):
+        calculate_temporal_parameters(events, 10.0, method='xcorr', time=time)
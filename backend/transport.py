@@ -0,0 +1,165 @@
+"""
+Transporte binario columnar de formas de onda.
+
+Según la cabecera Accept, los arreglos de tiempo y voltaje se envían como
+columnas binarias en lugar de listas JSON:
+
+- application/x-npy: un arreglo NumPy (columnas, N) float64. Los metadatos
+  acotados (resultados escalares, nombres de columnas) van en la cabecera
+  X-TDR-Metadata; las tablas de tamaño variable (p. ej. las discontinuidades)
+  no caben en una cabecera (los proxies la limitan a 8-16 KB) y se omiten,
+  listadas en 'omitted'.
+- application/vnd.apache.arrow.stream: un record batch de Arrow IPC con todos
+  los metadatos en el esquema, dentro del cuerpo. Requiere pyarrow instalado.
+
+En ambos casos los valores no finitos se envían como null: NaN no es JSON válido.
+"""
+import importlib.util
+import io
+import json
+from typing import Dict, Iterator, Optional
+
+import numpy as np
+from fastapi import HTTPException
+from fastapi.responses import Response, StreamingResponse
+
+from metrics import stage
+
+# pyarrow es opcional y pesado: solo se comprueba que esté instalado y se
+# importa al construir la primera respuesta Arrow
+ARROW_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+
+JSON_MEDIA_TYPE = 'application/json'
+NPY_MEDIA_TYPE = 'application/x-npy'
+ARROW_MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+METADATA_HEADER = 'X-TDR-Metadata'
+METADATA_MAX_ITEMS = 8  # Listas cortas admitidas en la cabecera (shape, ci)
+
+
+def negotiate_media_type(accept: Optional[str]) -> str:
+    """
+    Elige el formato de respuesta a partir de la cabecera Accept.
+    Se respeta el orden de preferencia del cliente; por defecto JSON.
+    Solo se rechaza (406) una petición exclusivamente Arrow sin pyarrow.
+    """
+    if not accept:
+        return JSON_MEDIA_TYPE
+
+    candidates = []
+    for position, part in enumerate(accept.split(',')):
+        fields = [f.strip() for f in part.split(';')]
+        quality = 1.0
+        for param in fields[1:]:
+            if param.startswith('q='):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        candidates.append((-quality, position, fields[0].lower()))
+
+    for neg_quality, _, media_type in sorted(candidates):
+        if neg_quality >= 0:
+            break  # q=0: el cliente rechaza explícitamente el formato
+        if media_type == NPY_MEDIA_TYPE:
+            return NPY_MEDIA_TYPE
+        if media_type == ARROW_MEDIA_TYPE and ARROW_AVAILABLE:
+            return ARROW_MEDIA_TYPE
+        if media_type in (JSON_MEDIA_TYPE, 'application/*', '*/*'):
+            return JSON_MEDIA_TYPE
+
+    if ARROW_MEDIA_TYPE in accept.lower() and not ARROW_AVAILABLE:
+        raise HTTPException(status_code=406, detail="Arrow transport requires pyarrow on the server")
+    return JSON_MEDIA_TYPE
+
+
+def _json_safe(value):
+    if isinstance(value, dict):
+        return {k: _json_safe(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_safe(v) for v in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
+
+
+def _is_scalar(value) -> bool:
+    return value is None or isinstance(value, (str, int, float, bool))
+
+
+def _is_bounded(value, nested: bool = False) -> bool:
+    # Escalares, listas cortas de escalares y, en el primer nivel, diccionarios de ellos
+    if _is_scalar(value):
+        return True
+    if isinstance(value, list):
+        return len(value) <= METADATA_MAX_ITEMS and all(_is_scalar(v) for v in value)
+    if isinstance(value, dict) and not nested:
+        return all(_is_bounded(v, nested=True) for v in value.values())
+    return False
+
+
+def header_metadata(metadata: Dict) -> Dict:
+    """
+    Parte de metadata que cabe en X-TDR-Metadata: su tamaño depende solo de
+    las claves, no del registro. Las claves descartadas se listan en 'omitted'.
+    """
+    metadata = _json_safe(metadata)
+    header = {k: v for k, v in metadata.items() if _is_bounded(v)}
+    omitted = sorted(k for k in metadata if k not in header)
+    if omitted:
+        header['omitted'] = omitted
+    return header
+
+
+def npy_response(columns: Dict[str, np.ndarray], metadata: Dict) -> StreamingResponse:
+    """
+    Envía las columnas como un único arreglo .npy de forma (columnas, N) sin
+    copiarlas: se escribe la cabecera y luego el buffer de cada columna. Solo
+    los metadatos acotados viajan en X-TDR-Metadata (ver header_metadata).
+    """
+    names = list(columns)
+    arrays = [np.ascontiguousarray(columns[name], dtype='<f8') for name in names]
+    n = len(arrays[0]) if arrays else 0
+
+    header = io.BytesIO()
+    np.lib.format.write_array_header_1_0(header, {
+        'descr': '<f8',
+        'fortran_order': False,
+        'shape': (len(arrays), n),
+    })
+
+    def body() -> Iterator[bytes]:
+        yield header.getvalue()
+        for array in arrays:
+            yield memoryview(array).cast('B')
+
+    meta = dict(header_metadata(metadata), columns=names)
+    return StreamingResponse(body(), media_type=NPY_MEDIA_TYPE,
+                             headers={METADATA_HEADER: json.dumps(meta, separators=(',', ':'), allow_nan=False)})
+
+
+def arrow_response(columns: Dict[str, np.ndarray], metadata: Dict) -> Response:
+    """
+    Envía las columnas como un stream Arrow IPC; los metadatos viajan en el esquema.
+    """
+    import pyarrow as pa
+
+    meta = json.dumps(_json_safe(metadata), separators=(',', ':'), allow_nan=False)
+    batch = pa.record_batch(
+        [pa.array(np.asarray(columns[name], dtype=np.float64)) for name in columns],
+        names=list(columns),
+    )
+    batch = batch.replace_schema_metadata({'tdr': meta})
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return Response(content=memoryview(sink.getvalue()), media_type=ARROW_MEDIA_TYPE)
+
+
+def columnar_response(media_type: str, columns: Dict[str, np.ndarray], metadata: Dict) -> Response:
+    with stage('serialize', len(next(iter(columns.values()), ()))):
+        if media_type == ARROW_MEDIA_TYPE:
+            return arrow_response(columns, metadata)
+        return npy_response(columns, metadata)
@@ -0,0 +1,102 @@
+"""
+Incertidumbre por Monte Carlo sobre la traza parseada.
+
+Cada ensayo perturba la forma de onda con tres fuentes independientes:
+- Ruido remuestreado (bootstrap de los residuos respecto de la traza suavizada).
+- Cuantización vertical: cada ensayo se vuelve a cuantizar a la rejilla de
+  códigos ADC derivada del vertical_scale de la cabecera, como el osciloscopio.
+- Jitter del disparo: desplazamiento temporal con interpolación lineal.
+
+Los ensayos se generan por lotes como arreglos (ensayos, N) y se suavizan con
+el mismo filtro que el pipeline. Así la detección y la etapa temporal se
+repiten vectorizadas, sin un bucle de Python por ensayo. Las distribuciones se
+resumen con media, desviación, percentiles e histograma.
+"""
+from typing import Dict, Optional
+
+import numpy as np
+
+CODES_PER_DIV = 25  # Códigos ADC por división vertical del Siglent si el archivo no los indica
+CONFIDENCE = 95.0  # Intervalo central reportado (%)
+HISTOGRAM_BINS = 30
+OUTLIER_SIGMAS = 4.0  # Residuos más alejados se atribuyen a los frentes, no al ruido
+
+
+def quantization_step(config: Dict[str, float]) -> float:
+    """
+    Voltios por código ADC según la escala vertical y los códigos por
+    división de la cabecera (CODES_PER_DIV si no los indica), o 0 si no se
+    conoce la escala.
+    """
+    return config.get('vertical_scale', 0.0) / config.get('code_per_div', CODES_PER_DIV)
+
+
+def noise_residual(raw: np.ndarray, smooth: np.ndarray, quantum: float = 0.0) -> np.ndarray:
+    """
+    Residuos a remuestrear: raw - smooth sin la parte de cuantización
+    (varianza quantum²/12), que cada ensayo vuelve a sumar al cuantizarse.
+    Se descartan los residuos de los frentes, donde el suavizado deforma la
+    señal: más de OUTLIER_SIGMAS desviaciones robustas (MAD) de la mediana.
+    """
+    residual = raw - smooth
+    deviation = np.abs(residual - np.median(residual))
+    spread = 1.4826 * np.median(deviation)
+    residual = residual[deviation <= OUTLIER_SIGMAS * spread] if spread > 0 else residual[deviation == 0]
+    residual = residual - residual.mean()
+    variance = residual.var()
+    if quantum > 0 and variance > 0:
+        residual = residual * np.sqrt(max(variance - quantum ** 2 / 12, 0.0) / variance)
+    return residual
+
+
+def shift_rows(voltage: np.ndarray, shifts: np.ndarray) -> np.ndarray:
+    """
+    Traza desplazada shifts[i] muestras (fraccionarias) en cada fila, con
+    interpolación lineal y los extremos repetidos.
+    """
+    n = len(voltage)
+    position = np.clip(np.arange(n) - shifts[:, np.newaxis], 0, n - 1)
+    lower = np.minimum(position.astype(np.intp), max(n - 2, 0))
+    fraction = position - lower
+    upper = np.minimum(lower + 1, n - 1)
+    return voltage[lower] * (1 - fraction) + voltage[upper] * fraction
+
+
+def perturb_batch(signal: np.ndarray, residual: np.ndarray, rows: int, rng: np.random.Generator,
+                  quantum: float = 0.0, jitter_samples: float = 0.0, origin: float = 0.0) -> np.ndarray:
+    """
+    Lote (rows, N) de trazas sin suavizar: signal desplazado por el jitter más
+    residuos remuestreados con reemplazo, cuantizado a múltiplos de quantum
+    desde origin (un valor de la traza original, que ya está en la rejilla).
+    """
+    n = len(signal)
+    if jitter_samples > 0:
+        batch = shift_rows(signal, rng.normal(0.0, jitter_samples, rows))
+    else:
+        batch = np.broadcast_to(signal, (rows, n)).copy()
+    if residual.size:
+        batch += residual[rng.integers(0, residual.size, (rows, n))]
+    if quantum > 0:
+        batch = origin + np.round((batch - origin) / quantum) * quantum
+    return batch
+
+
+def summarize(values: np.ndarray, bins: int = HISTOGRAM_BINS) -> Optional[Dict]:
+    """
+    Media, desviación, mediana, intervalo central e histograma de los valores
+    finitos; None si no hay ninguno.
+    """
+    values = np.asarray(values, dtype=float)
+    values = values[np.isfinite(values)]
+    if not values.size:
+        return None
+    tail = (100.0 - CONFIDENCE) / 2
+    low, median, high = np.percentile(values, [tail, 50.0, 100.0 - tail])
+    counts, edges = np.histogram(values, bins=bins)
+    return {
+        'mean': float(values.mean()),
+        'std': float(values.std(ddof=1)) if values.size > 1 else 0.0,
+        'median': float(median),
+        'ci': [float(low), float(high)],
+        'histogram': {'edges': edges.tolist(), 'counts': counts.tolist()},
+    }
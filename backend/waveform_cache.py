@@ -0,0 +1,98 @@
+"""
+Caché en disco de formas de onda ya procesadas (parseadas, suavizadas y con
+eventos detectados), identificadas por un handle.
+
+Los arreglos se guardan como .npy y se cargan mapeados en memoria, de modo que
+cualquier proceso del pool de análisis puede reutilizarlos sin volver a
+parsear el archivo original.
+"""
+import json
+import os
+import shutil
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+
+class WaveformCache:
+    """
+    Almacén de formas de onda procesadas con expiración por TTL y límite de entradas.
+    """
+
+    def __init__(self, root: str, ttl: float = 3600.0, max_entries: int = 64):
+        self.root = root
+        self.ttl = ttl
+        self.max_entries = max_entries
+        os.makedirs(root, exist_ok=True)
+
+    def _dir(self, handle: str) -> str:
+        if not handle or not all(c in '0123456789abcdef' for c in handle):
+            raise KeyError(handle)
+        return os.path.join(self.root, handle)
+
+    def exists(self, handle: str) -> bool:
+        try:
+            meta_path = os.path.join(self._dir(handle), 'meta.json')
+        except KeyError:
+            return False
+        if not os.path.exists(meta_path):
+            return False
+        if time.time() - os.path.getmtime(meta_path) > self.ttl:
+            self.delete(handle)
+            return False
+        return True
+
+    def touch(self, handle: str):
+        os.utime(os.path.join(self._dir(handle), 'meta.json'))
+
+    def save(self, handle: str, time_data: np.ndarray, voltage: np.ndarray,
+             config: Dict[str, float], events: Dict[str, float]):
+        directory = self._dir(handle)
+        tmp_dir = f"{directory}.{os.getpid()}.tmp"
+        os.makedirs(tmp_dir, exist_ok=True)
+        np.save(os.path.join(tmp_dir, 'time.npy'), time_data)
+        np.save(os.path.join(tmp_dir, 'voltage.npy'), voltage)
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({'config': config, 'events': events}, f, default=float)
+
+        # Publicar el directorio completo de forma atómica
+        if os.path.exists(directory):
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        else:
+            os.replace(tmp_dir, directory)
+        self.cleanup()
+
+    def load(self, handle: str) -> Tuple[np.ndarray, np.ndarray, Dict[str, float], Dict[str, Optional[float]]]:
+        if not self.exists(handle):
+            raise KeyError(handle)
+        directory = self._dir(handle)
+        with open(os.path.join(directory, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        time_data = np.load(os.path.join(directory, 'time.npy'), mmap_mode='r')
+        voltage = np.load(os.path.join(directory, 'voltage.npy'), mmap_mode='r')
+        return time_data, voltage, meta['config'], meta['events']
+
+    def delete(self, handle: str):
+        shutil.rmtree(self._dir(handle), ignore_errors=True)
+
+    def cleanup(self):
+        """
+        Elimina entradas expiradas y las más antiguas si se supera el límite.
+        """
+        entries = []
+        now = time.time()
+        for name in os.listdir(self.root):
+            meta_path = os.path.join(self.root, name, 'meta.json')
+            try:
+                mtime = os.path.getmtime(meta_path)
+            except OSError:
+                continue
+            if now - mtime > self.ttl:
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+            else:
+                entries.append((mtime, name))
+
+        entries.sort()
+        for _, name in entries[:max(0, len(entries) - self.max_entries)]:
+            shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
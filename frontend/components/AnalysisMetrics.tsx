@@ -13,7 +13,7 @@ export const AnalysisMetrics: React.FC<AnalysisMetricsProps> = ({ analysisData }
     { label: 'VSWR', value: analysisData.vswr.toFixed(3), unit: '' },
     { label: 'Coeficiente de reflexión', value: analysisData.reflection_coefficient.toFixed(3), unit: '' },
     { label: 'Beta', value: analysisData.beta.toFixed(3), unit: 'rad/m' },
-    { label: 'Alpha', value: analysisData.alpha.toFixed(3), unit: 'Np/m' },
+    { label: 'Alpha', value: analysisData.alpha != null ? analysisData.alpha.toFixed(3) : 'N/D', unit: analysisData.alpha != null ? 'Np/m' : '' },
     { label: 'Impedancia característica (Z0)', value: analysisData.Z0.toFixed(1), unit: 'Ω' },
     { label: 'Tipo de carga', value: analysisData.load_type, unit: '' },
     { label: 'Valor de carga', value: analysisData.load_value.toFixed(1), unit: 'Ω' },
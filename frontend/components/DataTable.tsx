@@ -43,7 +43,7 @@ export const DataTable: React.FC<DataTableProps> = ({ analysisData }) => {
     { key: 'vswr', label: 'VSWR', value: analysisData.vswr.toFixed(3) },
     { key: 'reflection_coefficient', label: 'Coeficiente de Reflexión', value: analysisData.reflection_coefficient.toFixed(4) },
     { key: 'beta', label: 'Beta', value: formatValue(analysisData.beta, 'rad/m', true) },
-    { key: 'alpha', label: 'Alpha', value: formatValue(analysisData.alpha, 'Np/m', true) },
+    { key: 'alpha', label: 'Alpha', value: analysisData.alpha != null ? formatValue(analysisData.alpha, 'Np/m', true) : 'N/D' },
     { key: 'Z0', label: 'Impedancia Característica', value: `${analysisData.Z0.toFixed(1)} Ω` },
     { key: 'load_type', label: 'Tipo de Carga', value: analysisData.load_type },
     { key: 'load_value', label: 'Valor de Carga', value: `${analysisData.load_value.toFixed(1)} Ω` },
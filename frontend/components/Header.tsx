@@ -26,7 +26,7 @@ const generatePDF = (analysisData: AnalysisData) => {
     { label: 'VSWR', value: analysisData.vswr },
     { label: 'Coeficiente de reflexión', value: analysisData.reflection_coefficient },
     { label: 'Beta', value: analysisData.beta },
-    { label: 'Alpha', value: analysisData.alpha },
+    { label: 'Alpha', value: analysisData.alpha ?? 'N/D' },
     { label: 'Impedancia característica Z0 (Ω)', value: analysisData.Z0 },
     { label: 'Tipo de carga', value: analysisData.load_type },
     { label: 'Valor de carga', value: analysisData.load_value },
@@ -24,7 +24,7 @@ export const generateInsight = async (
       VSWR: ${metrics.vswr.toFixed(3)}
       Coeficiente de Reflexión: ${metrics.reflection_coefficient.toFixed(3)}
       Beta: ${metrics.beta.toFixed(3)} rad/m
-      Alpha: ${metrics.alpha.toFixed(3)} dB/m
+      Alpha: ${metrics.alpha != null ? `${metrics.alpha.toFixed(3)} Np/m` : 'no medible'}
       Z0: ${metrics.Z0.toFixed(1)} Ω
       Tipo de Carga: ${metrics.load_type}
       Valor de Carga: ${metrics.load_value.toFixed(2)}
@@ -34,6 +34,16 @@ export interface ChatMessage {
   timestamp: Date;
 }
 
+export interface FrequencyAnalysis {
+  frequency: number[];
+  s11_magnitude_db: number[];
+  s11_phase: number[];
+  alpha: number[];
+  beta: number[];
+  distance: number[];
+  impedance: number[];
+}
+
 export interface AnalysisData {
   length_meters: number;
   error_percent: number;
@@ -41,10 +51,86 @@ export interface AnalysisData {
   vswr: number;
   reflection_coefficient: number;
   beta: number;
-  alpha: number;
+  alpha: number | null;
   Z0: number;
   load_type: string;
   load_value: number;
-  tdr_plot_base64: string;
+  tdr_plot_base64: string | null;
+  plot_url?: string | null;
+  delta_t?: number | null;
+  frequency?: FrequencyAnalysis | null;
+  attenuation?: AttenuationFit | null;
+  discontinuities?: DiscontinuityTable | null;
   waveform: DataPoint[];
-}
\ No newline at end of file
+}
+
+export interface AttenuationFit {
+  alpha: number | null;
+  std_error: number | null;
+  ci: [number, number] | null;
+  reflections: number;
+  reason: string | null;
+}
+
+export interface Discontinuity {
+  time: number;
+  distance: number;
+  step: number;
+  reflection_coefficient: number;
+  impedance_before: number;
+  impedance_after: number;
+}
+
+export interface ImpedanceSegment {
+  start: number;
+  end: number;
+  level: number;
+  rho: number;
+  impedance: number;
+}
+
+export interface DiscontinuityTable {
+  events: Discontinuity[];
+  segments: ImpedanceSegment[];
+  edge_width: number | null;
+}
+export interface StreamWaveformDelta {
+  reset: boolean;
+  index: number[];
+  time: number[];
+  ch1: number[];
+  removed: number[];
+}
+
+export type StreamMessage =
+  | { type: 'ready'; parameters: Record<string, unknown> }
+  | { type: 'error'; detail: string }
+  | {
+      type: 'update';
+      received: number;
+      analyses: number;
+      skipped: number;
+      result: Omit<AnalysisData, 'tdr_plot_base64' | 'plot_url' | 'waveform'>;
+      events: Record<string, number | null>;
+      waveform: StreamWaveformDelta;
+    };
+
+export interface JobProgress {
+  stages: string[];
+  completed: string[];
+  current: string | null;
+  fraction: number;
+}
+
+export interface AnalysisJob {
+  id: string;
+  status: 'queued' | 'running' | 'done' | 'failed' | 'cancelled';
+  filename: string;
+  params: Record<string, unknown>;
+  error: string | null;
+  created_at: number;
+  started_at: number | null;
+  finished_at: number | null;
+  cancel_requested: boolean;
+  progress: JobProgress;
+}